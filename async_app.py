@@ -0,0 +1,417 @@
+"""ASGI version of the resume tailoring service.
+
+Serves the tailoring routes of the Flask app in ``main.py`` with the same request and
+response contract: ``/get_ai_resume``, ``/get_ai_resume/jobs``, ``/healthcheck``,
+``/readyz`` and ``/metrics``. The parser and OpenAI calls are awaited instead of blocking
+a worker thread, so one process can hold many tailoring requests in flight. Job
+registration (``/job_descriptions``), streaming, tasks and batches are only served by
+the Flask app. Serve it with any ASGI server:
+
+    hypercorn async_app:app --bind 0.0.0.0:5000
+"""
+import asyncio
+import hashlib
+import json
+import time
+
+import httpx
+from loguru import logger
+from quart import Quart, Response, g, jsonify, request
+from quart_cors import cors
+
+from candidate import ParserResponseInvalid, decode_parsed_resume, to_user_data
+from clients import ResumeUrlNotAllowed, aclose_async_clients, get_async_http_client, get_async_openai_client, open_resume_url_async, resume_url_allowed, warm_connections_async
+from delta import DELTA_INSTRUCTIONS, merge_job_description_rewrites, merge_job_descriptions, restore_fields
+from job_descriptions import JobDescription
+from local_parser import LOCAL_PARSER_ENABLED, DocumentTooLarge, check_size, parse_document
+from main import (
+    DELTA_COMPLETION_PARAMS,
+    DEFAULT_RESUME_URL,
+    MULTI_JOB_MAX_JOBS,
+    OPENAI_TIMEOUT_SECONDS,
+    PARSER_CONNECT_TIMEOUT_SECONDS,
+    PARSER_HEDGE_AFTER_SECONDS,
+    PARSER_TIMEOUT_SECONDS,
+    PARSE_CACHE_ENABLED,
+    PARSE_CACHE_VERSION,
+    READINESS_WARM_CONNECTIONS,
+    RELEVANCE_RANKING,
+    QUREOS_PARSER_URL,
+    RESUME_COMPLETION_PARAMS,
+    SYSTEM_PROMPT,
+    TAILOR_MODE,
+    build_experience_group_prompts,
+    build_openai_messages,
+    build_parser_request,
+    build_prompt_cache_params,
+    build_resume_prompt,
+    completion_params,
+    completion_token_cost,
+    get_job_description,
+    parse_cache,
+    prepare_prompt_data,
+    record_openai_usage,
+    render_resume_prompt,
+    warm_up_process,
+)
+from metrics import CONTENT_TYPE, REQUEST_SECONDS, TRACE_HEADER, record_upstream_response, registry, server_timing, single_flight_collector, stage, start_trace, upstream_call
+from prompt_renderer import store_candidate_prompt
+from rate_limit import openai_rate_limiter
+from response_cache import (
+    cache_response,
+    deterministic_params,
+    deterministic_scope,
+    get_cached_response,
+    is_deterministic,
+    requested_deterministic,
+    response_cache_key,
+)
+from resilience import REQUEST_DEADLINE_SECONDS, CircuitOpenError, DeadlineExceeded, bounded_timeout, call_with_retries_async, deadline_scope, hedged_call_async, retry_after
+from single_flight import AsyncSingleFlight, flight_key
+from token_budget import CompletionTruncated, PromptBudget, larger_completion_params, trimmed_fields
+
+app = cors(Quart(__name__))
+
+parse_flights = AsyncSingleFlight("parse", copy_result=True)
+openai_flights = AsyncSingleFlight("openai")
+registry.register_collector(single_flight_collector(parse_flights, openai_flights, runtime="async"))
+
+
+async def download_resume_async(resume_url: str) -> bytes:
+    """Async twin of main.download_resume"""
+    response = await open_resume_url_async("GET", resume_url, timeout=bounded_timeout(15, "resume_file"))
+    try:
+        response.raise_for_status()
+        check_size(int(response.headers.get("Content-Length") or 0))
+        chunks = []
+        size = 0
+        async for chunk in response.aiter_bytes(64 * 1024):
+            size += len(chunk)
+            check_size(size)
+            chunks.append(chunk)
+    finally:
+        await response.aclose()
+    return b"".join(chunks)
+
+
+async def get_resume_fingerprint_async(resume_url: str) -> tuple[str|None, bytes|None]:
+    """Async twin of main.get_resume_fingerprint"""
+    try:
+        head = await open_resume_url_async("HEAD", resume_url, timeout=bounded_timeout(5, "resume_file"))
+        await head.aclose()
+        if head.is_success:
+            etag = head.headers.get("ETag")
+            if etag:
+                return f"etag:{etag}", None
+        document = await download_resume_async(resume_url)
+        return f"sha256:{hashlib.sha256(document).hexdigest()}", document
+    except (httpx.HTTPError, DocumentTooLarge, ResumeUrlNotAllowed) as e:
+        logger.warning(f"Could not fingerprint {resume_url}, skipping parse cache: {e}")
+        return None, None
+
+
+async def post_parse_request_async(resume_url: str) -> bytes:
+    payload, headers = build_parser_request(resume_url)
+    timeout = httpx.Timeout(bounded_timeout(PARSER_TIMEOUT_SECONDS, "parser"), connect=PARSER_CONNECT_TIMEOUT_SECONDS)
+    with stage("parser"), upstream_call("parser"):
+        response = await get_async_http_client().post(QUREOS_PARSER_URL, headers=headers, content=payload, timeout=timeout)
+    record_upstream_response("parser", response.status_code)
+    response.raise_for_status()
+    return response.content
+
+
+async def request_parse_resume_json_async(resume_url: str) -> dict:
+    content = await call_with_retries_async("parser", hedged_call_async, "parser", post_parse_request_async, resume_url, hedge_after=PARSER_HEDGE_AFTER_SECONDS)
+    with stage("normalize"):
+        return to_user_data(decode_parsed_resume(content))
+
+
+async def parse_resume_async(resume_url: str, document: bytes|None = None) -> dict:
+    """Async twin of main.parse_resume; the local parse runs in a thread"""
+    parse_resp = await parse_resume_locally_async(resume_url, document) if LOCAL_PARSER_ENABLED else None
+    if parse_resp is None:
+        parse_resp = await request_parse_resume_json_async(resume_url)
+    with stage("prompt"):
+        return store_candidate_prompt(parse_resp)
+
+
+async def parse_resume_locally_async(resume_url: str, document: bytes|None = None) -> dict|None:
+    if document is None and not resume_url_allowed(resume_url):
+        return None
+    try:
+        if document is None:
+            with stage("download"):
+                document = await download_resume_async(resume_url)
+        with stage("local_parse"):
+            result = await asyncio.to_thread(parse_document, document)
+    except (httpx.HTTPError, DocumentTooLarge, ResumeUrlNotAllowed) as e:
+        logger.warning(f"Could not parse {resume_url} locally: {e}")
+        return None
+    if result is None or not result.accepted:
+        logger.info(f"Local parse of {resume_url} not confident enough ({result.confidence if result else None}), using the remote parser")
+        return None
+    return result.user_data
+
+
+async def get_parse_resume_json_async(resume_url: str) -> dict:
+    """Async twin of main.get_parse_resume_json, sharing the same parse cache"""
+    return await parse_flights.do(resume_url.strip(), load_parse_resume_json_async, resume_url)
+
+
+async def load_parse_resume_json_async(resume_url: str) -> dict:
+    if not PARSE_CACHE_ENABLED or not resume_url_allowed(resume_url):
+        return await parse_resume_async(resume_url)
+
+    with stage("fingerprint"):
+        fingerprint, document = await get_resume_fingerprint_async(resume_url)
+    if fingerprint is None:
+        return await parse_resume_async(resume_url)
+
+    cache_key = parse_cache.make_key(resume_url, fingerprint, PARSE_CACHE_VERSION)
+    cached = await asyncio.to_thread(parse_cache.get, cache_key)
+    if cached is not None:
+        logger.debug(f"parse cache hit for {resume_url}: {parse_cache.stats()}")
+        return cached
+
+    parse_resp = await parse_resume_async(resume_url, document)
+    if isinstance(parse_resp, dict) and parse_resp.get("cv"):
+        await asyncio.to_thread(parse_cache.set, cache_key, parse_resp)
+    return parse_resp
+
+
+async def create_chat_completion_async(token_cost: int, **params):
+    """Async twin of main.create_chat_completion, sharing its rate limiter"""
+    from openai import RateLimitError
+
+    with stage("openai_queue"):
+        await openai_rate_limiter.acquire_async(token_cost)
+    try:
+        with stage("openai"), upstream_call("openai"):
+            raw = await get_async_openai_client().chat.completions.with_raw_response.create(timeout=bounded_timeout(OPENAI_TIMEOUT_SECONDS, "openai"), **params)
+    except RateLimitError as e:
+        openai_rate_limiter.throttled(e.response.headers, retry_after(e))
+        raise
+    openai_rate_limiter.update_from_headers(raw.headers)
+    record_upstream_response("openai", 200)
+    return raw.parse()
+
+
+async def completion_content_async(params: dict, job: JobDescription|None = None, budget: PromptBudget|None = None) -> str:
+    """Async twin of main.completion_content"""
+    key = None
+    if is_deterministic():
+        params = deterministic_params(params)
+        key = response_cache_key(params)
+        with stage("response_cache"):
+            cached = await asyncio.to_thread(get_cached_response, key)
+        if cached is not None:
+            return cached
+    while True:
+        response = await call_with_retries_async("openai", create_chat_completion_async, completion_token_cost(params, budget), **params)
+        record_openai_usage(response.usage, job, budget)
+        choice = response.choices[0]
+        if choice.finish_reason != "length":
+            break
+        params = larger_completion_params(params)
+    if key is not None and choice.finish_reason == "stop":
+        await asyncio.to_thread(cache_response, key, choice.message.content)
+    return choice.message.content
+
+
+async def get_openai_gen_resume_async(user_prompt: str, system_prompt: str, job: JobDescription|None = None, budget: PromptBudget|None = None) -> str:
+    key = flight_key("resume", str(is_deterministic()), system_prompt, job.prompt if job else "", user_prompt)
+    return await openai_flights.do(key, request_openai_gen_resume_async, user_prompt, system_prompt, job, budget)
+
+
+async def request_openai_gen_resume_async(user_prompt: str, system_prompt: str, job: JobDescription|None = None, budget: PromptBudget|None = None) -> str:
+    params = dict(
+        messages=build_openai_messages(user_prompt, system_prompt, job.prompt if job else None),
+        **build_prompt_cache_params(job),
+        **completion_params(RESUME_COMPLETION_PARAMS, budget),
+    )
+    return await completion_content_async(params, job, budget)
+
+
+async def get_openai_gen_job_descriptions_async(user_prompt: str, system_prompt: str, job: JobDescription|None = None, budget: PromptBudget|None = None) -> str:
+    key = flight_key("delta", str(is_deterministic()), system_prompt, job.prompt if job else "", user_prompt)
+    return await openai_flights.do(key, request_openai_gen_job_descriptions_async, user_prompt, system_prompt, job, budget)
+
+
+async def request_openai_gen_job_descriptions_async(user_prompt: str, system_prompt: str, job: JobDescription|None = None, budget: PromptBudget|None = None) -> str:
+    params = dict(
+        messages=build_openai_messages(user_prompt, system_prompt + DELTA_INSTRUCTIONS, job.prompt if job else None),
+        **build_prompt_cache_params(job),
+        **completion_params(DELTA_COMPLETION_PARAMS, budget),
+    )
+    return await completion_content_async(params, job, budget)
+
+
+async def generate_parallel_rewrites_async(user_data: dict, job: JobDescription, prompt_data: dict|None = None, system_prompt: str = SYSTEM_PROMPT) -> dict:
+    prompts = build_experience_group_prompts(prompt_data or user_data, job, system_prompt)
+    responses = await asyncio.gather(*[
+        get_openai_gen_job_descriptions_async(prompt, system_prompt, job, budget) for prompt, budget in prompts
+    ])
+    with stage("decode"):
+        rewrites = [rewrite for response in responses for rewrite in json.loads(response).get("workHistory", [])]
+        return merge_job_description_rewrites(user_data, rewrites)
+
+
+async def tailor_resume_async(resume_url: str, job: JobDescription, mode: str = TAILOR_MODE, rank: bool = RELEVANCE_RANKING) -> dict:
+    with deadline_scope(REQUEST_DEADLINE_SECONDS):
+        return await generate_tailored_resume_async(await get_parse_resume_json_async(resume_url), job, mode, rank)
+
+
+async def generate_tailored_resume_async(user_data: dict, job: JobDescription, mode: str = TAILOR_MODE, rank: bool = RELEVANCE_RANKING, rendered: tuple[str, int]|None = None) -> dict:
+    """Async twin of main.generate_tailored_resume"""
+    prompt_data, system_prompt, relevance = prepare_prompt_data(user_data, job, rank)
+    if mode == "parallel":
+        tailored = await generate_parallel_rewrites_async(user_data, job, prompt_data, system_prompt)
+    else:
+        user_prompt, budget = build_resume_prompt(prompt_data, job, mode, system_prompt, (rendered or render_resume_prompt(user_data)) if prompt_data is user_data else None)
+        if mode == "delta":
+            ai_delta = await get_openai_gen_job_descriptions_async(user_prompt, system_prompt, job, budget)
+            with stage("decode"):
+                tailored = merge_job_descriptions(user_data, ai_delta)
+        else:
+            ai_resume = await get_openai_gen_resume_async(user_prompt, system_prompt, job, budget)
+            with stage("decode"):
+                tailored = restore_fields(json.loads(ai_resume), user_data, trimmed_fields(budget.trimmed))
+    if relevance is not None:
+        tailored["relevance"] = relevance
+    return tailored
+
+
+@app.route("/get_ai_resume", methods=['GET'])
+async def main() -> dict:
+    params = await request.get_json()
+    resume_url = params.get("resume_url", DEFAULT_RESUME_URL)
+    logger.debug(f"resume_url: {resume_url}")
+    with stage("job_description"):
+        job = await asyncio.to_thread(get_job_description, params)
+    if job is None:
+        return jsonify({"error": f"unknown job_id {params.get('job_id')}"}), 404
+    mode = params.get("mode", TAILOR_MODE)
+    rank = bool(params.get("rank", RELEVANCE_RANKING))
+
+    with deterministic_scope(requested_deterministic(params)):
+        json_str = await tailor_resume_async(resume_url, job, mode, rank)
+    return jsonify(json_str), 200
+
+
+async def tailor_resume_to_jobs_async(resume_url: str, jobs: list[JobDescription], mode: str = TAILOR_MODE, rank: bool = RELEVANCE_RANKING) -> tuple[dict, dict]:
+    """Async twin of main.tailor_resume_to_jobs"""
+    with deadline_scope(REQUEST_DEADLINE_SECONDS):
+        parse_resp = await get_parse_resume_json_async(resume_url)
+        rendered = render_resume_prompt(parse_resp) if mode != "parallel" and not rank else None
+        outcomes = await asyncio.gather(
+            *[generate_tailored_resume_async(parse_resp, job, mode, rank, rendered) for job in jobs], return_exceptions=True
+        )
+    results, errors = {}, {}
+    for job, outcome in zip(jobs, outcomes):
+        if isinstance(outcome, (DeadlineExceeded, CircuitOpenError)):
+            raise outcome
+        if isinstance(outcome, Exception):
+            logger.warning(f"Tailoring to job {job.job_id} failed: {outcome!r}")
+            errors[job.job_id] = str(outcome)
+        elif isinstance(outcome, BaseException):
+            raise outcome
+        else:
+            results[job.job_id] = outcome
+    return results, errors
+
+
+@app.route("/get_ai_resume/jobs", methods=['GET', 'POST'])
+async def multi_job_main() -> dict:
+    params = await request.get_json()
+    resume_url = params.get("resume_url", DEFAULT_RESUME_URL)
+    items = params.get("jobs", [])
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "jobs must be a non-empty list"}), 400
+    if len(items) > MULTI_JOB_MAX_JOBS:
+        return jsonify({"error": f"at most {MULTI_JOB_MAX_JOBS} jobs per request"}), 400
+    items = [item if isinstance(item, dict) else {"job_id": item} for item in items]
+    with stage("job_description"):
+        jobs = await asyncio.to_thread(lambda: [get_job_description(item) for item in items])
+    unknown = [item.get("job_id") for item, job in zip(items, jobs) if job is None]
+    if unknown:
+        return jsonify({"error": f"unknown job_id {', '.join(map(str, unknown))}"}), 404
+
+    with deterministic_scope(requested_deterministic(params)):
+        results, errors = await tailor_resume_to_jobs_async(resume_url, list({job.job_id: job for job in jobs}.values()), params.get("mode", TAILOR_MODE), bool(params.get("rank", RELEVANCE_RANKING)))
+    return jsonify({"results": results, "errors": errors}), 200
+
+
+@app.route("/healthcheck", methods=['GET'])
+async def healthcheck():
+    return "OK", 200
+
+
+warmup_task = None
+
+
+async def run_warm_up() -> dict:
+    started = time.perf_counter()
+    await asyncio.to_thread(warm_up_process)
+    connections = await warm_connections_async(QUREOS_PARSER_URL) if READINESS_WARM_CONNECTIONS else {}
+    result = {"connections": connections, "seconds": round(time.perf_counter() - started, 3)}
+    logger.info(f"Warmed up: {result}")
+    return result
+
+
+async def warm_up_async() -> dict:
+    """Async twin of main.warm_up: concurrent probes share one warm-up"""
+    global warmup_task
+    if warmup_task is None:
+        warmup_task = asyncio.ensure_future(run_warm_up())
+    return await asyncio.shield(warmup_task)
+
+
+@app.route("/readyz", methods=['GET'])
+async def readiness():
+    """Readiness probe: the first call warms the process up, so route traffic here only once it answers"""
+    return jsonify({"status": "ready", **(await warm_up_async())}), 200
+
+
+@app.errorhandler(DeadlineExceeded)
+async def deadline_exceeded(e: DeadlineExceeded):
+    return jsonify({"error": str(e)}), 504
+
+
+@app.errorhandler(CircuitOpenError)
+async def upstream_unavailable(e: CircuitOpenError):
+    return jsonify({"error": str(e)}), 503
+
+
+@app.errorhandler(CompletionTruncated)
+async def completion_truncated(e: CompletionTruncated):
+    return jsonify({"error": str(e)}), 502
+
+
+@app.errorhandler(ParserResponseInvalid)
+async def parser_response_invalid(e: ParserResponseInvalid):
+    return jsonify({"error": str(e)}), 502
+
+
+@app.route("/metrics", methods=['GET'])
+async def prometheus_metrics() -> Response:
+    return Response(registry.render(), content_type=CONTENT_TYPE)
+
+
+@app.before_request
+async def start_request_trace() -> None:
+    g.request_started = time.perf_counter()
+    g.trace = start_trace(bool(request.headers.get(TRACE_HEADER)))
+
+
+@app.after_request
+async def finish_request_trace(response: Response) -> Response:
+    elapsed = time.perf_counter() - g.request_started
+    REQUEST_SECONDS.observe(elapsed, route=request.url_rule.rule if request.url_rule else "unmatched", status=response.status_code)
+    if g.trace is not None:
+        response.headers["Server-Timing"] = server_timing(g.trace + [("total", elapsed)])
+    return response
+
+
+@app.after_serving
+async def close_upstream_clients() -> None:
+    await aclose_async_clients()
@@ -0,0 +1,88 @@
+"""Parser response decoding: dict pipeline vs the typed candidate model.
+
+    python -m benchmarks.bench_candidate_decode --roles 12
+"""
+import argparse
+import json
+import logging
+import time
+import tracemalloc
+from datetime import datetime
+
+from benchmarks.synthetic import make_parsed_resume
+from candidate import decode_parsed_resume, to_user_data
+from prompt_renderer import remove_null_values
+
+
+# Frozen copy of the dict path main.py used before the typed model, kept as the baseline
+def calculate_duration_in_years(work_history: list[dict]) -> None:
+    current_date = datetime.now()
+    for job in work_history:
+        try:
+            start_date = datetime.strptime(job['startAt'], "%Y-%m-%d")
+            end_date = datetime.strptime(job['endAt'], "%Y-%m-%d") if job.get('endAt') else current_date
+        except (KeyError, TypeError, ValueError):
+            job['durationInYears'] = 0
+            job['start_date_str'] = '0'
+            job['end_date_str'] = '0'
+            continue
+        job['durationInYears'] = round((end_date - start_date).days / 365.25, 2)
+        job['start_date_str'] = start_date.strftime('%Y-%m-%d')
+        job['end_date_str'] = end_date.strftime('%Y-%m-%d')
+
+
+def convert_graduated_at(education_history: list[dict]) -> None:
+    for education in education_history:
+        if education.get('graduatedAt'):
+            education['graduatedAtDate'] = datetime.strptime(education['graduatedAt'], "%Y-%m-%d").strftime('%Y-%m-%d')
+
+
+def modify_candidate_data(user_data: dict) -> dict:
+    try:
+        calculate_duration_in_years(user_data['cv']['workHistory'])
+        convert_graduated_at(user_data['cv']['educationHistory'])
+    except Exception:
+        pass
+    return user_data
+
+
+def dict_pipeline(body: bytes) -> dict:
+    user_data = modify_candidate_data(json.loads(body))
+    user_data["cv"] = remove_null_values(user_data["cv"])
+    return user_data
+
+
+def typed_pipeline(body: bytes) -> dict:
+    return to_user_data(decode_parsed_resume(body))
+
+
+def measure(fn, body: bytes, iterations: int) -> tuple[float, int, int]:
+    """Mean microseconds per call, plus peak traced bytes and live blocks allocated by one call"""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn(body)
+    elapsed = (time.perf_counter() - start) / iterations * 1e6
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    tracemalloc.reset_peak()
+    result = fn(body)
+    _, peak = tracemalloc.get_traced_memory()
+    blocks = sum(stat.count_diff for stat in tracemalloc.take_snapshot().compare_to(before, "filename"))
+    tracemalloc.stop()
+    del result
+    return elapsed, peak, blocks
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--roles", type=int, default=8)
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    body = json.dumps(make_parsed_resume(roles=args.roles)).encode()
+    print(f"payload: {len(body)} bytes, {args.roles} roles")
+    for name, fn in [("dict", dict_pipeline), ("typed", typed_pipeline)]:
+        elapsed, peak, blocks = measure(fn, body, args.iterations)
+        print(f"{name:>6}: {elapsed:8.1f} us/call  peak {peak / 1024:7.1f} KiB  result blocks {blocks}")
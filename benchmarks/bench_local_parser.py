@@ -0,0 +1,48 @@
+"""Local parse latency and confidence of synthetic PDF and DOCX resumes, inline and with the page pool.
+
+    python -m benchmarks.bench_local_parser --roles 3 6 15 --repeat 20
+    LOCAL_PARSER_PROCESSES=4 python -m benchmarks.bench_local_parser --roles 30 --lines-per-page 40
+
+Compare the p50 with the fake parser's --parser-latency-ms (800 ms by default) or the
+real parser's resume_stage_seconds{stage="parser"}.
+"""
+import argparse
+import time
+
+import numpy as np
+
+import local_parser
+from benchmarks.synthetic import make_parsed_resume, make_resume_docx, make_resume_pdf, resume_lines
+
+
+def measure(document: bytes, repeat: int) -> tuple[list[float], float]:
+    local_parser.parse_document(document)
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = local_parser.parse_document(document)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings, result.confidence
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--roles", type=int, nargs="+", default=[3, 6, 15, 30])
+    parser.add_argument("--lines-per-page", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    pool_modes = [("inline", 10 ** 6)]
+    if local_parser.LOCAL_PARSER_PROCESSES > 1:
+        pool_modes.append((f"pool x{local_parser.LOCAL_PARSER_PROCESSES}", 1))
+    print(f"{'roles':>5} {'format':>6} {'pages':>5} {'mode':>8} {'p50 ms':>8} {'p95 ms':>8} {'confidence':>10}")
+    for roles in args.roles:
+        lines = resume_lines(make_parsed_resume(roles=roles, sentences_per_role=8))
+        pdf = make_resume_pdf(lines, args.lines_per_page)
+        pages = -(-len(lines) // args.lines_per_page)
+        for document_format, document, modes in (("docx", make_resume_docx(lines), pool_modes[:1]), ("pdf", pdf, pool_modes)):
+            for mode, min_pages in modes:
+                local_parser.LOCAL_PARSER_POOL_MIN_PAGES = min_pages
+                timings, confidence = measure(document, args.repeat)
+                p50, p95 = np.percentile(timings, [50, 95])
+                print(f"{roles:>5} {document_format:>6} {pages if document_format == 'pdf' else '-':>5} {mode:>8} {p50:8.1f} {p95:8.1f} {confidence:10.3f}")
@@ -0,0 +1,117 @@
+"""Candidate prompt assembly for a new job posting: the old += builder, the section renderer, and the prompt stored at parse time.
+
+    python -m benchmarks.bench_prompt_render --roles 6 30 60 --jobs 20
+
+For each resume size the same decoded resume is budgeted against --jobs job descriptions,
+the way /get_ai_resume/jobs and repeat requests see it. "builder" is the string
+concatenation the service used before the section renderer, kept here as the baseline,
+and "render" is the section renderer; both render and count the prompt for every job.
+"stored" renders it once, as the service does when it parses the resume, and only
+budgets the stored prompt against each job.
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from benchmarks.load_test import JOB_DESCRIPTION
+from benchmarks.synthetic import make_parsed_resume
+from candidate import decode_parsed_resume, to_user_data
+from prompt_renderer import remove_null_values, render_candidate_prompt, render_experience, store_candidate_prompt, stored_candidate_prompt
+from token_budget import build_budgeted_prompt, count_prompt_tokens
+
+
+def build_prompt_with_concatenation(user_data: dict) -> str:
+    """Frozen copy of the prompt builder before the section renderer (with the certificate date fix)"""
+    user_data = remove_null_values(user_data['cv'])
+    current_location = user_data.get("city", "unknown city") + ", " + user_data.get("country", "unknown country")
+    aboutme = user_data.get('bio', None)
+    experience_details = user_data.get("workHistory", [])
+    education_details = user_data.get("educationHistory", [])
+    certifications = user_data.get("certificates", [])
+    languages = user_data.get("languages", [])
+    nationality_details = user_data.get('nationality', None)
+    linkedin = user_data.get('linkedIn', None)
+    email = user_data.get("email", None)
+    phone = user_data.get("phone", None)
+    project_details = user_data.get("projects", [])
+    skills = user_data.get("skills", [])
+
+    prompt = "The following are the details of person's whole resume:\n"
+    prompt += f"""\nThe person is currently located in {current_location}{". Email: " + email if email else ""}{". Phone: " + phone if phone else ""}{". linkedin: " + linkedin if linkedin else ""}\n"""
+    if aboutme:
+        prompt += f"About me: \n{aboutme}\n"
+    if experience_details:
+        total_experience = user_data.get("totalExperienceYears")
+        prompt += f"\nExperiences ({total_experience} years in total):\n" if total_experience else "\nExperiences:\n"
+        for idx, experience in enumerate(experience_details, 1):
+            prompt += render_experience(idx, experience)
+    if skills and isinstance(skills, list):
+        prompt += f"\nPerson is skilled in the following: {', '.join(skills)}\n"
+    if education_details:
+        prompt += "\nEducation: \n"
+        for idx, education in enumerate(education_details, 1):
+            prompt += f"{idx}. Studied {education.get('degreeAndField', 'Unknown Field')} from {education.get('schoolName', 'Unknown School')} and graduated at {education.get('graduatedAtDate', 'Unknown graduation date')}.\n"
+    if certifications:
+        prompt += "Certification:\n"
+        for idx, certification in enumerate(certifications, 1):
+            certification_issue_date = certification.get("issueDate", None)
+            prompt += f"""{idx}. Certification in {certification.get("title", "unknown certification name")} from {certification.get("company", "unknown certification institution")}{" at " + certification_issue_date if certification_issue_date else ""}.\n"""
+    if nationality_details:
+        prompt += f"\nThis person is {nationality_details} national.\n"
+    if project_details:
+        prompt += "\nPerson has done following projects in his career:\n"
+        for idx, project in enumerate(project_details, 1):
+            project_start_at = project.get("startAt", None)
+            project_end_at = project.get("endAt", None)
+            prompt += f"""\n{idx}. {project.get("title", "unknown project title")}{". Started at " + project_start_at if project_start_at else ""}{" and ended at " + project_end_at if project_end_at else ""}"""
+    if languages:
+        prompt += "\nLanguages:\n"
+        for idx, language in enumerate(languages, 1):
+            if language is None:
+                continue
+            if isinstance(language, str):
+                prompt += f"{idx}. Candidate speaks {language}.\n"
+            else:
+                prompt += f"\n{idx}. Candidate speaks {language.get('name', 'Unknown language name')} with {language.get('proficiency', 'Unknown')} proficiency.\n"
+    prompt += "\n\n[No prose, output only JSON]\n"
+    return prompt
+
+
+def build(user_data: dict, job_description: str, render=render_candidate_prompt, stored: bool = False) -> str:
+    rendered = stored_candidate_prompt(user_data) if stored else None
+    prompt, _ = build_budgeted_prompt(user_data, render, ["system prompt", job_description], "delta", rendered=rendered)
+    return prompt
+
+
+def run(user_data: dict, jobs: list[str], render=render_candidate_prompt, stored: bool = False) -> list[float]:
+    timings = []
+    for job_description in jobs:
+        count_prompt_tokens.cache_clear()
+        start = time.perf_counter()
+        build(user_data, job_description, render, stored)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--roles", type=int, nargs="+", default=[6, 30, 60])
+    parser.add_argument("--sentences-per-role", type=int, default=8)
+    parser.add_argument("--jobs", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    jobs = [f"{JOB_DESCRIPTION} Posting {idx}." for idx in range(args.jobs)]
+    print(f"{'roles':>5} {'chars':>7} {'builder p50 ms':>15} {'render p50 ms':>14} {'stored p50 ms':>14} {'speedup':>8}")
+    for roles in args.roles:
+        raw = make_parsed_resume(roles=roles, sentences_per_role=args.sentences_per_role, projects=roles // 2, skills=40)
+        user_data = store_candidate_prompt(to_user_data(decode_parsed_resume(json.dumps(raw).encode())))
+        assert build(user_data, jobs[0], stored=True) == build(user_data, jobs[-1]), "stored prompt differs from rendering it"
+        assert render_candidate_prompt(user_data) == build_prompt_with_concatenation(user_data), "renderer and builder differ"
+        builder = [timing for _ in range(args.repeat) for timing in run(user_data, jobs, build_prompt_with_concatenation)]
+        render = [timing for _ in range(args.repeat) for timing in run(user_data, jobs)]
+        stored = [timing for _ in range(args.repeat) for timing in run(user_data, jobs, stored=True)]
+        builder_p50, render_p50, stored_p50 = (np.percentile(timings, 50) for timings in (builder, render, stored))
+        print(f"{roles:>5} {len(render_candidate_prompt(user_data)):>7} {builder_p50:>15.3f} {render_p50:>14.3f} {stored_p50:>14.3f} {builder_p50 / stored_p50:>7.1f}x")
@@ -0,0 +1,107 @@
+"""Cold start of the service: import time per startup mode, and first vs. second request latency with and without /readyz.
+
+    python -m benchmarks.bench_startup --repeat 5
+    python -m benchmarks.bench_startup --server asgi --modes lazy eager --skip-import
+
+Each measurement runs in a fresh interpreter against the local fake upstreams
+(benchmarks/fakes.py), whose latencies default low here so the one-off costs stand out.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+import numpy as np
+
+from benchmarks.fakes import add_fake_arguments, start_fakes
+from benchmarks.load_test import JOB_DESCRIPTION, ROOT, free_port, start_service, wait_until_healthy
+
+IMPORT_SNIPPET = "import time; start = time.perf_counter(); import {module}; print((time.perf_counter() - start) * 1000)"
+
+
+def import_ms(module: str, mode: str, repeat: int) -> list[float]:
+    env = dict(os.environ, STARTUP_MODE=mode, TASK_WORKERS="0")
+    timings = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", IMPORT_SNIPPET.format(module=module)],
+            cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+        ).stdout
+        timings.append(float(output.strip().splitlines()[-1]))
+    return timings
+
+
+def timed_get(client: httpx.Client, url: str, **kwargs) -> tuple[float, int]:
+    start = time.perf_counter()
+    response = client.request("GET", url, **kwargs)
+    return (time.perf_counter() - start) * 1000, response.status_code
+
+
+def first_requests(server: str, mode: str, ready: bool, env: dict, resume_base: str) -> dict:
+    """Boot the service and time its readiness (optional), first and second tailoring requests"""
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    process = start_service(server, port, dict(env, STARTUP_MODE=mode))
+    try:
+        wait_until_healthy(base_url, process)
+        result = {"healthy_ms": round((time.perf_counter() - started) * 1000, 1), "readyz_ms": None}
+        with httpx.Client(timeout=60) as client:
+            if ready:
+                result["readyz_ms"] = round(timed_get(client, f"{base_url}/readyz")[0], 1)
+            for name, index in (("first_ms", 1), ("second_ms", 2)):
+                payload = {"resume_url": f"{resume_base}/resumes/{index}.pdf", "applied_job_desc": JOB_DESCRIPTION, "mode": "delta"}
+                elapsed, status = timed_get(client, f"{base_url}/get_ai_resume", json=payload)
+                result[name] = round(elapsed, 1) if status == 200 else f"HTTP {status}"
+        return result
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+
+def main() -> None:
+    cli = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    cli.add_argument("--server", choices=["flask", "asgi"], default="flask")
+    cli.add_argument("--modes", nargs="+", choices=["lazy", "eager"], default=["lazy", "eager"])
+    cli.add_argument("--repeat", type=int, default=5, help="interpreters per import measurement")
+    cli.add_argument("--skip-import", action="store_true", help="only measure the first requests")
+    add_fake_arguments(cli)
+    cli.set_defaults(parser_latency_ms=20, parser_sigma=0.0, openai_latency_ms=50, openai_sigma=0.0, large_resume_share=0.0)
+    args = cli.parse_args()
+
+    module = "async_app" if args.server == "asgi" else "main"
+    if not args.skip_import:
+        print(f"import {module}")
+        print(f"{'mode':>6} {'p50 ms':>8} {'min ms':>8}")
+        for mode in args.modes:
+            timings = import_ms(module, mode, args.repeat)
+            print(f"{mode:>6} {np.percentile(timings, 50):>8.1f} {min(timings):>8.1f}")
+
+    fake_parser, fake_openai = start_fakes(args)
+    cache_dir = tempfile.TemporaryDirectory(prefix="bench_startup_")
+    env = dict(
+        os.environ,
+        QUREOS_PARSER_URL=f"{fake_parser.url}/cv-parser/parse?model=4",
+        QUREOS_AUTH="fake",
+        OPENAI_BASE_URL=f"{fake_openai.url}/v1",
+        OPENAI_AUTH="fake",
+        PARSE_CACHE_ENABLED="0",
+        JOB_DESCRIPTION_DIR=cache_dir.name,
+        TASK_WORKERS="0",
+    )
+    try:
+        print(f"\n{args.server} server, fake parser {args.parser_latency_ms:g} ms, fake OpenAI {args.openai_latency_ms:g} ms")
+        print(f"{'mode':>6} {'readyz':>7} {'healthy ms':>11} {'readyz ms':>10} {'first ms':>9} {'second ms':>10}")
+        for mode in args.modes:
+            for ready in (False, True):
+                result = first_requests(args.server, mode, ready, env, fake_parser.url)
+                print(f"{mode:>6} {'yes' if ready else 'no':>7} {result['healthy_ms']:>11} {result['readyz_ms']!s:>10} {result['first_ms']!s:>9} {result['second_ms']!s:>10}")
+    finally:
+        cache_dir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
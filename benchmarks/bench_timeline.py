@@ -0,0 +1,57 @@
+"""Total experience over a batch of candidates: one timeline per cv vs the vectorized batch.
+
+    python -m benchmarks.bench_timeline --candidates 5000
+"""
+import argparse
+import random
+import time
+
+import numpy as np
+
+from timeline import _parse_date_text, build_timeline, total_experience_years
+
+_FORMATS = ("{y}-{m:02d}-01T00:00:00.000Z", "{y}-{m:02d}-01", "{y}-{m:02d}", "{m:02d}/{y}", "{mon} {y}")
+_MONTHS = ("Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec")
+
+
+def make_cvs(count: int, roles: int, seed: int = 7) -> list[dict]:
+    rng = random.Random(seed)
+
+    def text(year: int, month: int) -> str:
+        return rng.choice(_FORMATS).format(y=year, m=month, mon=_MONTHS[month - 1])
+
+    cvs = []
+    for _ in range(count):
+        work_history = []
+        for _ in range(roles):
+            year, month = rng.randint(2000, 2022), rng.randint(1, 12)
+            end = rng.choice([None, "Present", text(min(year + rng.randint(0, 4), 2024), month)])
+            work_history.append({"startAt": text(year, month), "endAt": end})
+        cvs.append({"workHistory": work_history})
+    return cvs
+
+
+def timed(fn, *args) -> tuple[float, object]:
+    start = time.perf_counter()
+    result = fn(*args)
+    return (time.perf_counter() - start) * 1000, result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--candidates", type=int, default=5000)
+    parser.add_argument("--roles", type=int, default=6)
+    args = parser.parse_args()
+
+    cvs = make_cvs(args.candidates, args.roles)
+    per_cv = lambda: np.array([build_timeline(cv["workHistory"]).total_years for cv in cvs])
+
+    _parse_date_text.cache_clear()
+    cold, _ = timed(per_cv)
+    warm, expected = timed(per_cv)
+    batch, actual = timed(total_experience_years, cvs)
+    assert np.allclose(expected, actual), "batch and per-cv totals differ"
+    print(f"{args.candidates} candidates x {args.roles} roles, {_parse_date_text.cache_info().currsize} distinct dates")
+    print(f"per cv, cold date cache: {cold:8.1f} ms")
+    print(f"per cv, warm date cache: {warm:8.1f} ms")
+    print(f"vectorized batch:        {batch:8.1f} ms")
@@ -0,0 +1,292 @@
+"""Local stand-ins for the Qureos parser and the OpenAI chat-completions API.
+
+Both answer with realistic shapes after a lognormal delay and fail a configurable share
+of requests, so the service can be load tested without touching the paid APIs:
+
+    python -m benchmarks.fakes --parser-port 8101 --openai-port 8102
+    QUREOS_PARSER_URL=http://127.0.0.1:8101/cv-parser/parse?model=4 \
+    OPENAI_BASE_URL=http://127.0.0.1:8102/v1 OPENAI_AUTH=fake python main.py
+"""
+import argparse
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from collections import deque
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks.synthetic import make_parsed_resume, make_resume_docx, make_resume_pdf, resume_lines
+
+
+@dataclass
+class UpstreamProfile:
+    """Latency is lognormal around median_ms; error_rate of the requests get error_status"""
+    median_ms: float = 50
+    sigma: float = 0.5
+    error_rate: float = 0.0
+    error_status: int = 500
+
+    def delay(self, rng: random.Random) -> float:
+        if self.median_ms <= 0:
+            return 0.0
+        return rng.lognormvariate(math.log(self.median_ms / 1000), self.sigma)
+
+    def fails(self, rng: random.Random) -> bool:
+        return rng.random() < self.error_rate
+
+
+class _FakeServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, handler, profile: UpstreamProfile, **options):
+        super().__init__(address, handler)
+        self.profile = profile
+        self.options = options
+        self.rng = random.Random(options.get("seed", 7))
+        self.rng_lock = threading.Lock()
+        self.requests = 0
+        self.admitted = deque()
+
+    def draw(self) -> tuple[float, bool, float]:
+        """Delay, whether to fail, and a uniform number for the handler's own choices"""
+        with self.rng_lock:
+            self.requests += 1
+            return self.profile.delay(self.rng), self.profile.fails(self.rng), self.rng.random()
+
+    def admit(self) -> tuple[bool, dict]:
+        """Sliding one-minute request window of rpm_limit, with OpenAI's x-ratelimit-* headers"""
+        limit = self.options.get("rpm_limit", 0)
+        if not limit:
+            return True, {}
+        with self.rng_lock:
+            now = time.monotonic()
+            while self.admitted and now - self.admitted[0] >= 60:
+                self.admitted.popleft()
+            allowed = len(self.admitted) < limit
+            if allowed:
+                self.admitted.append(now)
+            reset = 60 - (now - self.admitted[0]) if self.admitted else 0
+            headers = {
+                "x-ratelimit-limit-requests": str(limit),
+                "x-ratelimit-remaining-requests": str(limit - len(self.admitted)),
+                "x-ratelimit-reset-requests": f"{reset:.3f}s",
+            }
+        return allowed, headers
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_body(self) -> bytes:
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _send(self, status: int, body: bytes, content_type: str = "application/json", headers: dict|None = None) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _send_error(self, status: int|None = None, headers: dict|None = None) -> None:
+        status = status or self.server.profile.error_status
+        if status == 429 and headers is None:
+            headers = {"Retry-After": "1"}
+        self._send(status, json.dumps({"error": {"message": "injected failure", "type": "fake_error"}}).encode(), headers=headers)
+
+
+class ParserHandler(_Handler):
+    """POST anything: a parsed resume; GET/HEAD /resumes/<name>: the resume file, with an ETag
+
+    With documents, /resumes/<name>.pdf and .docx are real documents of the regular resume,
+    readable by the local parser; otherwise every file is opaque bytes.
+    """
+
+    def do_POST(self):
+        self._read_body()
+        delay, fails, pick = self.server.draw()
+        time.sleep(delay)
+        if fails:
+            return self._send_error()
+        payloads = self.server.options["payloads"]
+        large = pick < self.server.options["large_share"]
+        self._send(200, payloads["large" if large else "regular"])
+
+    def do_GET(self):
+        if not self.path.startswith("/resumes/"):
+            return self._send(404, b"{}")
+        documents = self.server.options.get("documents")
+        extension = self.path.rsplit(".", 1)[-1]
+        if documents and extension in documents:
+            body = documents[extension]
+        else:
+            body = hashlib.sha256(self.path.encode()).digest() * 512
+        self._send(200, body, "application/pdf", {"ETag": f'"{hashlib.md5(self.path.encode() + body).hexdigest()}"'})
+
+    do_HEAD = do_GET
+
+
+_EXPERIENCE_RE = re.compile(r"^(\d+): ", re.M)
+
+
+def _message_text(message: dict) -> str:
+    content = message.get("content")
+    if isinstance(content, list):
+        return "".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return str(content or "")
+
+
+class OpenAIHandler(_Handler):
+    """POST .../chat/completions, answering in the schema the request asked for, streamed or not"""
+
+    def do_POST(self):
+        request = json.loads(self._read_body() or b"{}")
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            return self._send(404, b"{}")
+        allowed, self.rate_headers = self.server.admit()
+        if not allowed:
+            return self._send_error(429, self.rate_headers)
+        delay, fails, _ = self.server.draw()
+        time.sleep(delay)
+        if fails:
+            return self._send_error()
+
+        messages = request.get("messages") or []
+        prompt_text = "".join(_message_text(message) for message in messages)
+        content = self._content(request, _message_text(messages[-1]) if messages else "")
+        usage = {
+            "prompt_tokens": len(prompt_text) // 4,
+            "completion_tokens": len(content) // 4,
+            "total_tokens": (len(prompt_text) + len(content)) // 4,
+            "prompt_tokens_details": {"cached_tokens": 0},
+        }
+        if request.get("stream"):
+            return self._stream(request, content, usage)
+        self._send(200, json.dumps({
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "gpt-4o"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": usage,
+        }).encode(), headers=self.rate_headers)
+
+    def _content(self, request: dict, user_prompt: str) -> str:
+        indexes = [int(index) for index in _EXPERIENCE_RE.findall(user_prompt)] or [1]
+        rewrite = "Led SQL and Tableau reporting for regional teams, cutting turnaround by 30%. " * self.server.options["rewrite_sentences"]
+        schema = ((request.get("response_format") or {}).get("json_schema") or {}).get("name")
+        if schema == "job_descriptions_schema":
+            return json.dumps({"workHistory": [{"index": index, "jobDescription": rewrite} for index in indexes]})
+        work_history = [
+            {"title": f"Role {index}", "companyName": "Company", "startAt": "2020-01-01", "endAt": None, "jobDescription": rewrite, "location": None}
+            for index in indexes
+        ]
+        return json.dumps({"cv": {
+            "languages": [], "city": "Karachi", "country": "Pakistan", "educationHistory": [], "workHistory": work_history,
+            "projects": [], "linkedIn": None, "website": None, "skills": ["SQL"], "bio": None, "email": "", "phone": "", "certificates": [],
+        }})
+
+    def _stream(self, request: dict, content: str, usage: dict) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        for name, value in self.rate_headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.close_connection = True
+        chunk_id = f"chatcmpl-{uuid.uuid4().hex}"
+
+        def event(choices: list, usage: dict|None = None) -> bytes:
+            chunk = {"id": chunk_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": request.get("model", "gpt-4o"), "choices": choices, "usage": usage}
+            return f"data: {json.dumps(chunk)}\n\n".encode()
+
+        chunk_delay = self.server.options["stream_chunk_ms"] / 1000
+        for start in range(0, len(content), 64):
+            self.wfile.write(event([{"index": 0, "delta": {"content": content[start:start + 64]}, "finish_reason": None}]))
+            self.wfile.flush()
+            if chunk_delay:
+                time.sleep(chunk_delay)
+        self.wfile.write(event([{"index": 0, "delta": {}, "finish_reason": "stop"}]))
+        self.wfile.write(event([], usage))
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+def start_server(server: _FakeServer) -> _FakeServer:
+    threading.Thread(target=server.serve_forever, name=f"fake-{server.server_address[1]}", daemon=True).start()
+    return server
+
+
+def start_fake_parser(profile: UpstreamProfile, port: int = 0, roles: int = 6, large_roles: int = 30, large_share: float = 0.1, documents: bool = False, seed: int = 7) -> _FakeServer:
+    regular = make_parsed_resume(roles=roles, seed=seed)
+    payloads = {
+        "regular": json.dumps(regular).encode(),
+        "large": json.dumps(make_parsed_resume(roles=large_roles, sentences_per_role=15, projects=20, skills=80, seed=seed)).encode(),
+    }
+    files = {"pdf": make_resume_pdf(resume_lines(regular)), "docx": make_resume_docx(resume_lines(regular))} if documents else None
+    return start_server(_FakeServer(("127.0.0.1", port), ParserHandler, profile, payloads=payloads, large_share=large_share, documents=files, seed=seed))
+
+
+def start_fake_openai(profile: UpstreamProfile, port: int = 0, rewrite_sentences: int = 4, stream_chunk_ms: float = 5, rpm_limit: int = 0, seed: int = 7) -> _FakeServer:
+    return start_server(_FakeServer(
+        ("127.0.0.1", port), OpenAIHandler, profile, rewrite_sentences=rewrite_sentences, stream_chunk_ms=stream_chunk_ms, rpm_limit=rpm_limit, seed=seed + 1,
+    ))
+
+
+def add_fake_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--parser-latency-ms", type=float, default=800, help="median parser latency")
+    parser.add_argument("--parser-sigma", type=float, default=0.4, help="lognormal sigma of the parser latency")
+    parser.add_argument("--parser-error-rate", type=float, default=0.0)
+    parser.add_argument("--openai-latency-ms", type=float, default=2500, help="median completion latency")
+    parser.add_argument("--openai-sigma", type=float, default=0.5, help="lognormal sigma of the completion latency")
+    parser.add_argument("--openai-error-rate", type=float, default=0.0)
+    parser.add_argument("--openai-error-status", type=int, default=429)
+    parser.add_argument("--openai-rpm-limit", type=int, default=0, help="answer 429 above this many completions per minute (0: no limit)")
+    parser.add_argument("--resume-roles", type=int, default=6, help="roles in a regular synthetic resume")
+    parser.add_argument("--large-resume-roles", type=int, default=30, help="roles in a large synthetic resume")
+    parser.add_argument("--large-resume-share", type=float, default=0.1, help="share of parses returning the large resume")
+    parser.add_argument("--resume-documents", action="store_true", help="serve real .pdf/.docx resume files the local parser can read")
+
+
+def start_fakes(args: argparse.Namespace, parser_port: int = 0, openai_port: int = 0) -> tuple[_FakeServer, _FakeServer]:
+    parser = start_fake_parser(
+        UpstreamProfile(args.parser_latency_ms, args.parser_sigma, args.parser_error_rate),
+        port=parser_port, roles=args.resume_roles, large_roles=args.large_resume_roles, large_share=args.large_resume_share,
+        documents=args.resume_documents,
+    )
+    openai = start_fake_openai(
+        UpstreamProfile(args.openai_latency_ms, args.openai_sigma, args.openai_error_rate, args.openai_error_status),
+        port=openai_port, rpm_limit=args.openai_rpm_limit,
+    )
+    return parser, openai
+
+
+if __name__ == "__main__":
+    cli = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    cli.add_argument("--parser-port", type=int, default=8101)
+    cli.add_argument("--openai-port", type=int, default=8102)
+    add_fake_arguments(cli)
+    args = cli.parse_args()
+    parser, openai = start_fakes(args, args.parser_port, args.openai_port)
+    print(f"parser: {parser.url}/cv-parser/parse?model=4  resumes: {parser.url}/resumes/<name>.pdf")
+    print(f"openai: {openai.url}/v1")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
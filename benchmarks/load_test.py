@@ -0,0 +1,183 @@
+"""Load test of /get_ai_resume against local fake upstreams, reporting RPS and tail latency per concurrency.
+
+Starts the fake parser and OpenAI servers (benchmarks/fakes.py), runs the service in a
+subprocess pointed at them, and drives it closed-loop at each concurrency level:
+
+    python -m benchmarks.load_test --server flask --concurrency 1 4 16 64 --duration 20
+    python -m benchmarks.load_test --server asgi --mode parallel --output run.json --baseline main.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+import numpy as np
+
+from benchmarks.fakes import add_fake_arguments, start_fakes
+
+ROOT = Path(__file__).resolve().parent.parent
+JOB_DESCRIPTION = "BI / data analyst with 3-4 years of SQL, Tableau and Python, owning OKRs, forecasting and performance reporting."
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_service(server: str, port: int, env: dict) -> subprocess.Popen:
+    if server == "asgi":
+        command = [sys.executable, "-m", "hypercorn", "async_app:app", "--bind", f"127.0.0.1:{port}"]
+    else:
+        command = [sys.executable, "-m", "flask", "--app", "main", "run", "--port", str(port), "--with-threads"]
+    return subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def wait_until_healthy(base_url: str, process: subprocess.Popen, timeout: float = 60) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"service exited with {process.returncode}")
+        try:
+            if httpx.get(f"{base_url}/healthcheck", timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("service did not become healthy")
+
+
+async def run_level(base_url: str, resume_base: str, concurrency: int, duration: float, mode: str, distinct_resumes: int) -> dict:
+    """Closed loop: each of the concurrency workers sends its next request when the previous one returns"""
+    latencies = []
+    errors = 0
+    counter = 0
+    deadline = time.monotonic() + duration
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async def worker(client: httpx.AsyncClient) -> None:
+        nonlocal errors, counter
+        while time.monotonic() < deadline:
+            counter += 1
+            payload = {
+                "resume_url": f"{resume_base}/resumes/{counter % distinct_resumes if distinct_resumes else counter}.pdf",
+                "applied_job_desc": JOB_DESCRIPTION,
+                "mode": mode,
+            }
+            start = time.perf_counter()
+            try:
+                response = await client.request("GET", f"{base_url}/get_ai_resume", json=payload)
+                ok = response.status_code == 200
+            except httpx.HTTPError:
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - start)
+            else:
+                errors += 1
+
+    started = time.perf_counter()
+    async with httpx.AsyncClient(limits=limits, timeout=httpx.Timeout(300)) as client:
+        await asyncio.gather(*[worker(client) for _ in range(concurrency)])
+    elapsed = time.perf_counter() - started
+
+    result = {"concurrency": concurrency, "requests": len(latencies) + errors, "errors": errors, "rps": round(len(latencies) / elapsed, 2)}
+    for name, q in (("p50", 50), ("p95", 95), ("p99", 99)):
+        result[name] = round(float(np.percentile(latencies, q)) * 1000, 1) if latencies else None
+    return result
+
+
+def stage_means(base_url: str) -> dict:
+    """Mean milliseconds per pipeline stage, from the service's /metrics"""
+    sums = {}
+    counts = {}
+    for line in httpx.get(f"{base_url}/metrics", timeout=5).text.splitlines():
+        if line.startswith("resume_stage_seconds_sum") or line.startswith("resume_stage_seconds_count"):
+            series, value = line.rsplit(" ", 1)
+            name = series.split('stage="', 1)[1].split('"', 1)[0]
+            (sums if "_sum" in series else counts)[name] = float(value)
+    return {name: round(sums[name] / counts[name] * 1000, 1) for name in sums if counts.get(name)}
+
+
+def compare(results: list[dict], baseline: list[dict], max_regression: float) -> list[str]:
+    """Levels whose p95 or RPS got worse than the baseline by more than max_regression"""
+    regressions = []
+    previous = {level["concurrency"]: level for level in baseline}
+    for level in results:
+        before = previous.get(level["concurrency"])
+        if not before:
+            continue
+        if before["p95"] and level["p95"] and level["p95"] > before["p95"] * (1 + max_regression):
+            regressions.append(f"c={level['concurrency']}: p95 {before['p95']} -> {level['p95']} ms")
+        if before["rps"] and level["rps"] < before["rps"] * (1 - max_regression):
+            regressions.append(f"c={level['concurrency']}: rps {before['rps']} -> {level['rps']}")
+    return regressions
+
+
+def main() -> int:
+    cli = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    cli.add_argument("--server", choices=["flask", "asgi"], default="flask")
+    cli.add_argument("--mode", choices=["full", "delta", "parallel"], default="full")
+    cli.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 64])
+    cli.add_argument("--duration", type=float, default=15, help="seconds per concurrency level")
+    cli.add_argument("--distinct-resumes", type=int, default=0, help="cycle through this many resume urls (0: every request is new)")
+    cli.add_argument("--parse-cache", action="store_true", help="leave the parse cache on (uses a fresh temporary directory)")
+    cli.add_argument("--local-parser", action="store_true", help="parse the resume files locally first (implies --resume-documents)")
+    cli.add_argument("--output", help="write the results as JSON")
+    cli.add_argument("--baseline", help="results JSON of an earlier run to compare against")
+    cli.add_argument("--max-regression", type=float, default=0.2, help="allowed relative p95/RPS regression vs the baseline")
+    add_fake_arguments(cli)
+    args = cli.parse_args()
+    args.resume_documents = args.resume_documents or args.local_parser
+
+    fake_parser, fake_openai = start_fakes(args)
+    cache_dir = tempfile.TemporaryDirectory(prefix="load_test_")
+    port = free_port()
+    env = dict(
+        os.environ,
+        QUREOS_PARSER_URL=f"{fake_parser.url}/cv-parser/parse?model=4",
+        QUREOS_AUTH="fake",
+        OPENAI_BASE_URL=f"{fake_openai.url}/v1",
+        OPENAI_AUTH="fake",
+        PARSE_CACHE_ENABLED="1" if args.parse_cache else "0",
+        PARSE_CACHE_DIR=cache_dir.name,
+        TASK_WORKERS="0",
+        LOCAL_PARSER_ENABLED="1" if args.local_parser else "0",
+        RESUME_URL_ALLOWED_HOSTS="127.0.0.1",
+        RESUME_URL_SCHEMES="http",
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    process = start_service(args.server, port, env)
+    try:
+        wait_until_healthy(base_url, process)
+        results = []
+        print(f"{args.server} server, {args.mode} mode, {args.duration:g}s per level")
+        print(f"{'conc':>5} {'reqs':>6} {'errs':>5} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+        for concurrency in args.concurrency:
+            level = asyncio.run(run_level(base_url, fake_parser.url, concurrency, args.duration, args.mode, args.distinct_resumes))
+            results.append(level)
+            print(f"{level['concurrency']:>5} {level['requests']:>6} {level['errors']:>5} {level['rps']:>8} {level['p50']!s:>9} {level['p95']!s:>9} {level['p99']!s:>9}")
+        print(f"mean ms per stage: {stage_means(base_url)}")
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+        cache_dir.cleanup()
+
+    if args.output:
+        Path(args.output).write_text(json.dumps({"server": args.server, "mode": args.mode, "levels": results}, indent=2))
+    if args.baseline:
+        regressions = compare(results, json.loads(Path(args.baseline).read_text())["levels"], args.max_regression)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
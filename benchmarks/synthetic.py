@@ -0,0 +1,124 @@
+"""Synthetic Qureos parser responses and resume documents for benchmarks and local stand-ins."""
+import io
+import random
+import zipfile
+from datetime import date
+from xml.sax.saxutils import escape
+
+_WORDS = ("managed analysed developed implemented reporting dashboards stakeholders sql python tableau "
+          "pipelines forecasting budgeting customers quarterly revenue growth team cross-functional data "
+          "insights strategy operations automation kpis okrs planning performance metrics").split()
+
+
+def _sentence(rng: random.Random, words: int = 14) -> str:
+    return " ".join(rng.choice(_WORDS) for _ in range(words)).capitalize() + "."
+
+
+def make_parsed_resume(roles: int = 6, sentences_per_role: int = 6, projects: int = 5, skills: int = 25, seed: int = 7) -> dict:
+    """A parser-shaped response, with the null and extra fields the real parser sends"""
+    rng = random.Random(seed)
+    work_history = []
+    for idx in range(roles):
+        start_year = 2024 - 2 * (idx + 1)
+        work_history.append({
+            "_id": f"{idx:024x}",
+            "title": f"Data Analyst {idx}",
+            "companyName": f"Company {idx}",
+            "location": None if idx % 3 else "Karachi, Pakistan",
+            "startAt": f"{start_year}-0{1 + idx % 9}-01",
+            "endAt": None if idx == 0 else f"{start_year + 2}-0{1 + idx % 9}-01",
+            "jobDescription": " ".join(_sentence(rng) for _ in range(sentences_per_role)),
+            "isCurrent": idx == 0,
+            "skillsUsed": None,
+        })
+    return {
+        "cv": {
+            "firstName": "Synthetic",
+            "lastName": "Candidate",
+            "city": "Karachi",
+            "country": "Pakistan",
+            "nationality": "Pakistani",
+            "bio": " ".join(_sentence(rng) for _ in range(4)),
+            "email": "candidate@example.com",
+            "phone": "+920000000000",
+            "linkedIn": None,
+            "website": None,
+            "skills": [rng.choice(_WORDS) for _ in range(skills)],
+            "languages": ["English", {"name": "Urdu", "proficiency": "Native"}],
+            "workHistory": work_history,
+            "educationHistory": [
+                {"degreeAndField": "BS Computer Science", "schoolName": "University", "startedAt": None, "graduatedAt": "2014-06-01", "gpa": None},
+            ],
+            "projects": [{"title": f"Project {idx}: " + _sentence(rng, 6), "startAt": None, "endAt": None} for idx in range(projects)],
+            "certificates": [{"title": "Tableau Desktop Specialist", "company": "Tableau", "issueDate": None}],
+        },
+        "meta": {"model": 4, "pages": 3},
+    }
+
+
+def resume_lines(parsed: dict) -> list[str]:
+    """A parsed resume written out the way a person lays out a resume document"""
+    cv = parsed["cv"]
+    lines = [f"{cv['firstName']} {cv['lastName']}", f"{cv['city']}, {cv['country']}", f"{cv['email']} | {cv['phone']}", "", "SUMMARY", cv["bio"], "", "WORK EXPERIENCE"]
+    for job in cv["workHistory"]:
+        start = date.fromisoformat(job["startAt"]).strftime("%b %Y")
+        end = date.fromisoformat(job["endAt"]).strftime("%b %Y") if job["endAt"] else "Present"
+        lines.append(f"{job['title']} | {job['companyName']} | {start} - {end}")
+        lines.extend(f"• {sentence.strip()}." for sentence in job["jobDescription"].split(".") if sentence.strip())
+    lines += ["", "EDUCATION"]
+    for education in cv["educationHistory"]:
+        lines.append(f"{education['degreeAndField']}, {education['schoolName']}, {education['graduatedAt'][:4]}")
+    lines += ["", "SKILLS", ", ".join(dict.fromkeys(cv["skills"])), "", "PROJECTS"]
+    lines.extend(project["title"] for project in cv["projects"])
+    lines += ["", "CERTIFICATIONS"]
+    lines.extend(f"{certificate['title']} - {certificate['company']}" for certificate in cv["certificates"])
+    lines += ["", "LANGUAGES", "English (Fluent), Urdu (Native)"]
+    return lines
+
+
+def make_resume_docx(lines: list[str]) -> bytes:
+    """Minimal Word document, one paragraph per line"""
+    paragraphs = "".join(f'<w:p><w:r><w:t xml:space="preserve">{escape(line)}</w:t></w:r></w:p>' for line in lines)
+    document = f'<?xml version="1.0" encoding="UTF-8"?><w:document xmlns:w="{_WORD_NS}"><w:body>{paragraphs}</w:body></w:document>'
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("[Content_Types].xml", _DOCX_CONTENT_TYPES)
+        archive.writestr("word/document.xml", document)
+    return buffer.getvalue()
+
+
+def make_resume_pdf(lines: list[str], lines_per_page: int = 50) -> bytes:
+    """Minimal text PDF with a Helvetica text layer, lines_per_page lines per page"""
+    pages = [lines[start:start + lines_per_page] for start in range(0, len(lines), lines_per_page)] or [[]]
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", b"", b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>"]
+    kids = []
+    for page in pages:
+        text = "".join(f"({_pdf_string(line)}) Tj T* " for line in page)
+        stream = f"BT /F1 9 Tf 11 TL 40 800 Td {text}ET".encode("cp1252", "replace")
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % len(objects))
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>".encode()
+
+    pdf = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(pdf))
+        pdf += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(pdf)
+    pdf += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    pdf += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    pdf += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(pdf)
+
+
+def _pdf_string(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+_WORD_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+_DOCX_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8"?><Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/word/document.xml" ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/></Types>'
+)
@@ -0,0 +1,161 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from loguru import logger
+
+
+class TwoTierCache:
+    """JSON value cache with a bounded in-process LRU tier and a persistent on-disk tier.
+
+    Values are stored as serialized JSON so every ``get`` hands out a fresh object
+    that callers are free to mutate. Writes keep a running size of the disk tier; the
+    directory is only scanned when that goes over max_bytes, or every sweep_interval
+    seconds to drop expired files and pick up what other processes wrote.
+    """
+
+    def __init__(self, name: str, directory: str, max_items: int = 512, ttl: float = 7 * 24 * 3600, max_bytes: int = 512 * 1024 * 1024, sweep_interval: float = 600):
+        self.name = name
+        self.directory = directory
+        self.max_items = max_items
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.sweep_interval = sweep_interval
+        # Size of the disk tier as of the last sweep plus this process's writes since; None until the first sweep
+        self._disk_bytes = None
+        self._next_sweep = 0.0
+        self._sweeping = False
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def make_key(*parts: str) -> str:
+        """Hash the key parts into a fixed length, filesystem safe key"""
+        return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _count(self, counter: str, amount: int = 1) -> None:
+        with self._lock:
+            self.counters[counter] += amount
+
+    def _remember(self, key: str, text: str, expires_at: float) -> None:
+        with self._lock:
+            self._memory[key] = (expires_at, text)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_items:
+                self._memory.popitem(last=False)
+
+    def get(self, key: str) -> dict|list|None:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._memory.move_to_end(key)
+                    self.counters["memory_hits"] += 1
+                    return json.loads(entry[1])
+                del self._memory[key]
+
+        path = self._path(key)
+        try:
+            modified_at = os.path.getmtime(path)
+            if modified_at + self.ttl <= now:
+                os.remove(path)
+                self._count("evictions")
+                raise FileNotFoundError(path)
+            with open(path, "r", encoding="utf-8") as f:
+                text = f.read()
+            value = json.loads(text)
+        except (OSError, ValueError):
+            self._count("misses")
+            return None
+
+        self._remember(key, text, modified_at + self.ttl)
+        self._count("disk_hits")
+        return value
+
+    def set(self, key: str, value: dict|list) -> None:
+        text = json.dumps(value)
+        self._remember(key, text, time.time() + self.ttl)
+
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        data = text.encode("utf-8")
+        try:
+            replaced_size = os.path.getsize(path)
+        except OSError:
+            replaced_size = 0
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"{self.name} cache: could not write {path}: {e}")
+            return
+        with self._lock:
+            self.counters["stores"] += 1
+            if self._disk_bytes is not None:
+                self._disk_bytes += len(data) - replaced_size
+            sweep = not self._sweeping and (
+                self._disk_bytes is None or self._disk_bytes > self.max_bytes or time.time() >= self._next_sweep
+            )
+            if sweep:
+                self._sweeping = True
+        if sweep:
+            try:
+                self._evict_disk()
+            finally:
+                with self._lock:
+                    self._sweeping = False
+
+    def _evict_disk(self) -> None:
+        """Drop expired files, then the oldest ones until the directory is back under 90% of max_bytes"""
+        now = time.time()
+        entries = []
+        total_size = 0
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith(".json"):
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            if stat.st_mtime + self.ttl <= now:
+                self._remove(entry.path)
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total_size += stat.st_size
+
+        entries.sort()
+        # Leave headroom, so the next writes do not each go over max_bytes and rescan
+        target = self.max_bytes * 0.9 if total_size > self.max_bytes else self.max_bytes
+        for _, size, path in entries:
+            if total_size <= target:
+                break
+            self._remove(path)
+            total_size -= size
+        with self._lock:
+            self._disk_bytes = total_size
+            self._next_sweep = now + self.sweep_interval
+
+    def _remove(self, path: str) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            return
+        self._count("evictions")
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self.counters)
+            stats["memory_items"] = len(self._memory)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = round((stats["memory_hits"] + stats["disk_hits"]) / lookups, 4) if lookups else 0.0
+        return stats
@@ -0,0 +1,134 @@
+"""Typed model of the Qureos parser response, decoded straight from the response bytes.
+
+One msgspec decode replaces the old ``json.loads`` + date fix-up + ``remove_null_values`` pass:
+unknown fields are skipped, null scalars are omitted again when converted back to builtins,
+null lists become empty lists and null items are dropped from them, and the derived date
+fields are filled in while decoding.
+Decoding is lax, so numeric fields also accept the numeric strings the parser sometimes sends;
+a response that still does not fit the model raises ParserResponseInvalid.
+"""
+import msgspec
+from loguru import logger
+
+from timeline import TIMELINE_FIELDS, build_cv_timelines, entry_span, parse_date, span_years
+
+
+class Language(msgspec.Struct, omit_defaults=True):
+    name: str|None = None
+    proficiency: str|None = None
+
+
+class WorkExperience(msgspec.Struct, omit_defaults=True):
+    title: str|None = None
+    companyName: str|None = None
+    location: str|None = None
+    startAt: str|None = None
+    endAt: str|None = None
+    jobDescription: str|None = None
+    durationInYears: float|None = None
+    start_date_str: str|None = None
+    end_date_str: str|None = None
+
+    def __post_init__(self):
+        """durationInYears and the start/end date strings the prompt renders"""
+        try:
+            start_date, end_date = entry_span(self.startAt, self.endAt)
+        except ValueError:
+            self.durationInYears = 0
+            self.start_date_str = '0'
+            self.end_date_str = '0'
+            return
+        self.durationInYears = span_years(start_date, end_date)
+        self.start_date_str = start_date.strftime('%Y-%m-%d')
+        self.end_date_str = end_date.strftime('%Y-%m-%d')
+
+
+class Education(msgspec.Struct, omit_defaults=True):
+    degreeAndField: str|None = None
+    schoolName: str|None = None
+    startedAt: str|None = None
+    graduatedAt: str|None = None
+    graduatedAtDate: str|None = None
+
+    def __post_init__(self):
+        graduated_at = parse_date(self.graduatedAt)
+        if graduated_at is not None:
+            self.graduatedAtDate = graduated_at.strftime('%Y-%m-%d')
+
+
+class Project(msgspec.Struct, omit_defaults=True):
+    title: str|None = None
+    startAt: str|None = None
+    endAt: str|None = None
+
+
+class Certificate(msgspec.Struct, omit_defaults=True):
+    title: str|None = None
+    company: str|None = None
+    issueDate: str|None = None
+
+
+LIST_FIELDS = ("skills", "languages", "workHistory", "educationHistory", "projects", "certificates")
+
+
+class Candidate(msgspec.Struct, omit_defaults=True):
+    city: str|None = None
+    country: str|None = None
+    nationality: str|None = None
+    bio: str|None = None
+    email: str|None = None
+    phone: str|None = None
+    linkedIn: str|None = None
+    website: str|None = None
+    skills: list[str|None]|None = []
+    languages: list[str|Language|None]|None = []
+    workHistory: list[WorkExperience|None]|None = []
+    educationHistory: list[Education|None]|None = []
+    projects: list[Project|None]|None = []
+    certificates: list[Certificate|None]|None = []
+    totalExperienceYears: float|None = None
+    # Timeline.to_dict() of each dated section that has dates: merged spans, total years, per-entry date errors
+    timelines: dict[str, dict]|None = None
+
+    def __post_init__(self):
+        # The parser sends null for an empty section as well as null entries inside one
+        for name in LIST_FIELDS:
+            items = getattr(self, name)
+            if items is None:
+                setattr(self, name, [])
+            elif any(item is None for item in items):
+                setattr(self, name, [item for item in items if item is not None])
+        timelines = build_cv_timelines({
+            section: [{start_key: getattr(entry, start_key), end_key: getattr(entry, end_key)} for entry in getattr(self, section)]
+            for section, (start_key, end_key) in TIMELINE_FIELDS.items()
+        })
+        if self.workHistory:
+            # Overlapping roles counted once, unlike a sum of durationInYears
+            self.totalExperienceYears = timelines["workHistory"].total_years
+        self.timelines = {section: timeline.to_dict() for section, timeline in timelines.items() if timeline.spans or timeline.errors} or None
+        for section, timeline in timelines.items():
+            if timeline.errors:
+                logger.warning(f"Unusable dates in {section}: {timeline.errors}")
+
+
+class ParsedResume(msgspec.Struct, omit_defaults=True):
+    cv: Candidate|None = None
+
+
+class ParserResponseInvalid(ValueError):
+    """The parser answered with something that is not a parsed resume"""
+
+
+_decoder = msgspec.json.Decoder(ParsedResume, strict=False)
+
+
+def decode_parsed_resume(data: bytes|str) -> ParsedResume:
+    try:
+        return _decoder.decode(data)
+    except msgspec.DecodeError as e:
+        raise ParserResponseInvalid(f"unreadable parser response: {e}") from e
+
+
+def to_user_data(resume: ParsedResume) -> dict:
+    """Plain dict of the parsed resume, without null values"""
+    return msgspec.to_builtins(resume)
@@ -0,0 +1,232 @@
+"""Process-wide upstream clients with keep-alive connection pools.
+
+Clients are created lazily on first use and dropped in forked children, so a
+pre-forked server (gunicorn, uwsgi) gives every worker its own pools instead of
+sharing sockets inherited from the master. The client libraries themselves (openai
+alone takes about half a second) are imported by the first getter that needs them,
+which keeps them off the cold start; ``preload`` imports them up front instead.
+
+Resume files are only fetched from hosts in RESUME_URL_ALLOWED_HOSTS, redirects included,
+so a client cannot point the service at metadata endpoints or internal hosts. With the
+allowlist empty no resume file is fetched and the url only goes to the Qureos parser.
+"""
+import importlib
+import os
+import threading
+from typing import TYPE_CHECKING
+from urllib.parse import urljoin, urlsplit
+
+from loguru import logger
+
+if TYPE_CHECKING:
+    import httpx
+    import requests
+    from openai import AsyncOpenAI, OpenAI
+
+HTTP_POOL_CONNECTIONS = int(os.getenv("HTTP_POOL_CONNECTIONS", "10"))
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "32"))
+OPENAI_POOL_MAXSIZE = int(os.getenv("OPENAI_POOL_MAXSIZE", "32"))
+OPENAI_POOL_KEEPALIVE = int(os.getenv("OPENAI_POOL_KEEPALIVE", "16"))
+WARMUP_TIMEOUT_SECONDS = float(os.getenv("WARMUP_TIMEOUT_SECONDS", "5"))
+CLIENT_MODULES = ("requests", "httpx", "openai")
+# Hosts resume files may be fetched from; ".example.com" also allows its subdomains
+RESUME_URL_ALLOWED_HOSTS = tuple(host.strip().lower() for host in os.getenv("RESUME_URL_ALLOWED_HOSTS", "").split(",") if host.strip())
+RESUME_URL_SCHEMES = tuple(scheme.strip().lower() for scheme in os.getenv("RESUME_URL_SCHEMES", "https").split(",") if scheme.strip())
+RESUME_URL_MAX_REDIRECTS = int(os.getenv("RESUME_URL_MAX_REDIRECTS", "3"))
+
+_lock = threading.Lock()
+_http_session = None
+_openai_client = None
+_async_http_client = None
+_async_openai_client = None
+
+
+def preload() -> None:
+    """Import the client libraries now rather than on the first request"""
+    for name in CLIENT_MODULES:
+        importlib.import_module(name)
+
+
+def get_http_session() -> "requests.Session":
+    """Shared Session used for the Qureos parser and for fetching resume files"""
+    global _http_session
+    if _http_session is None:
+        with _lock:
+            if _http_session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=HTTP_POOL_CONNECTIONS, pool_maxsize=HTTP_POOL_MAXSIZE)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _http_session = session
+    return _http_session
+
+
+class ResumeUrlNotAllowed(ValueError):
+    """The resume url, or a redirect it led to, is outside RESUME_URL_ALLOWED_HOSTS"""
+
+
+def resume_url_allowed(url: str) -> bool:
+    parts = urlsplit(url)
+    host = (parts.hostname or "").lower()
+    if parts.scheme.lower() not in RESUME_URL_SCHEMES or not host:
+        return False
+    return any(host == allowed or allowed.startswith(".") and host.endswith(allowed) for allowed in RESUME_URL_ALLOWED_HOSTS)
+
+
+def check_resume_url(url: str) -> None:
+    if not resume_url_allowed(url):
+        raise ResumeUrlNotAllowed(f"resume url host is not allowed: {urlsplit(url).hostname!r}")
+
+
+def open_resume_url(method: str, url: str, **kwargs) -> "requests.Response":
+    """Request a resume file with the shared Session, following redirects only while they stay on allowed hosts"""
+    session = get_http_session()
+    for _ in range(RESUME_URL_MAX_REDIRECTS + 1):
+        check_resume_url(url)
+        response = session.request(method, url, allow_redirects=False, **kwargs)
+        if not response.is_redirect:
+            return response
+        response.close()
+        url = urljoin(url, response.headers["Location"])
+    raise ResumeUrlNotAllowed(f"more than {RESUME_URL_MAX_REDIRECTS} redirects")
+
+
+async def open_resume_url_async(method: str, url: str, **kwargs) -> "httpx.Response":
+    """open_resume_url for the async pool; the response is streamed, close it with aclose()"""
+    client = get_async_http_client()
+    for _ in range(RESUME_URL_MAX_REDIRECTS + 1):
+        check_resume_url(url)
+        response = await client.send(client.build_request(method, url, **kwargs), stream=True, follow_redirects=False)
+        if not response.is_redirect:
+            return response
+        await response.aclose()
+        url = urljoin(url, response.headers["Location"])
+    raise ResumeUrlNotAllowed(f"more than {RESUME_URL_MAX_REDIRECTS} redirects")
+
+
+def get_openai_client() -> "OpenAI":
+    """Shared OpenAI client backed by a single httpx connection pool"""
+    global _openai_client
+    if _openai_client is None:
+        with _lock:
+            if _openai_client is None:
+                import httpx
+                from openai import OpenAI
+
+                limits = httpx.Limits(max_connections=OPENAI_POOL_MAXSIZE, max_keepalive_connections=OPENAI_POOL_KEEPALIVE)
+                # Retries are done by resilience.call_with_retries, within the request deadline
+                _openai_client = OpenAI(api_key=os.getenv("OPENAI_AUTH"), http_client=httpx.Client(limits=limits), max_retries=0)
+    return _openai_client
+
+
+def get_async_http_client() -> "httpx.AsyncClient":
+    """Shared async client for the parser, bound to the running event loop"""
+    global _async_http_client
+    if _async_http_client is None:
+        import httpx
+
+        limits = httpx.Limits(max_connections=HTTP_POOL_MAXSIZE, max_keepalive_connections=HTTP_POOL_MAXSIZE)
+        _async_http_client = httpx.AsyncClient(limits=limits, follow_redirects=True)
+    return _async_http_client
+
+
+def get_async_openai_client() -> "AsyncOpenAI":
+    """Shared AsyncOpenAI client, bound to the running event loop"""
+    global _async_openai_client
+    if _async_openai_client is None:
+        import httpx
+        from openai import AsyncOpenAI
+
+        limits = httpx.Limits(max_connections=OPENAI_POOL_MAXSIZE, max_keepalive_connections=OPENAI_POOL_KEEPALIVE)
+        _async_openai_client = AsyncOpenAI(api_key=os.getenv("OPENAI_AUTH"), http_client=httpx.AsyncClient(limits=limits), max_retries=0)
+    return _async_openai_client
+
+
+async def aclose_async_clients() -> None:
+    """Close the async pools, e.g. when the ASGI server shuts down"""
+    global _async_http_client, _async_openai_client
+    if _async_http_client is not None:
+        await _async_http_client.aclose()
+    if _async_openai_client is not None:
+        await _async_openai_client.close()
+    _async_http_client = None
+    _async_openai_client = None
+
+
+def origin(url: str) -> str:
+    scheme, _, rest = url.partition("://")
+    return f"{scheme}://{rest.split('/', 1)[0]}/"
+
+
+def answered(e: Exception) -> bool:
+    """An HTTP error status still means the connection was made"""
+    from openai import APIStatusError
+
+    return isinstance(e, APIStatusError)
+
+
+def warm_connections(parser_url: str) -> dict[str, bool]:
+    """Open a keep-alive connection to the parser and to OpenAI, so the first request skips DNS, TCP and TLS
+
+    Returns whether each upstream answered; a failure is only logged, the pools connect again on demand.
+    """
+    calls = {
+        "parser": lambda: get_http_session().head(origin(parser_url), timeout=WARMUP_TIMEOUT_SECONDS),
+        "openai": lambda: get_openai_client().models.with_raw_response.list(timeout=WARMUP_TIMEOUT_SECONDS),
+    }
+    warmed = {}
+    for upstream, call in calls.items():
+        try:
+            call()
+            warmed[upstream] = True
+        except Exception as e:
+            warmed[upstream] = answered(e)
+            if not warmed[upstream]:
+                logger.warning(f"Could not warm a connection to {upstream}: {e!r}")
+    return warmed
+
+
+async def warm_connections_async(parser_url: str) -> dict[str, bool]:
+    """warm_connections for the async pools"""
+    calls = {
+        "parser": lambda: get_async_http_client().head(origin(parser_url), timeout=WARMUP_TIMEOUT_SECONDS),
+        "openai": lambda: get_async_openai_client().models.with_raw_response.list(timeout=WARMUP_TIMEOUT_SECONDS),
+    }
+    warmed = {}
+    for upstream, call in calls.items():
+        try:
+            await call()
+            warmed[upstream] = True
+        except Exception as e:
+            warmed[upstream] = answered(e)
+            if not warmed[upstream]:
+                logger.warning(f"Could not warm a connection to {upstream}: {e!r}")
+    return warmed
+
+
+def close_clients() -> None:
+    """Close the pools, e.g. from a worker exit hook"""
+    global _http_session, _openai_client
+    with _lock:
+        if _http_session is not None:
+            _http_session.close()
+        if _openai_client is not None:
+            _openai_client.close()
+        _http_session = None
+        _openai_client = None
+
+
+def _reset_after_fork() -> None:
+    """Forget the parent's clients without closing them; their sockets belong to the parent"""
+    global _lock, _http_session, _openai_client, _async_http_client, _async_openai_client
+    _lock = threading.Lock()
+    _http_session = None
+    _openai_client = None
+    _async_http_client = None
+    _async_openai_client = None
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,143 @@
+"""Delta mode: the model only returns rewritten job descriptions, everything else comes from the parser.
+
+The parsed cv is projected onto the same shape as ``resume_schema`` so responses look
+exactly like the full mode ones.
+"""
+import json
+
+from loguru import logger
+
+DELTA_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+    "name": "job_descriptions_schema",
+    "strict": True,
+    "schema": {
+        "type": "object",
+        "properties": {
+        "workHistory": {
+            "type": "array",
+            "description": "Rewritten job description for each experience.",
+            "items": {
+            "type": "object",
+            "properties": {
+                "index": {
+                "type": "integer",
+                "description": "Number of the experience as listed in the prompt."
+                },
+                "jobDescription": {
+                "type": "string",
+                "description": "Rewritten description of the job role."
+                }
+            },
+            "required": [
+                "index",
+                "jobDescription"
+            ],
+            "additionalProperties": False
+            }
+        }
+        },
+        "required": [
+        "workHistory"
+        ],
+        "additionalProperties": False
+    }
+    }
+}
+
+DELTA_INSTRUCTIONS = " Return only the rewritten job description of every experience, together with the number of that experience as listed in the prompt. Do not return any other part of the resume."
+
+
+def _string(value) -> str:
+    return "" if value is None else str(value)
+
+
+def _nullable_string(value) -> str|None:
+    return None if value is None else str(value)
+
+
+def project_parsed_cv(cv: dict) -> dict:
+    """Shape the parser's cv like the model's resume_schema output"""
+    languages = []
+    for language in cv.get("languages") or []:
+        if language is None:
+            continue
+        if isinstance(language, str):
+            languages.append({"name": language, "proficiency": ""})
+        else:
+            languages.append({"name": _string(language.get("name")), "proficiency": _string(language.get("proficiency"))})
+
+    return {
+        "languages": languages,
+        "city": _string(cv.get("city")),
+        "country": _string(cv.get("country")),
+        "educationHistory": [
+            {
+                "degreeAndField": _string(education.get("degreeAndField")),
+                "schoolName": _string(education.get("schoolName")),
+                "startedAt": _nullable_string(education.get("startedAt")),
+                "graduatedAt": _nullable_string(education.get("graduatedAtDate", education.get("graduatedAt"))),
+            }
+            for education in cv.get("educationHistory") or []
+        ],
+        "workHistory": [
+            {
+                "title": _string(job.get("title")),
+                "companyName": _string(job.get("companyName")),
+                "startAt": _string(job.get("startAt")),
+                "endAt": _nullable_string(job.get("endAt")),
+                "jobDescription": _string(job.get("jobDescription")),
+                "location": _nullable_string(job.get("location")),
+            }
+            for job in cv.get("workHistory") or []
+        ],
+        "projects": [
+            {
+                "title": _string(project.get("title")),
+                "startAt": _nullable_string(project.get("startAt")),
+                "endAt": _nullable_string(project.get("endAt")),
+            }
+            for project in cv.get("projects") or []
+        ],
+        "linkedIn": _nullable_string(cv.get("linkedIn")),
+        "website": _nullable_string(cv.get("website")),
+        "skills": [str(skill) for skill in cv.get("skills") or [] if skill is not None],
+        "bio": _nullable_string(cv.get("bio")),
+        "email": _string(cv.get("email")),
+        "phone": _string(cv.get("phone")),
+        "certificates": [
+            {
+                "title": _string(certificate.get("title")),
+                "company": _string(certificate.get("company")),
+                "issueDate": _nullable_string(certificate.get("issueDate")),
+            }
+            for certificate in cv.get("certificates") or []
+        ],
+    }
+
+
+def restore_fields(tailored: dict, user_data: dict, fields: list[str]) -> dict:
+    """Put the parsed cv's own fields back into the model's full-mode cv, e.g. sections trimmed from the prompt"""
+    if fields and isinstance(tailored.get("cv"), dict):
+        parsed = project_parsed_cv(user_data["cv"])
+        for field in fields:
+            tailored["cv"][field] = parsed[field]
+    return tailored
+
+
+def merge_job_descriptions(user_data: dict, ai_delta: str) -> dict:
+    """Merge the model's rewritten job descriptions into the projected parser cv"""
+    return merge_job_description_rewrites(user_data, json.loads(ai_delta).get("workHistory", []))
+
+
+def merge_job_description_rewrites(user_data: dict, rewrites: list[dict]) -> dict:
+    cv = project_parsed_cv(user_data["cv"])
+    work_history = cv["workHistory"]
+    for rewrite in rewrites:
+        position = rewrite.get("index", 0) - 1
+        if 0 <= position < len(work_history):
+            work_history[position]["jobDescription"] = rewrite["jobDescription"]
+        else:
+            logger.warning(f"Model returned a job description for unknown experience {rewrite.get('index')}")
+    return {"cv": cv}
@@ -0,0 +1,84 @@
+"""Registered, normalized job descriptions shared by every candidate tailored against them.
+
+The job description is sent as its own message right after the static system prompt,
+so system prompt + job description form a stable prefix that OpenAI's prompt caching
+can reuse across candidates.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from cache import TwoTierCache
+
+JOB_PROMPT_HEADER = "Following is the job description of the job this candidate is applying to:\n\n"
+
+
+@dataclass(frozen=True)
+class JobDescription:
+    job_id: str
+    text: str
+    prompt: str
+
+
+def normalize_job_description(text: str) -> str:
+    """Collapse runs of spaces and blank lines so cosmetic edits do not change the job id"""
+    lines = [" ".join(line.split()) for line in text.replace("\r\n", "\n").split("\n")]
+    normalized = []
+    for line in lines:
+        if line or (normalized and normalized[-1]):
+            normalized.append(line)
+    return "\n".join(normalized).strip()
+
+
+def job_description_id(normalized_text: str) -> str:
+    return hashlib.sha256(normalized_text.encode("utf-8")).hexdigest()[:16]
+
+
+class JobDescriptionRegistry:
+    """Job descriptions by id; recently used ones stay prepared in memory, all of them persist on disk"""
+
+    def __init__(self, store: TwoTierCache, max_items: int = 256):
+        self.store = store
+        self.max_items = max_items
+        self._prepared = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _remember(self, key: str, job: JobDescription) -> JobDescription:
+        with self._lock:
+            self._prepared[key] = job
+            self._prepared.move_to_end(key)
+            while len(self._prepared) > self.max_items:
+                self._prepared.popitem(last=False)
+        return job
+
+    def _lookup(self, key: str) -> JobDescription|None:
+        with self._lock:
+            job = self._prepared.get(key)
+            if job is not None:
+                self._prepared.move_to_end(key)
+            return job
+
+    def register(self, text: str, job_id: str|None = None) -> JobDescription:
+        """Normalize and store a job description, under job_id or its content hash"""
+        raw_key = "raw:" + hashlib.sha256(text.encode("utf-8")).hexdigest()
+        job = self._lookup(raw_key) if job_id is None else None
+        if job is not None:
+            return job
+
+        normalized = normalize_job_description(text)
+        job = JobDescription(job_id or job_description_id(normalized), normalized, JOB_PROMPT_HEADER + normalized)
+        self.store.set(self.store.make_key(job.job_id), {"text": normalized})
+        self._remember("id:" + job.job_id, job)
+        if job_id is None:
+            self._remember(raw_key, job)
+        return job
+
+    def get(self, job_id: str) -> JobDescription|None:
+        job = self._lookup("id:" + job_id)
+        if job is not None:
+            return job
+        stored = self.store.get(self.store.make_key(job_id))
+        if stored is None:
+            return None
+        return self._remember("id:" + job_id, JobDescription(job_id, stored["text"], JOB_PROMPT_HEADER + stored["text"]))
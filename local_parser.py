@@ -0,0 +1,443 @@
+"""Local resume parsing: text out of PDF and DOCX files, segmented into the parser's ``cv`` shape.
+
+Tried before the Qureos parser when LOCAL_PARSER_ENABLED is set. PDF pages are extracted
+in a process pool (pypdf is pure Python and holds the GIL), DOCX needs only the standard
+library. The text is split into sections by their headings and each section is read with
+simple layout rules. Every parse gets a confidence in [0, 1] from how much of the expected
+structure was found; below LOCAL_PARSER_MIN_CONFIDENCE the caller uses the remote parser.
+"""
+import io
+import multiprocessing
+import os
+import re
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from functools import lru_cache
+from xml.etree import ElementTree
+
+import msgspec
+from loguru import logger
+
+from candidate import ParsedResume, to_user_data
+from metrics import registry
+from timeline import PRESENT_WORDS, parse_date
+
+LOCAL_PARSER_ENABLED = os.getenv("LOCAL_PARSER_ENABLED", "0") == "1"
+LOCAL_PARSER_MIN_CONFIDENCE = float(os.getenv("LOCAL_PARSER_MIN_CONFIDENCE", "0.7"))
+LOCAL_PARSER_MAX_BYTES = int(os.getenv("LOCAL_PARSER_MAX_MB", "10")) * 1024 * 1024
+# Uncompressed size of word/document.xml; a zip bomb stops here instead of filling memory
+LOCAL_PARSER_MAX_XML_BYTES = int(os.getenv("LOCAL_PARSER_MAX_XML_MB", "20")) * 1024 * 1024
+LOCAL_PARSER_MAX_PAGES = int(os.getenv("LOCAL_PARSER_MAX_PAGES", "10"))
+LOCAL_PARSER_PROCESSES = int(os.getenv("LOCAL_PARSER_PROCESSES", str(min(4, os.cpu_count() or 1))))
+# Smaller documents are extracted in the calling thread, where the pool round trip would cost more than it saves
+LOCAL_PARSER_POOL_MIN_PAGES = int(os.getenv("LOCAL_PARSER_POOL_MIN_PAGES", "4"))
+
+LOCAL_PARSES = registry.counter("resume_local_parses_total", "Local parse attempts, by outcome.", ("outcome",))
+LOCAL_CONFIDENCE = registry.histogram(
+    "resume_local_parse_confidence", "Confidence of local parses.", buckets=(0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0),
+)
+
+SECTION_HEADINGS = {
+    "bio": ("summary", "professional summary", "profile", "professional profile", "about", "about me", "objective", "career objective"),
+    "workHistory": (
+        "experience", "work experience", "professional experience", "employment", "employment history",
+        "work history", "career history", "relevant experience",
+    ),
+    "educationHistory": ("education", "academic background", "academic qualifications", "qualifications", "education and training"),
+    "skills": ("skills", "technical skills", "key skills", "core skills", "core competencies", "competencies", "skills and tools"),
+    "projects": ("projects", "key projects", "personal projects", "academic projects"),
+    "certificates": ("certifications", "certificates", "licenses and certifications", "licenses & certifications", "courses", "training"),
+    "languages": ("languages", "language skills"),
+}
+_HEADING_SECTIONS = {heading: section for section, headings in SECTION_HEADINGS.items() for heading in headings}
+
+_MONTH = r"(?:jan|feb|mar|apr|may|jun|jul|aug|sep|sept|oct|nov|dec)[a-z]*\.?"
+_DATE = rf"(?:{_MONTH},?\s+\d{{4}}|\d{{1,2}}/\d{{4}}|\d{{4}}[-/.]\d{{1,2}}|(?:19|20)\d{{2}})"
+_END = rf"(?:{_DATE}|{'|'.join(sorted(PRESENT_WORDS, key=len, reverse=True))})"
+DATE_RANGE_RE = re.compile(rf"(?P<start>{_DATE})\s*(?:-|–|—|to|until)\s*(?P<end>{_END})", re.I)
+DATE_RE = re.compile(_DATE, re.I)
+EMAIL_RE = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+PHONE_RE = re.compile(r"\+?\d[\d ().-]{7,}\d")
+LINKEDIN_RE = re.compile(r"(?:https?://)?(?:[a-z]{2,3}\.)?linkedin\.com/[^\s,|]+", re.I)
+URL_RE = re.compile(r"(?:https?://|www\.)[^\s,|]+", re.I)
+BULLET_RE = re.compile(r"^\s*[•●▪◦‣∙·*\-–]\s*")
+DEGREE_RE = re.compile(
+    r"\b(?:bachelor|master|doctor|associate|diploma|b\.?sc?|m\.?sc?|b\.?a|m\.?a|b\.?e|b\.?tech|m\.?tech|mba|ph\.?d|bs|ms|a-levels?|o-levels?|hsc|ssc|intermediate|matric)\b",
+    re.I,
+)
+SCHOOL_RE = re.compile(r"\b(?:university|college|institute|school|academy|polytechnic)\b", re.I)
+COMPANY_RE = re.compile(r"\b(?:inc|ltd|llc|llp|plc|corp|corporation|company|co|group|bank|technologies|solutions|limited|gmbh|pvt)\b\.?", re.I)
+_FIELD_SPLIT_RE = re.compile(r"\s+\|\s+|\s+[-–—]\s+|\s+at\s+|,\s+|\s{3,}|\t")
+_LIST_SPLIT_RE = re.compile(r"[,;|•●▪·]|\s{3,}|\t")
+
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+
+class DocumentTooLarge(ValueError):
+    """The resume file is over LOCAL_PARSER_MAX_BYTES, or its DOCX text over LOCAL_PARSER_MAX_XML_BYTES"""
+
+
+@dataclass
+class LocalParse:
+    user_data: dict
+    confidence: float
+    format: str
+
+    @property
+    def accepted(self) -> bool:
+        return self.confidence >= LOCAL_PARSER_MIN_CONFIDENCE
+
+
+def check_size(size: int) -> None:
+    if size > LOCAL_PARSER_MAX_BYTES:
+        raise DocumentTooLarge(f"resume file is over {LOCAL_PARSER_MAX_BYTES // (1024 * 1024)} MB")
+
+
+def sniff_format(document: bytes) -> str|None:
+    if document.startswith(b"%PDF"):
+        return "pdf"
+    if document.startswith(b"PK"):
+        try:
+            with zipfile.ZipFile(io.BytesIO(document)) as archive:
+                if "word/document.xml" in archive.namelist():
+                    return "docx"
+        except zipfile.BadZipFile:
+            return None
+    return None
+
+
+@lru_cache(maxsize=1)
+def pdf_support() -> bool:
+    try:
+        import pypdf  # noqa: F401
+        return True
+    except ImportError:
+        logger.warning("pypdf is not installed, PDF resumes go to the remote parser")
+        return False
+
+
+def extract_pdf_pages(document: bytes, start: int, stop: int) -> list[str]:
+    """Text of pages start..stop; runs in the pool's worker processes"""
+    from pypdf import PdfReader
+    reader = PdfReader(io.BytesIO(document))
+    return [reader.pages[index].extract_text() or "" for index in range(start, stop)]
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ProcessPoolExecutor:
+    """Lazily started pool; spawned rather than forked, so workers do not inherit the server's threads"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ProcessPoolExecutor(LOCAL_PARSER_PROCESSES, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def reset_pool(pool: ProcessPoolExecutor) -> None:
+    """Drop a pool whose worker died, so the next parse starts a new one"""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def extract_pdf_text(document: bytes) -> str:
+    from pypdf import PdfReader
+    pages = min(len(PdfReader(io.BytesIO(document)).pages), LOCAL_PARSER_MAX_PAGES)
+    if pages < LOCAL_PARSER_POOL_MIN_PAGES or LOCAL_PARSER_PROCESSES <= 1:
+        return "\n".join(extract_pdf_pages(document, 0, pages))
+    chunk = -(-pages // LOCAL_PARSER_PROCESSES)
+    pool = get_pool()
+    try:
+        futures = [pool.submit(extract_pdf_pages, document, start, min(start + chunk, pages)) for start in range(0, pages, chunk)]
+        return "\n".join(text for future in futures for text in future.result())
+    except BrokenProcessPool:
+        reset_pool(pool)
+        raise
+
+
+def extract_docx_text(document: bytes) -> str:
+    """One line per paragraph of word/document.xml, tables included"""
+    with zipfile.ZipFile(io.BytesIO(document)) as archive:
+        # zipfile never returns more than the declared size, so checking it bounds the read
+        if archive.getinfo("word/document.xml").file_size > LOCAL_PARSER_MAX_XML_BYTES:
+            raise DocumentTooLarge(f"word/document.xml is over {LOCAL_PARSER_MAX_XML_BYTES // (1024 * 1024)} MB uncompressed")
+        root = ElementTree.fromstring(archive.read("word/document.xml"))
+    lines = []
+    for paragraph in root.iter(f"{_W}p"):
+        parts = []
+        for node in paragraph.iter():
+            if node.tag == f"{_W}t":
+                parts.append(node.text or "")
+            elif node.tag == f"{_W}tab":
+                parts.append("\t")
+            elif node.tag in (f"{_W}br", f"{_W}cr"):
+                parts.append("\n")
+        lines.append("".join(parts))
+    return "\n".join(lines)
+
+
+def extract_text(document: bytes, document_format: str) -> str:
+    if document_format == "pdf":
+        return extract_pdf_text(document)
+    return extract_docx_text(document)
+
+
+def heading_section(line: str) -> str|None:
+    """Section a heading line starts, like "WORK EXPERIENCE" or "Skills:" """
+    words = re.sub(r"[^a-z& ]", " ", line.lower()).split()
+    if not words or len(words) > 4:
+        return None
+    return _HEADING_SECTIONS.get(" ".join(words))
+
+
+def split_sections(lines: list[str]) -> tuple[list[str], dict[str, list[str]]]:
+    """Lines before the first heading, and the lines under each known heading"""
+    header = []
+    sections = {}
+    current = header
+    for line in lines:
+        section = heading_section(line)
+        if section is not None:
+            current = sections.setdefault(section, [])
+        else:
+            current.append(line)
+    return header, sections
+
+
+def iso_date(text: str|None) -> str|None:
+    """ISO date of a resume date like "Sept. 2020", "03/2021" or "2019"; None for present or unreadable"""
+    if not text:
+        return None
+    text = text.strip()
+    if re.fullmatch(r"\d{4}[/.]\d{1,2}", text):
+        text = re.sub(r"[/.]", "-", text)
+    else:
+        text = re.sub(r"\bsept\b", "sep", " ".join(text.replace(".", " ").replace(",", " ").split()), flags=re.I)
+    if text.lower() in PRESENT_WORDS:
+        return None
+    parsed = parse_date(text)
+    return parsed.isoformat() if parsed else None
+
+
+def strip_bullet(line: str) -> str:
+    return BULLET_RE.sub("", line).strip()
+
+
+def is_description_line(line: str) -> bool:
+    """Bullets and sentences belong to a description; short plain lines are titles, companies or places"""
+    return bool(BULLET_RE.match(line)) or len(line) > 80 or line.rstrip().endswith(".")
+
+
+def split_fields(text: str) -> list[str]:
+    return [part.strip(" |,-–—()") for part in _FIELD_SPLIT_RE.split(text) if part.strip(" |,-–—()")]
+
+
+def split_list(lines: list[str]) -> list[str]:
+    items = []
+    for line in lines:
+        line = strip_bullet(line)
+        if ":" in line and len(line.split(":", 1)[0].split()) <= 3:
+            line = line.split(":", 1)[1]
+        items.extend(item.strip(" .") for item in _LIST_SPLIT_RE.split(line))
+    return list(dict.fromkeys(item for item in items if item and len(item.split()) <= 5))
+
+
+def title_and_company(fields: list[str]) -> tuple[str|None, str|None, str|None]:
+    """Title, company and location from a role's header fields, swapping a company written first"""
+    fields = fields + [None] * (3 - len(fields))
+    title, company, location = fields[:3]
+    if title and company and COMPANY_RE.search(title) and not COMPANY_RE.search(company):
+        title, company = company, title
+    return title, company, location
+
+
+def parse_work_history(lines: list[str]) -> list[dict]:
+    """A line with a date range starts a role; the short lines just around it name the role"""
+    entries = []
+    header_lines = []
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        match = DATE_RANGE_RE.search(line)
+        if match:
+            rest = (line[:match.start()] + " | " + line[match.end():]).strip(" |,-–—()")
+            fields = [field for text in header_lines[-2:] + [rest] for field in split_fields(text)]
+            title, company, location = title_and_company(fields)
+            entries.append({
+                "title": title, "companyName": company, "location": location,
+                "startAt": iso_date(match["start"]), "endAt": iso_date(match["end"]), "description": [],
+            })
+            header_lines = []
+        elif is_description_line(line):
+            if entries:
+                entries[-1]["description"].extend(header_lines)
+                entries[-1]["description"].append(line)
+            header_lines = []
+        else:
+            entry = entries[-1] if entries else None
+            if entry is not None and not entry["description"] and (entry["title"] is None or entry["companyName"] is None):
+                # Title or company on its own line right below the dates
+                fields = split_fields(line)
+                if entry["title"] is None:
+                    entry["title"] = fields[0] if fields else None
+                elif entry["companyName"] is None:
+                    entry["companyName"] = fields[0] if fields else None
+            else:
+                header_lines.append(line)
+    if entries:
+        entries[-1]["description"].extend(header_lines)
+    for entry in entries:
+        entry["title"], entry["companyName"], _ = title_and_company([entry["title"], entry["companyName"]])
+        description = " ".join(strip_bullet(line) for line in entry.pop("description") if strip_bullet(line))
+        entry["jobDescription"] = description or None
+    return entries
+
+
+def parse_education(lines: list[str]) -> list[dict]:
+    entries = []
+    for line in lines:
+        line = strip_bullet(line)
+        if not line:
+            continue
+        degree = next((field for field in split_fields(line) if DEGREE_RE.search(field)), None)
+        school = next((field for field in split_fields(line) if SCHOOL_RE.search(field)), None)
+        entry = entries[-1] if entries else None
+        if entry is None or (degree and entry["degreeAndField"]) or (school and entry["schoolName"]):
+            entry = {"degreeAndField": None, "schoolName": None, "startedAt": None, "graduatedAt": None}
+            entries.append(entry)
+        entry["degreeAndField"] = entry["degreeAndField"] or degree
+        entry["schoolName"] = entry["schoolName"] or school
+        match = DATE_RANGE_RE.search(line)
+        if match:
+            entry["startedAt"] = iso_date(match["start"])
+            entry["graduatedAt"] = iso_date(match["end"])
+        elif not entry["graduatedAt"]:
+            dates = DATE_RE.findall(line)
+            entry["graduatedAt"] = iso_date(dates[-1]) if dates else None
+    return [entry for entry in entries if entry["degreeAndField"] or entry["schoolName"]]
+
+
+def parse_certificates(lines: list[str]) -> list[dict]:
+    certificates = []
+    for line in lines:
+        line = strip_bullet(line)
+        if not line:
+            continue
+        dates = DATE_RE.findall(line)
+        fields = split_fields(DATE_RE.sub("", line))
+        if fields:
+            certificates.append({"title": fields[0], "company": fields[1] if len(fields) > 1 else None, "issueDate": iso_date(dates[-1]) if dates else None})
+    return certificates
+
+
+def parse_projects(lines: list[str]) -> list[dict]:
+    projects = []
+    for line in lines:
+        line = line.strip()
+        if not line or BULLET_RE.match(line) and projects:
+            continue
+        match = DATE_RANGE_RE.search(line)
+        title = (line[:match.start()] + line[match.end():]).strip(" |,-–—()") if match else strip_bullet(line)
+        if title and len(title) <= 120:
+            projects.append({"title": title, "startAt": iso_date(match["start"]) if match else None, "endAt": iso_date(match["end"]) if match else None})
+    return projects
+
+
+def parse_languages(lines: list[str]) -> list:
+    languages = []
+    for item in split_list(lines):
+        match = re.fullmatch(r"(?P<name>[^()\-:]+?)\s*(?:\((?P<paren>[^)]+)\)|[-:]\s*(?P<level>.+))", item)
+        if match:
+            languages.append({"name": match["name"], "proficiency": match["paren"] or match["level"]})
+        else:
+            languages.append(item)
+    return languages
+
+
+def parse_contact(text: str, header: list[str]) -> dict:
+    email = EMAIL_RE.search(text)
+    phone = PHONE_RE.search(text)
+    linkedin = LINKEDIN_RE.search(text)
+    website = next((url for url in URL_RE.findall(text) if "linkedin.com" not in url.lower()), None)
+    contact = {
+        "email": email.group() if email else None,
+        "phone": phone.group().strip() if phone else None,
+        "linkedIn": linkedin.group() if linkedin else None,
+        "website": website,
+    }
+    for line in header:
+        line = re.sub(r"^\s*(?:location|address)\s*:\s*", "", line, flags=re.I).strip()
+        parts = [part.strip() for part in line.split(",")]
+        if len(parts) == 2 and all(re.fullmatch(r"[A-Za-z][A-Za-z .'-]{1,30}", part) for part in parts):
+            contact["city"], contact["country"] = parts
+            break
+    return contact
+
+
+def segment_resume(text: str) -> tuple[dict, int]:
+    """Parser-shaped cv of the resume text, and how many known sections it had"""
+    lines = [line.rstrip() for line in text.replace("\r", "\n").splitlines()]
+    header, sections = split_sections(lines)
+    cv = parse_contact(text, header)
+    cv["bio"] = " ".join(strip_bullet(line) for line in sections.get("bio", []) if line.strip()) or None
+    cv["workHistory"] = parse_work_history(sections.get("workHistory", []))
+    cv["educationHistory"] = parse_education(sections.get("educationHistory", []))
+    cv["skills"] = split_list(sections.get("skills", []))
+    cv["projects"] = parse_projects(sections.get("projects", []))
+    cv["certificates"] = parse_certificates(sections.get("certificates", []))
+    cv["languages"] = parse_languages(sections.get("languages", []))
+    return cv, len(sections)
+
+
+def score_confidence(cv: dict, text: str, section_count: int) -> float:
+    """Weighted share of the structure a usable parse has; experiences weigh most, as they are what gets tailored"""
+    work_history = cv["workHistory"]
+    if work_history:
+        fields = ("title", "companyName", "startAt", "jobDescription")
+        work = sum(sum(bool(job.get(field)) for field in fields) for job in work_history) / (len(fields) * len(work_history))
+    else:
+        work = 0.0
+    checks = (
+        (0.10, min(1.0, len(text.strip()) / 500)),
+        (0.10, 1.0 if cv.get("email") or cv.get("phone") else 0.0),
+        (0.15, min(1.0, section_count / 4)),
+        (0.35, work),
+        (0.15, 1.0 if any(entry["schoolName"] or entry["degreeAndField"] for entry in cv["educationHistory"]) else 0.0),
+        (0.15, 1.0 if len(cv["skills"]) >= 3 else 0.0),
+    )
+    return round(sum(weight * score for weight, score in checks), 3)
+
+
+def parse_document(document: bytes) -> LocalParse|None:
+    """Parse a PDF or DOCX resume locally; None when the format is not supported"""
+    document_format = sniff_format(document)
+    if document_format is None or document_format == "pdf" and not pdf_support():
+        LOCAL_PARSES.inc(outcome="unsupported")
+        return None
+    try:
+        text = extract_text(document, document_format)
+        cv, section_count = segment_resume(text)
+        user_data = to_user_data(msgspec.convert({"cv": cv}, ParsedResume))
+    except DocumentTooLarge as e:
+        logger.warning(f"Local {document_format} parse skipped: {e}")
+        LOCAL_PARSES.inc(outcome="too_large")
+        return None
+    except Exception as e:
+        logger.warning(f"Local {document_format} parse failed: {e!r}")
+        LOCAL_PARSES.inc(outcome="failed")
+        return None
+    result = LocalParse(user_data, score_confidence(cv, text, section_count), document_format)
+    LOCAL_CONFIDENCE.observe(result.confidence)
+    LOCAL_PARSES.inc(outcome="accepted" if result.accepted else "low_confidence")
+    logger.debug(f"Local {document_format} parse confidence {result.confidence}")
+    return result
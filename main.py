@@ -1,27 +1,196 @@
-import requests
 import json
-from flask import Flask, request
+import hashlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, Response, g, request, stream_with_context
 from flask_cors import CORS
 from flask import jsonify 
 from dotenv import load_dotenv
 import os
-from datetime import datetime
 import logging
-from openai import OpenAI
+from typing import TYPE_CHECKING
 from loguru import logger
+# Before the local modules, which read their settings from the environment when imported
 load_dotenv()
+from cache import TwoTierCache
+from candidate import ParserResponseInvalid, decode_parsed_resume, to_user_data
+from clients import ResumeUrlNotAllowed, get_http_session, get_openai_client, open_resume_url, preload, resume_url_allowed, warm_connections
+from streaming import CvSectionStream, format_sse
+from delta import DELTA_INSTRUCTIONS, DELTA_RESPONSE_FORMAT, merge_job_description_rewrites, merge_job_descriptions, project_parsed_cv, restore_fields
+from job_descriptions import JobDescription, JobDescriptionRegistry
+from local_parser import LOCAL_PARSER_ENABLED, DocumentTooLarge, check_size, parse_document
+from metrics import CONTENT_TYPE, REQUEST_SECONDS, TRACE_HEADER, cache_collector, in_context, record_upstream_response, registry, server_timing, single_flight_collector, stage, start_trace, upstream_call
+from single_flight import SingleFlight, flight_key
+from task_queue import WorkerPool, create_task_store
+from prompt_renderer import EXPERIENCE_GROUP_HEADER, PROMPT_FOOTER, remove_null_values, render_candidate_prompt, render_experience, store_candidate_prompt, stored_candidate_prompt
+from relevance import RELEVANCE_INSTRUCTIONS, apply_relevance, rank_candidate
+from rate_limit import BATCH, openai_rate_limiter, priority_scope
+from response_cache import (
+    cache_response,
+    deterministic_params,
+    deterministic_scope,
+    get_cached_response,
+    is_deterministic,
+    preserialize,
+    requested_deterministic,
+    response_cache,
+    response_cache_key,
+)
+from resilience import REQUEST_DEADLINE_SECONDS, CircuitOpenError, DeadlineExceeded, bounded_timeout, call_with_retries, deadline_scope, get_breaker, hedged_call, retry_after
+from token_budget import CompletionTruncated, PromptBudget, build_budgeted_prompt, count_static_tokens, count_tokens, estimate_prompt_budget, get_encoding, larger_completion_params, render_with_tokens, trimmed_fields
+if TYPE_CHECKING:
+    from openai import OpenAI
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 GEMINI_AUTH = os.getenv("GEMINI_AUTH")
 QUREOS_AUTH = os.getenv("QUREOS_AUTH")
+TAILOR_MODE = os.getenv("TAILOR_MODE", "full")
+RELEVANCE_RANKING = os.getenv("RELEVANCE_RANKING", "0") == "1"
+PARALLEL_GROUP_SIZE = int(os.getenv("PARALLEL_GROUP_SIZE", "1"))
+PARALLEL_MAX_WORKERS = int(os.getenv("PARALLEL_MAX_WORKERS", "8"))
+QUREOS_PARSER_URL = os.getenv("QUREOS_PARSER_URL", "https://apiv3aws.qureos.com/cv-parser/parse?model=4")
+PARSER_CONNECT_TIMEOUT_SECONDS = float(os.getenv("PARSER_CONNECT_TIMEOUT_SECONDS", "3.05"))
+PARSER_TIMEOUT_SECONDS = float(os.getenv("PARSER_TIMEOUT_SECONDS", "60"))
+# Send a second parser request when the first is slower than this; 0 disables hedging
+PARSER_HEDGE_AFTER_SECONDS = float(os.getenv("PARSER_HEDGE_AFTER_SECONDS", "0"))
+OPENAI_TIMEOUT_SECONDS = float(os.getenv("OPENAI_TIMEOUT_SECONDS", "90"))
+# "lazy" imports the upstream client libraries on first use; "eager" at startup, e.g. before a pre-fork server forks
+STARTUP_MODE = os.getenv("STARTUP_MODE", "lazy")
+# Let /readyz open connections to the parser and OpenAI before reporting ready
+READINESS_WARM_CONNECTIONS = os.getenv("READINESS_WARM_CONNECTIONS", "1") == "1"
+
+PARSE_CACHE_ENABLED = os.getenv("PARSE_CACHE_ENABLED", "1") == "1"
+# Bump when the shape of the cached, decoded parser output or the rendered prompt stored with it changes
+PARSE_CACHE_VERSION = "typed-v3"
+parse_cache = TwoTierCache(
+    "parse",
+    os.getenv("PARSE_CACHE_DIR", ".cache/parsed_resumes"),
+    max_items=int(os.getenv("PARSE_CACHE_MEMORY_ITEMS", "512")),
+    ttl=float(os.getenv("PARSE_CACHE_TTL_SECONDS", str(7 * 24 * 3600))),
+    max_bytes=int(os.getenv("PARSE_CACHE_MAX_MB", "512")) * 1024 * 1024,
+)
+
+job_registry = JobDescriptionRegistry(TwoTierCache(
+    "job_descriptions",
+    os.getenv("JOB_DESCRIPTION_DIR", ".cache/job_descriptions"),
+    ttl=float(os.getenv("JOB_DESCRIPTION_TTL_SECONDS", str(90 * 24 * 3600))),
+))
+
+parse_flights = SingleFlight("parse", copy_result=True)
+openai_flights = SingleFlight("openai")
+
+openai_usage_lock = threading.Lock()
+openai_usage_totals = {"requests": 0, "prompt_tokens": 0, "cached_tokens": 0, "completion_tokens": 0}
+
+def collect_openai_usage() -> list[tuple]:
+    with openai_usage_lock:
+        totals = dict(openai_usage_totals)
+    return [
+        ("resume_openai_requests_total", "counter", "Completions that reported token usage.", [({}, totals["requests"])]),
+        ("resume_openai_tokens_total", "counter", "OpenAI tokens from response.usage, by kind.", [
+            ({"kind": kind}, totals[f"{kind}_tokens"]) for kind in ("prompt", "cached", "completion")
+        ]),
+    ]
+
+registry.register_collector(cache_collector(parse_cache, job_registry.store, response_cache))
+registry.register_collector(single_flight_collector(parse_flights, openai_flights))
+registry.register_collector(collect_openai_usage)
+# Created up front so /metrics shows both circuits before the first call
+get_breaker("parser")
+get_breaker("openai")
 
 app = Flask(__name__)
 cors = CORS(app)
 
+def download_resume(resume_url: str) -> bytes:
+    """The resume file, streamed and given up on once it is over LOCAL_PARSER_MAX_MB"""
+    with open_resume_url("GET", resume_url, stream=True, timeout=bounded_timeout(15, "resume_file")) as response:
+        response.raise_for_status()
+        check_size(int(response.headers.get("Content-Length") or 0))
+        chunks = []
+        size = 0
+        for chunk in response.iter_content(64 * 1024):
+            size += len(chunk)
+            check_size(size)
+            chunks.append(chunk)
+    return b"".join(chunks)
+
+def get_resume_fingerprint(resume_url: str) -> tuple[str|None, bytes|None]:
+    """Fingerprint the resume file behind the url: ETag if the host sends one, else a hash of the bytes.
+
+    The bytes are returned too when they had to be downloaded, so the local parser does not fetch them again.
+    """
+    import requests
+
+    try:
+        head = open_resume_url("HEAD", resume_url, timeout=bounded_timeout(5, "resume_file"))
+        if head.ok:
+            etag = head.headers.get("ETag")
+            if etag:
+                return f"etag:{etag}", None
+        document = download_resume(resume_url)
+        return f"sha256:{hashlib.sha256(document).hexdigest()}", document
+    except (requests.RequestException, DocumentTooLarge, ResumeUrlNotAllowed) as e:
+        logger.warning(f"Could not fingerprint {resume_url}, skipping parse cache: {e}")
+        return None, None
+
 def get_parse_resume_json(resume_url: str) -> dict:
+    """Parse the resume (locally or with the Qureos CV parser); concurrent requests for the same url share one parse.
+
+    The result is already normalized (no nulls, durations and date strings filled in).
+    """
+    return parse_flights.do(resume_url.strip(), load_parse_resume_json, resume_url)
+
+def load_parse_resume_json(resume_url: str) -> dict:
+    """Parse the resume, served from the parse cache when the file is unchanged"""
+    if not PARSE_CACHE_ENABLED or not resume_url_allowed(resume_url):
+        return parse_resume(resume_url)
+
+    with stage("fingerprint"):
+        fingerprint, document = get_resume_fingerprint(resume_url)
+    if fingerprint is None:
+        return parse_resume(resume_url)
 
-    url = "https://apiv3aws.qureos.com/cv-parser/parse?model=4"
+    cache_key = parse_cache.make_key(resume_url, fingerprint, PARSE_CACHE_VERSION)
+    cached = parse_cache.get(cache_key)
+    if cached is not None:
+        logger.debug(f"parse cache hit for {resume_url}: {parse_cache.stats()}")
+        return cached
 
+    parse_resp = parse_resume(resume_url, document)
+    if isinstance(parse_resp, dict) and parse_resp.get("cv"):
+        parse_cache.set(cache_key, parse_resp)
+    return parse_resp
+
+def parse_resume(resume_url: str, document: bytes|None = None) -> dict:
+    """Local parse when it is enabled and confident enough, else the Qureos parser; the candidate prompt is rendered with it"""
+    parse_resp = parse_resume_locally(resume_url, document) if LOCAL_PARSER_ENABLED else None
+    if parse_resp is None:
+        parse_resp = request_parse_resume_json(resume_url)
+    with stage("prompt"):
+        return store_candidate_prompt(parse_resp)
+
+def parse_resume_locally(resume_url: str, document: bytes|None = None) -> dict|None:
+    import requests
+
+    if document is None and not resume_url_allowed(resume_url):
+        return None
+    try:
+        if document is None:
+            with stage("download"):
+                document = download_resume(resume_url)
+        with stage("local_parse"):
+            result = parse_document(document)
+    except (requests.RequestException, DocumentTooLarge, ResumeUrlNotAllowed) as e:
+        logger.warning(f"Could not parse {resume_url} locally: {e}")
+        return None
+    if result is None or not result.accepted:
+        logger.info(f"Local parse of {resume_url} not confident enough ({result.confidence if result else None}), using the remote parser")
+        return None
+    return result.user_data
+
+def build_parser_request(resume_url: str) -> tuple[str, dict]:
     payload = json.dumps({
     "resumeUrl": resume_url
     })
@@ -30,511 +199,477 @@ def get_parse_resume_json(resume_url: str) -> dict:
     'Content-Type': 'application/json',
     'User-Agent': 'insomnia/2023.5.8'
     }
+    return payload, headers
 
-    response = requests.request("POST", url, headers=headers, data=payload)
-
-    return json.loads(response.text)
-
-def remove_null_values(data: dict|list) -> dict:
-  """
-  Recursively removes key-value pairs where the value is None from a dictionary.
-
-  Args:
-    data: The dictionary to process.
-
-  Returns:
-    The dictionary with None values removed.
-  """
-
-  if isinstance(data, dict):
-    return {k: remove_null_values(v) for k, v in data.items() if v is not None}
-  elif isinstance(data, list):
-    return [remove_null_values(item) for item in data]
-  else:
-    return data
-
-def convert_fields(obj):
-    """Recursively convert Object ID to string and dateime to string datetime format"""
-    if isinstance(obj, dict):
-        # If obj is a dictionary, iterate over its items
-        for key, value in obj.items():
-            obj[key] = convert_fields(value)  # Recursively call for nested objects
-    elif isinstance(obj, list):
-        # If obj is a list, iterate through the list and apply conversion to each item
-        return [convert_fields(item) for item in obj]
-    elif isinstance(obj, datetime):
-        # Convert datetime to ISO format string
-        return obj.isoformat()
-    
-    # If obj is neither a dict, list, nor datetime, return it unchanged
-    return obj
-
-def calculate_duration_in_years(work_history: list[dict]) -> float:
-    """To calculate duration in years (with decimal places"""
-    try:
-        current_date = datetime.now()  # Store the current date once for consistency
-        for job in work_history:
-            # Handle start date (it could be either a string or a datetime object)
-            start_at = job.get('startAt')
-            if isinstance(start_at, str):  # If startAt is a string, parse it
-                start_date = datetime.strptime(start_at, "%Y-%m-%d")
-            elif isinstance(start_at, datetime):  # If it's already a datetime object, use it
-                start_date = start_at
-            else:
-                logging.warning("Start_at:", type(start_at))
-                start_date = None
-                logging.warning("startAt field must be a string or a datetime object")
-
-            # Handle end date (it could be either a string, a datetime object, or missing)
-            end_at = job.get('endAt') if job.get('endAt') else current_date
-            if isinstance(end_at, str):  # If endAt is a string, parse it
-                end_date = datetime.strptime(end_at, "%Y-%m-%d")
-            elif isinstance(end_at, datetime):  # If it's already a datetime object, use it
-                end_date = end_at
-            else:  # If endAt is None, use the current date
-                logging.warning("end_at:", type(start_at))
-                end_date = current_date
-                logging.warning("endAt field must be a string or a datetime object")
-
-            # Calculate the difference in days
-            total_days = (end_date - start_date).days
-            
-            # Approximate number of days in a year (to account for leap years)
-            days_in_year = 365.25
-            
-            # Calculate duration in years (with decimal places)
-            duration_in_years = total_days / days_in_year
-            
-            # Insert duration in years into the job dictionary (rounded to 2 decimal places)
-            job['durationInYears'] = round(duration_in_years, 2)
-            job['start_date_str'] = start_date.strftime('%Y-%m-%d')
-            job['end_date_str'] = end_date.strftime('%Y-%m-%d')
+def post_parse_request(resume_url: str) -> bytes:
+    """One parser request, with its read timeout cut to what is left of the request deadline"""
+    payload, headers = build_parser_request(resume_url)
+    timeout = (PARSER_CONNECT_TIMEOUT_SECONDS, bounded_timeout(PARSER_TIMEOUT_SECONDS, "parser"))
+    with stage("parser"), upstream_call("parser"):
+        response = get_http_session().post(QUREOS_PARSER_URL, headers=headers, data=payload, timeout=timeout)
+    record_upstream_response("parser", response.status_code)
+    response.raise_for_status()
+    return response.content
 
-    except Exception as e:
-        job['durationInYears'] = 0
-        job['start_date_str'] = '0'
-        job['end_date_str'] = '0'
-        logging.warning("Error in calculate_duration_in_years function:", str(e))
-        
-def convert_graduated_at(education_history: list[dict]) -> None:
-    for education in education_history:
-        if 'graduatedAt' in education and education['graduatedAt']:
-            # Parse the ISO timestamp
-            graduated_at_date = education.get('graduatedAt', None)
-            if isinstance(graduated_at_date, str):  # If startAt is a string, parse it
-                  graduated_at_date = datetime.strptime(graduated_at_date, "%Y-%m-%d")
-            elif isinstance(graduated_at_date, datetime):  # If it's already a datetime object, use it
-                graduated_at_date = graduated_at_date
-            else:
-                app.logger.warning("Issue in data type of graduated at date in education history:", type(graduated_at_date))
-                raise ValueError("startAt field must be a string or a datetime object")
-            # Convert to desired string format (e.g., 'YYYY-MM-DD')
-            education['graduatedAtDate'] = graduated_at_date.strftime('%Y-%m-%d')
-
-def modify_candidate_data(user_data: dict) -> dict:
-    """Insert duration of work exp and graduatedAt dates"""
+def request_parse_resume_json(resume_url: str) -> dict:
+    """Parse with retries on transient failures, hedging slow requests when PARSER_HEDGE_AFTER_SECONDS is set"""
+    content = call_with_retries("parser", hedged_call, "parser", post_parse_request, resume_url, hedge_after=PARSER_HEDGE_AFTER_SECONDS)
+
+    with stage("normalize"):
+        return to_user_data(decode_parsed_resume(content))
+
+def convert_experience_group_to_prompt(experiences: list[tuple[int, dict]]) -> str:
+    """Prompt for a few experiences of the resume, keeping their numbers from the full list"""
+    return "".join((EXPERIENCE_GROUP_HEADER, *(render_experience(idx, experience) for idx, experience in experiences), PROMPT_FOOTER))
+
+def connect_to_openai() -> "OpenAI":
+    return get_openai_client()
+
+def completion_token_cost(params: dict, budget: PromptBudget|None = None) -> int:
+    """Tokens a call counts against the TPM limit: its prompt plus the max_completion_tokens it may use"""
+    if budget is not None:
+        prompt_tokens = budget.prompt_tokens
+    else:
+        prompt_tokens = sum(
+            count_tokens(part["text"]) for message in params["messages"] for part in message["content"] if part.get("type") == "text"
+        )
+    return prompt_tokens + params.get("max_completion_tokens", 0)
+
+def create_chat_completion(token_cost: int, **params):
+    """One chat completion call, timed out with the request deadline; retried by call_with_retries
+
+    Waits for rate limit capacity first and feeds the response's x-ratelimit-* headers back to the limiter.
+    """
+    from openai import RateLimitError
+
+    with stage("openai_queue"):
+        openai_rate_limiter.acquire(token_cost)
     try:
-        calculate_duration_in_years(user_data['cv']['workHistory'])
-        convert_graduated_at(user_data['cv']['educationHistory'])
+        with stage("openai_stream_open" if params.get("stream") else "openai"), upstream_call("openai"):
+            raw = connect_to_openai().chat.completions.with_raw_response.create(timeout=bounded_timeout(OPENAI_TIMEOUT_SECONDS, "openai"), **params)
+    except RateLimitError as e:
+        openai_rate_limiter.throttled(e.response.headers, retry_after(e))
+        raise
+    openai_rate_limiter.update_from_headers(raw.headers)
+    record_upstream_response("openai", 200)
+    return raw.parse()
 
-    except Exception as e:
-        logging.warning("Error in get_all_candidates function candidate_data:", user_data['cv'])
-        logging.warning("Exception:", str(e))
-    return user_data
-
-def convert_single_json_to_prompt_v2(user_data: dict, applied_job_desc: str) -> str:
-    """Convert each candidate data to formatted string"""
-    
-    user_data = remove_null_values(user_data['cv'])
-    current_location = user_data.get("city", "unknown city") + ", " + user_data.get("country", "unknown country")
-    aboutme = user_data.get('bio', None)
-    experience_details = user_data.get("workHistory", [])
-    education_details = user_data.get("educationHistory", [])    
-    certifications = user_data.get("certificates", [])
-    languages = user_data.get("languages", [])
-    nationality_details = user_data.get('nationality', None)
-    linkedin = user_data.get('linkedIn', None)
-    email = user_data.get("email", None)
-    phone = user_data.get("phone", None)
-    project_details = user_data.get("projects", [])
-    skills = user_data.get("skills", [])
-    
-    
-    # Initialize the prompt
-    prompt = "The following are the details of person's whole resume:\n"
-
-    # Add the current location of the individual
-    prompt += f"""\nThe person is currently located in {current_location}{". Email: " + email if email else ""}{". Phone: " + phone if phone else ""}{". linkedin: " + linkedin if linkedin else ""}\n"""
-
-    if aboutme:
-        prompt += f"About me: \n{aboutme}\n" 
-    
-    if experience_details:
-        prompt += "\nExperiences:\n"
-        
-        # Loop through the experience list and create sentence-based format
-        for idx, experience in enumerate(experience_details, 1):
-            job_title = experience.get("title", "Unknown Position")
-            company_name = experience.get("companyName", "Unknown Company")
-            job_loc = experience.get("location", "Unknown Location")
-            duration_year = experience.get("durationInYears", "Unknown Duration")
-            job_desc = experience.get("jobDescription", "unknown job description")
-            start_date_str = experience.get("start_date_str", "Unknown start date")
-            end_at = str(experience.get("endAt", "Present"))
-            # Construct the experience sentence
-            prompt += f"""{idx}: {job_title} at {company_name} in {job_loc}, with {duration_year} years of experience starting from {start_date_str} and {"presently working" if end_at == "Present" else "ending at " + end_at}. Job description was: {job_desc}\n"""
-    
-    if skills:
-        if isinstance(skills, list):
-            skills = ', '.join([skill for skill in skills])
-            prompt += f"\nPerson is skilled in the following: {skills}\n"
-
-    if education_details:
-        prompt += "\nEducation: \n"
-        for idx, education in enumerate(education_details, 1):
-            education_field = education.get("degreeAndField", "Unknown Field")
-            education_school_name = education.get("schoolName", "Unknown School")
-            education_grad_date = education.get("graduatedAtDate", "Unknown graduation date")
-            prompt += f"{idx}. Studied {education_field} from {education_school_name} and graduated at {education_grad_date}.\n"
-    
-    if certifications:
-        prompt += "Certification:\n"
-        for idx, certification in enumerate(certifications, 1):
-            certification_field = certification.get("title", "unknown certification name")
-            certification_school = certification.get("company", "unknown certification institution")
-            certification_issue_date = certification.get("issueDate", None)
-
-            # Construct the certification sentence
-            prompt += f"""{idx}. Certification in {certification_field} from {certification_school}{" at " + {certification_issue_date} if certification_issue_date else ""}.\n"""
-
-    if nationality_details:
-        prompt += f"\nThis person is {nationality_details} national.\n"
-    
-    if project_details:
-        prompt += "\nPerson has done following projects in his career:\n"
-        for idx, project in enumerate(project_details,1):
-            project_title = project.get("title", "unknown project title")
-            project_start_at =project.get("startAt", None)
-            project_end_at = project.get("endAt", None)
-            prompt += f"""\n{idx}. {project_title}{". Started at " + project_start_at if project_start_at else ""}{" and ended at " + project_end_at if project_end_at else ""}"""
-    
-    if languages:
-        prompt += "\nLanguages:\n"
-        for idx, language in enumerate(languages, 1):
-            if language is None:
-                continue
-            if isinstance(language, str):
-                prompt += f"{idx}. Candidate speaks {language}.\n"
-            else:
-                language_name = language.get("name", "Unknown language name")
-                language_proficiency = language.get("proficiency", "Unknown")
-
-                # Construct the certification sentence
-                prompt += f"\n{idx}. Candidate speaks {language_name} with {language_proficiency} proficiency.\n"
-        
-    # Append instruction for JSON-only output
-    prompt += "\n\n[No prose, output only JSON]\n"
-
-    prompt += "\nFollowing is the job description of the job this candidate is applying to:\n\n"
-    prompt += applied_job_desc
-    return prompt    
-
-def connect_to_openai() -> OpenAI:
-    OPENAI_AUTH = os.getenv("OPENAI_AUTH")
-    openai_client = OpenAI(api_key=OPENAI_AUTH)
-    return openai_client
-
-def get_openai_gen_resume(user_prompt: str, system_prompt: str) -> dict:
-
-    response = connect_to_openai().chat.completions.create(
-    model="gpt-4o",
-    messages=[
-        {
-        "role": "system",
-        "content": [
-            {
-            "type": "text",
-            "text": f"{system_prompt}"
-            }
-        ]
-        },
-        {
-        "role": "user",
-        "content": [
-            {
-            "type": "text",
-            "text": f"{user_prompt}"
-            }
-        ]
-        }
-    ],
-    response_format={
-        "type": "json_schema",
-        "json_schema": {
-        "name": "resume_schema",
-        "strict": True,
-        "schema": {
+RESUME_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+    "name": "resume_schema",
+    "strict": True,
+    "schema": {
+        "type": "object",
+        "properties": {
+        "cv": {
             "type": "object",
             "properties": {
-            "cv": {
+            "languages": {
+                "type": "array",
+                "description": "List of languages spoken by the individual.",
+                "items": {
                 "type": "object",
                 "properties": {
-                "languages": {
-                    "type": "array",
-                    "description": "List of languages spoken by the individual.",
-                    "items": {
-                    "type": "object",
-                    "properties": {
-                        "name": {
-                        "type": "string",
-                        "description": "Name of the language"
-                        },
-                        "proficiency": {
-                        "type": "string",
-                        "description": "Proficiency in the langauage"
-                        }
+                    "name": {
+                    "type": "string",
+                    "description": "Name of the language"
                     },
-                    "required": [
-                        "name",
-                        "proficiency"
-                    ],
-                    "additionalProperties": False
+                    "proficiency": {
+                    "type": "string",
+                    "description": "Proficiency in the langauage"
                     }
                 },
-                "city": {
+                "required": [
+                    "name",
+                    "proficiency"
+                ],
+                "additionalProperties": False
+                }
+            },
+            "city": {
+                "type": "string",
+                "description": "The city of residence."
+            },
+            "country": {
+                "type": "string",
+                "description": "The country of residence."
+            },
+            "educationHistory": {
+                "type": "array",
+                "description": "List of educational qualifications.",
+                "items": {
+                "type": "object",
+                "properties": {
+                    "degreeAndField": {
                     "type": "string",
-                    "description": "The city of residence."
-                },
-                "country": {
+                    "description": "The degree and field of study."
+                    },
+                    "schoolName": {
                     "type": "string",
-                    "description": "The country of residence."
-                },
-                "educationHistory": {
-                    "type": "array",
-                    "description": "List of educational qualifications.",
-                    "items": {
-                    "type": "object",
-                    "properties": {
-                        "degreeAndField": {
-                        "type": "string",
-                        "description": "The degree and field of study."
-                        },
-                        "schoolName": {
-                        "type": "string",
-                        "description": "The name of the school or university attended."
-                        },
-                        "startedAt": {
-                        "type": [
-                            "string",
-                            "null"
-                        ],
-                        "description": "The date when the education started."
-                        },
-                        "graduatedAt": {
-                        "type": [
-                            "string",
-                            "null"
-                        ],
-                        "description": "The date when the education was completed."
-                        }
+                    "description": "The name of the school or university attended."
                     },
-                    "required": [
-                        "degreeAndField",
-                        "schoolName",
-                        "startedAt",
-                        "graduatedAt"
+                    "startedAt": {
+                    "type": [
+                        "string",
+                        "null"
                     ],
-                    "additionalProperties": False
-                    }
-                },
-                "workHistory": {
-                    "type": "array",
-                    "description": "List of work experiences.",
-                    "items": {
-                    "type": "object",
-                    "properties": {
-                        "title": {
-                        "type": "string",
-                        "description": "Job title."
-                        },
-                        "companyName": {
-                        "type": "string",
-                        "description": "Name of the company."
-                        },
-                        "startAt": {
-                        "type": "string",
-                        "description": "The start date of employment."
-                        },
-                        "endAt": {
-                        "type": [
-                            "string",
-                            "null"
-                        ],
-                        "description": "The end date of employment."
-                        },
-                        "jobDescription": {
-                        "type": "string",
-                        "description": "Description of the job role."
-                        },
-                        "location": {
-                        "type": [
-                            "string",
-                            "null"
-                        ],
-                        "description": "Location of the job."
-                        }
+                    "description": "The date when the education started."
                     },
-                    "required": [
-                        "title",
-                        "companyName",
-                        "startAt",
-                        "endAt",
-                        "jobDescription",
-                        "location"
+                    "graduatedAt": {
+                    "type": [
+                        "string",
+                        "null"
                     ],
-                    "additionalProperties": False
+                    "description": "The date when the education was completed."
                     }
                 },
-                "projects": {
-                    "type": "array",
-                    "description": "List of projects undertaken.",
-                    "items": {
-                    "type": "object",
-                    "properties": {
-                        "title": {
-                        "type": "string",
-                        "description": "Title of the project."
-                        },
-                        "startAt": {
-                        "type": [
-                            "string",
-                            "null"
-                        ],
-                        "description": "The start date of the project."
-                        },
-                        "endAt": {
-                        "type": [
-                            "string",
-                            "null"
-                        ],
-                        "description": "The end date of the project."
-                        }
+                "required": [
+                    "degreeAndField",
+                    "schoolName",
+                    "startedAt",
+                    "graduatedAt"
+                ],
+                "additionalProperties": False
+                }
+            },
+            "workHistory": {
+                "type": "array",
+                "description": "List of work experiences.",
+                "items": {
+                "type": "object",
+                "properties": {
+                    "title": {
+                    "type": "string",
+                    "description": "Job title."
                     },
-                    "required": [
-                        "title",
-                        "startAt",
-                        "endAt"
-                    ],
-                    "additionalProperties": False
-                    }
-                },
-                "linkedIn": {
+                    "companyName": {
+                    "type": "string",
+                    "description": "Name of the company."
+                    },
+                    "startAt": {
+                    "type": "string",
+                    "description": "The start date of employment."
+                    },
+                    "endAt": {
                     "type": [
-                    "string",
-                    "null"
+                        "string",
+                        "null"
                     ],
-                    "description": "LinkedIn profile URL."
-                },
-                "website": {
+                    "description": "The end date of employment."
+                    },
+                    "jobDescription": {
+                    "type": "string",
+                    "description": "Description of the job role."
+                    },
+                    "location": {
                     "type": [
-                    "string",
-                    "null"
+                        "string",
+                        "null"
                     ],
-                    "description": "Personal website URL."
-                },
-                "skills": {
-                    "type": "array",
-                    "description": "List of skills possessed.",
-                    "items": {
-                    "type": "string"
+                    "description": "Location of the job."
                     }
                 },
-                "bio": {
+                "required": [
+                    "title",
+                    "companyName",
+                    "startAt",
+                    "endAt",
+                    "jobDescription",
+                    "location"
+                ],
+                "additionalProperties": False
+                }
+            },
+            "projects": {
+                "type": "array",
+                "description": "List of projects undertaken.",
+                "items": {
+                "type": "object",
+                "properties": {
+                    "title": {
+                    "type": "string",
+                    "description": "Title of the project."
+                    },
+                    "startAt": {
+                    "type": [
+                        "string",
+                        "null"
+                    ],
+                    "description": "The start date of the project."
+                    },
+                    "endAt": {
                     "type": [
-                    "string",
-                    "null"
+                        "string",
+                        "null"
                     ],
-                    "description": "Short biography."
+                    "description": "The end date of the project."
+                    }
                 },
-                "email": {
+                "required": [
+                    "title",
+                    "startAt",
+                    "endAt"
+                ],
+                "additionalProperties": False
+                }
+            },
+            "linkedIn": {
+                "type": [
+                "string",
+                "null"
+                ],
+                "description": "LinkedIn profile URL."
+            },
+            "website": {
+                "type": [
+                "string",
+                "null"
+                ],
+                "description": "Personal website URL."
+            },
+            "skills": {
+                "type": "array",
+                "description": "List of skills possessed.",
+                "items": {
+                "type": "string"
+                }
+            },
+            "bio": {
+                "type": [
+                "string",
+                "null"
+                ],
+                "description": "Short biography."
+            },
+            "email": {
+                "type": "string",
+                "description": "Email address."
+            },
+            "phone": {
+                "type": "string",
+                "description": "Phone number."
+            },
+            "certificates": {
+                "type": "array",
+                "description": "List of certificates earned.",
+                "items": {
+                "type": "object",
+                "properties": {
+                    "title": {
                     "type": "string",
-                    "description": "Email address."
-                },
-                "phone": {
+                    "description": "Title of the certificate."
+                    },
+                    "company": {
                     "type": "string",
-                    "description": "Phone number."
-                },
-                "certificates": {
-                    "type": "array",
-                    "description": "List of certificates earned.",
-                    "items": {
-                    "type": "object",
-                    "properties": {
-                        "title": {
-                        "type": "string",
-                        "description": "Title of the certificate."
-                        },
-                        "company": {
-                        "type": "string",
-                        "description": "Company or institution that issued the certificate."
-                        },
-                        "issueDate": {
-                        "type": [
-                            "string",
-                            "null"
-                        ],
-                        "description": "The date when the certificate was issued."
-                        }
+                    "description": "Company or institution that issued the certificate."
                     },
-                    "required": [
-                        "title",
-                        "company",
-                        "issueDate"
+                    "issueDate": {
+                    "type": [
+                        "string",
+                        "null"
                     ],
-                    "additionalProperties": False
+                    "description": "The date when the certificate was issued."
                     }
-                }
                 },
                 "required": [
-                "languages",
-                "city",
-                "country",
-                "educationHistory",
-                "workHistory",
-                "projects",
-                "linkedIn",
-                "website",
-                "skills",
-                "bio",
-                "email",
-                "phone",
-                "certificates"
+                    "title",
+                    "company",
+                    "issueDate"
                 ],
                 "additionalProperties": False
+                }
             }
             },
             "required": [
-            "cv"
+            "languages",
+            "city",
+            "country",
+            "educationHistory",
+            "workHistory",
+            "projects",
+            "linkedIn",
+            "website",
+            "skills",
+            "bio",
+            "email",
+            "phone",
+            "certificates"
             ],
             "additionalProperties": False
         }
+        },
+        "required": [
+        "cv"
+        ],
+        "additionalProperties": False
+    }
+    }
+}
+
+def build_openai_messages(user_prompt: str, system_prompt: str, job_prompt: str|None = None) -> list[dict]:
+    """Chat messages; a job_prompt goes right after the system prompt so both form a cacheable prefix"""
+    messages = [
+        {
+        "role": "system",
+        "content": [
+            {
+            "type": "text",
+            "text": f"{system_prompt}"
+            }
+        ]
         }
-    },
-    temperature=1,
-    max_completion_tokens=2048,
-    top_p=1,
-    frequency_penalty=0,
-    presence_penalty=0
+    ]
+    if job_prompt is not None:
+        messages.append({
+        "role": "user",
+        "content": [
+            {
+            "type": "text",
+            "text": job_prompt
+            }
+        ]
+        })
+    messages.append({
+        "role": "user",
+        "content": [
+            {
+            "type": "text",
+            "text": f"{user_prompt}"
+            }
+        ]
+        })
+    return messages
+
+def build_prompt_cache_params(job: JobDescription|None) -> dict:
+    """Route requests sharing a job description to the same prompt cache"""
+    if job is None:
+        return {}
+    return {"extra_body": {"prompt_cache_key": job.job_id}}
+
+def record_openai_usage(usage, job: JobDescription|None = None, budget: PromptBudget|None = None) -> None:
+    """Log token usage of one completion next to the local estimate, including prompt tokens served from the prompt cache"""
+    if usage is None:
+        return
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached_tokens = getattr(details, "cached_tokens", None) or 0
+    estimate = f" estimated_prompt_tokens={budget.prompt_tokens} max_completion_tokens={budget.max_completion_tokens} trimmed={','.join(budget.trimmed) or None}" if budget else ""
+    logger.info(f"openai usage job_id={job.job_id if job else None} prompt_tokens={usage.prompt_tokens} cached_tokens={cached_tokens} completion_tokens={usage.completion_tokens}{estimate}")
+    with openai_usage_lock:
+        openai_usage_totals["requests"] += 1
+        openai_usage_totals["prompt_tokens"] += usage.prompt_tokens
+        openai_usage_totals["cached_tokens"] += cached_tokens
+        openai_usage_totals["completion_tokens"] += usage.completion_tokens
+
+RESUME_COMPLETION_PARAMS = {
+    "model": "gpt-4o",
+    "response_format": RESUME_RESPONSE_FORMAT,
+    "temperature": 1,
+    "max_completion_tokens": 2048,
+    "top_p": 1,
+    "frequency_penalty": 0,
+    "presence_penalty": 0,
+}
+
+# The schemas are the bulk of every request; serialize them once for the response cache keys
+preserialize(RESUME_RESPONSE_FORMAT)
+preserialize(DELTA_RESPONSE_FORMAT)
+
+def completion_params(base_params: dict, budget: PromptBudget|None) -> dict:
+    if budget is None:
+        return base_params
+    return dict(base_params, max_completion_tokens=budget.max_completion_tokens)
+
+def completion_content(params: dict, job: JobDescription|None = None, budget: PromptBudget|None = None) -> str:
+    """Text of one completion; in deterministic mode with fixed sampling, answered from the response cache when possible"""
+    key = None
+    if is_deterministic():
+        params = deterministic_params(params)
+        key = response_cache_key(params)
+        with stage("response_cache"):
+            cached = get_cached_response(key)
+        if cached is not None:
+            return cached
+    while True:
+        response = call_with_retries("openai", create_chat_completion, completion_token_cost(params, budget), **params)
+        record_openai_usage(response.usage, job, budget)
+        choice = response.choices[0]
+        if choice.finish_reason != "length":
+            break
+        params = larger_completion_params(params)
+    # Truncated or refused answers are not worth replaying
+    if key is not None and choice.finish_reason == "stop":
+        cache_response(key, choice.message.content)
+    return choice.message.content
+
+def get_openai_gen_resume(user_prompt: str, system_prompt: str, job: JobDescription|None = None, budget: PromptBudget|None = None) -> dict:
+    key = flight_key("resume", str(is_deterministic()), system_prompt, job.prompt if job else "", user_prompt)
+    return openai_flights.do(key, request_openai_gen_resume, user_prompt, system_prompt, job, budget)
+
+def request_openai_gen_resume(user_prompt: str, system_prompt: str, job: JobDescription|None = None, budget: PromptBudget|None = None) -> dict:
+    params = dict(
+        messages=build_openai_messages(user_prompt, system_prompt, job.prompt if job else None),
+        **build_prompt_cache_params(job),
+        **completion_params(RESUME_COMPLETION_PARAMS, budget),
     )
+    return completion_content(params, job, budget)
 
-    return response.choices[0].message.content
+DELTA_COMPLETION_PARAMS = dict(RESUME_COMPLETION_PARAMS, response_format=DELTA_RESPONSE_FORMAT)
 
-@app.route("/get_ai_resume", methods=['GET'])
-def main() -> dict:
-    params = request.get_json()
-    resume_url = params.get("resume_url", "https://storage.googleapis.com/qureos-prod/apprentice-profile/7559/data-analyst-abrar-hasan.pdf")
-    logger.debug(f"resume_url: {resume_url}")
-    applied_job_desc = params.get("applied_job_desc", """# The job description of the job that the candidate is applying to:
+def get_openai_gen_job_descriptions(user_prompt: str, system_prompt: str, job: JobDescription|None = None, budget: PromptBudget|None = None) -> str:
+    """Delta mode: ask only for the rewritten job description of each experience"""
+    key = flight_key("delta", str(is_deterministic()), system_prompt, job.prompt if job else "", user_prompt)
+    return openai_flights.do(key, request_openai_gen_job_descriptions, user_prompt, system_prompt, job, budget)
+
+def request_openai_gen_job_descriptions(user_prompt: str, system_prompt: str, job: JobDescription|None = None, budget: PromptBudget|None = None) -> str:
+    params = dict(
+        messages=build_openai_messages(user_prompt, system_prompt + DELTA_INSTRUCTIONS, job.prompt if job else None),
+        **build_prompt_cache_params(job),
+        **completion_params(DELTA_COMPLETION_PARAMS, budget),
+    )
+    return completion_content(params, job, budget)
+
+def stream_openai_gen_resume(user_prompt: str, system_prompt: str, job: JobDescription|None = None, budget: PromptBudget|None = None):
+    """Yield the generated resume JSON text chunk by chunk as the model produces it; only opening the stream is retried
+
+    In deterministic mode a cached response is yielded in one piece, and a completed stream is cached.
+    """
+    params = dict(
+        messages=build_openai_messages(user_prompt, system_prompt, job.prompt if job else None),
+        stream=True,
+        stream_options={"include_usage": True},
+        **build_prompt_cache_params(job),
+        **completion_params(RESUME_COMPLETION_PARAMS, budget),
+    )
+    key = None
+    if is_deterministic():
+        params = deterministic_params(params)
+        key = response_cache_key(params)
+        with stage("response_cache"):
+            cached = get_cached_response(key)
+        if cached is not None:
+            yield cached
+            return
+    stream = call_with_retries("openai", create_chat_completion, completion_token_cost(params, budget), **params)
+    parts = []
+    finish_reason = None
+    with stage("openai_stream"), upstream_call("openai"):
+        for chunk in stream:
+            if chunk.usage is not None:
+                record_openai_usage(chunk.usage, job, budget)
+            if chunk.choices:
+                finish_reason = chunk.choices[0].finish_reason or finish_reason
+                if chunk.choices[0].delta.content:
+                    parts.append(chunk.choices[0].delta.content)
+                    yield chunk.choices[0].delta.content
+    if finish_reason == "length":
+        raise CompletionTruncated(f"model output was cut off at max_completion_tokens={params['max_completion_tokens']}")
+    if key is not None and finish_reason == "stop":
+        cache_response(key, "".join(parts))
+
+DEFAULT_RESUME_URL = "https://storage.googleapis.com/qureos-prod/apprentice-profile/7559/data-analyst-abrar-hasan.pdf"
+
+DEFAULT_APPLIED_JOB_DESC = """# The job description of the job that the candidate is applying to:
 About the opportunity
 
 Assist the Head of MD Office in strategic planning process; identifying key metrics, aligning targets and evaluating performance.
@@ -579,20 +714,365 @@ We start and end with customers to deliver exceptional service.
 
 We love to innovate, prioritize, decide, and deliver. 
 
-We love what we do, and we don’t rest until our targets are achieved. So if you’re also someone who is driven until the dream is achieved, come join us.""")
+We love what we do, and we don’t rest until our targets are achieved. So if you’re also someone who is driven until the dream is achieved, come join us."""
+
+SYSTEM_PROMPT = "Your job is to adjust the job description in experience section of the resume of the candidate according to the job description that the candidate is applying to. Try to rewrite the job description in the experience section of resume and replace only those sentences which are not relevant to the job. The new sentences that you add should maintain the tone of writing like rest of the resume. Reorder the sentences or bullet points that are more relevant to the job description to the top and less relevant points to the bottom. Write the job description in first-person perspective and use action verbs like 'managed', 'led', 'achieved', 'developed', 'implemented', etc. Use quantitative metircs in terms of numbers, percentages to make the job description more specific and realistic. Return the response in the JSON format. Resume and job description that the candidate is applying to will be provided in the prompt."
+
+def get_job_description(params: dict) -> JobDescription|None:
+    """The request's job description: a registered job_id, else the inline text (registered on the fly)"""
+    job_id = params.get("job_id")
+    if job_id:
+        return job_registry.get(job_id)
+    return job_registry.register(params.get("applied_job_desc", DEFAULT_APPLIED_JOB_DESC))
 
-    parse_resp = get_parse_resume_json(resume_url)
-    user_prompt = convert_single_json_to_prompt_v2(modify_candidate_data(parse_resp), applied_job_desc)
-    system_prompt = "Your job is to adjust the job description in experience section of the resume of the candidate according to the job description that the candidate is applying to. Try to rewrite the job description in the experience section of resume and replace only those sentences which are not relevant to the job. The new sentences that you add should maintain the tone of writing like rest of the resume. Reorder the sentences or bullet points that are more relevant to the job description to the top and less relevant points to the bottom. Write the job description in first-person perspective and use action verbs like 'managed', 'led', 'achieved', 'developed', 'implemented', etc. Use quantitative metircs in terms of numbers, percentages to make the job description more specific and realistic. Return the response in the JSON format. Resume and job description that the candidate is applying to will be provided in the prompt."
-    
-    ai_resume = get_openai_gen_resume(user_prompt, system_prompt)
-    json_str = json.loads(ai_resume)
+def prepare_prompt_data(user_data: dict, job: JobDescription, rank: bool = RELEVANCE_RANKING) -> tuple[dict, str, dict|None]:
+    """Data and system prompt to build the prompt from; with rank, experiences are relevance ordered and weak sentences marked"""
+    if not rank:
+        return user_data, SYSTEM_PROMPT, None
+    with stage("relevance"):
+        relevance = rank_candidate(user_data["cv"], job.text)
+        return apply_relevance(user_data, relevance), SYSTEM_PROMPT + RELEVANCE_INSTRUCTIONS, relevance
+
+def build_resume_prompt(user_data: dict, job: JobDescription, mode: str = TAILOR_MODE, system_prompt: str = SYSTEM_PROMPT, rendered: tuple[str, int]|None = None) -> tuple[str, PromptBudget]:
+    """Candidate prompt trimmed to the input token budget, with a completion budget sized to its work history"""
+    if mode == "delta":
+        system_prompt += DELTA_INSTRUCTIONS
+    with stage("prompt"):
+        return build_budgeted_prompt(user_data, render_candidate_prompt, [system_prompt, job.prompt], mode, rendered=rendered)
+
+def render_resume_prompt(user_data: dict) -> tuple[str, int]:
+    """Untrimmed candidate prompt and its token count: the ones stored at parse time, else rendered now"""
+    stored = stored_candidate_prompt(user_data)
+    if stored is not None:
+        return stored
+    with stage("prompt"):
+        return render_with_tokens(user_data, render_candidate_prompt)
+
+def build_experience_group_prompts(user_data: dict, job: JobDescription, system_prompt: str = SYSTEM_PROMPT, group_size: int = PARALLEL_GROUP_SIZE) -> list[tuple[str, PromptBudget]]:
+    """Parallel mode: one small delta prompt per group of experiences"""
+    with stage("prompt"):
+        experiences = list(enumerate(remove_null_values(user_data['cv']).get("workHistory", []), 1))
+        groups = [experiences[start:start + group_size] for start in range(0, len(experiences), max(group_size, 1))]
+        prompts = []
+        for group in groups:
+            prompt = convert_experience_group_to_prompt(group)
+            budget = estimate_prompt_budget(prompt, [system_prompt + DELTA_INSTRUCTIONS, job.prompt], [experience for _, experience in group], "delta")
+            prompts.append((prompt, budget))
+        return prompts
+
+def generate_parallel_rewrites(user_data: dict, job: JobDescription, prompt_data: dict|None = None, system_prompt: str = SYSTEM_PROMPT) -> dict:
+    """Rewrite each group of experiences with its own concurrent call and merge them back in order"""
+    prompts = build_experience_group_prompts(prompt_data or user_data, job, system_prompt)
+    if not prompts:
+        return merge_job_description_rewrites(user_data, [])
+    with ThreadPoolExecutor(max_workers=min(len(prompts), PARALLEL_MAX_WORKERS)) as executor:
+        futures = [executor.submit(in_context(get_openai_gen_job_descriptions), prompt, system_prompt, job, budget) for prompt, budget in prompts]
+        responses = [future.result() for future in futures]
+    with stage("decode"):
+        rewrites = [rewrite for response in responses for rewrite in json.loads(response).get("workHistory", [])]
+        return merge_job_description_rewrites(user_data, rewrites)
+
+def generate_tailored_resume(user_data: dict, job: JobDescription|str, mode: str = TAILOR_MODE, rank: bool = RELEVANCE_RANKING, rendered: tuple[str, int]|None = None) -> dict:
+    """Have the model tailor the parsed resume's (get_parse_resume_json) experience section to the job description.
+
+    mode "full" lets the model return the whole cv, "delta" only asks for the rewritten
+    job descriptions and merges them into the parsed cv locally, "parallel" does the
+    same with one concurrent call per group of experiences. With rank the response also
+    carries the local relevance scores under "relevance". rendered is render_resume_prompt(user_data),
+    looked up here when not given; it is only used when the prompt is built from the unranked user_data.
+    """
+    if isinstance(job, str):
+        job = job_registry.register(job)
+    prompt_data, system_prompt, relevance = prepare_prompt_data(user_data, job, rank)
+    if mode == "parallel":
+        tailored = generate_parallel_rewrites(user_data, job, prompt_data, system_prompt)
+    else:
+        user_prompt, budget = build_resume_prompt(prompt_data, job, mode, system_prompt, (rendered or render_resume_prompt(user_data)) if prompt_data is user_data else None)
+        if mode == "delta":
+            ai_delta = get_openai_gen_job_descriptions(user_prompt, system_prompt, job, budget)
+            with stage("decode"):
+                tailored = merge_job_descriptions(user_data, ai_delta)
+        else:
+            ai_resume = get_openai_gen_resume(user_prompt, system_prompt, job, budget)
+            with stage("decode"):
+                tailored = restore_fields(json.loads(ai_resume), user_data, trimmed_fields(budget.trimmed))
+    if relevance is not None:
+        tailored["relevance"] = relevance
+    return tailored
+
+def tailor_resume(resume_url: str, job: JobDescription|str, mode: str = TAILOR_MODE, rank: bool = RELEVANCE_RANKING) -> dict:
+    """Parse the resume and have the model tailor its experience section to the job description, within REQUEST_DEADLINE_SECONDS"""
+    with deadline_scope(REQUEST_DEADLINE_SECONDS):
+        parse_resp = get_parse_resume_json(resume_url)
+        return generate_tailored_resume(parse_resp, job, mode, rank)
+
+MULTI_JOB_MAX_JOBS = int(os.getenv("MULTI_JOB_MAX_JOBS", "20"))
+MULTI_JOB_MAX_WORKERS = int(os.getenv("MULTI_JOB_MAX_WORKERS", "8"))
+
+def tailor_resume_to_jobs(resume_url: str, jobs: list[JobDescription], mode: str = TAILOR_MODE, rank: bool = RELEVANCE_RANKING) -> tuple[dict, dict]:
+    """Parse the resume and render its prompt once, then tailor it to every job concurrently
+
+    Returns the tailored cvs and the errors, both keyed by job_id; one failed job does not fail the others.
+    """
+    with deadline_scope(REQUEST_DEADLINE_SECONDS):
+        parse_resp = get_parse_resume_json(resume_url)
+        rendered = render_resume_prompt(parse_resp) if mode != "parallel" and not rank else None
+        with ThreadPoolExecutor(max_workers=min(len(jobs), MULTI_JOB_MAX_WORKERS)) as executor:
+            futures = {job.job_id: executor.submit(in_context(generate_tailored_resume), parse_resp, job, mode, rank, rendered) for job in jobs}
+            results, errors = {}, {}
+            for job_id, future in futures.items():
+                try:
+                    results[job_id] = future.result()
+                except (DeadlineExceeded, CircuitOpenError):
+                    raise
+                except Exception as e:
+                    logger.warning(f"Tailoring to job {job_id} failed: {e!r}")
+                    errors[job_id] = str(e)
+        return results, errors
+
+@app.route("/job_descriptions", methods=['POST'])
+def register_job_description() -> dict:
+    """Register a job description once so tailoring requests can refer to it by job_id"""
+    params = request.get_json()
+    applied_job_desc = params.get("applied_job_desc")
+    if not applied_job_desc:
+        return jsonify({"error": "applied_job_desc is required"}), 400
+    job = job_registry.register(applied_job_desc, params.get("job_id"))
+    return jsonify({"job_id": job.job_id}), 200
+
+@app.route("/get_ai_resume", methods=['GET'])
+def main() -> dict:
+    params = request.get_json()
+    resume_url = params.get("resume_url", DEFAULT_RESUME_URL)
+    logger.debug(f"resume_url: {resume_url}")
+    with stage("job_description"):
+        job = get_job_description(params)
+    if job is None:
+        return jsonify({"error": f"unknown job_id {params.get('job_id')}"}), 404
+    mode = params.get("mode", TAILOR_MODE)
+    rank = bool(params.get("rank", RELEVANCE_RANKING))
+
+    with deterministic_scope(requested_deterministic(params)):
+        json_str = tailor_resume(resume_url, job, mode, rank)
     return jsonify(json_str), 200
 
+@app.route("/get_ai_resume/jobs", methods=['GET', 'POST'])
+def multi_job_main() -> dict:
+    """Tailor one resume to several jobs: "jobs" holds a job_id, {"job_id"} or {"applied_job_desc"} per job"""
+    params = request.get_json()
+    resume_url = params.get("resume_url", DEFAULT_RESUME_URL)
+    items = params.get("jobs", [])
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "jobs must be a non-empty list"}), 400
+    if len(items) > MULTI_JOB_MAX_JOBS:
+        return jsonify({"error": f"at most {MULTI_JOB_MAX_JOBS} jobs per request"}), 400
+    items = [item if isinstance(item, dict) else {"job_id": item} for item in items]
+    with stage("job_description"):
+        jobs = [get_job_description(item) for item in items]
+    unknown = [item.get("job_id") for item, job in zip(items, jobs) if job is None]
+    if unknown:
+        return jsonify({"error": f"unknown job_id {', '.join(map(str, unknown))}"}), 404
+
+    with deterministic_scope(requested_deterministic(params)):
+        results, errors = tailor_resume_to_jobs(resume_url, list({job.job_id: job for job in jobs}.values()), params.get("mode", TAILOR_MODE), bool(params.get("rank", RELEVANCE_RANKING)))
+    return jsonify({"results": results, "errors": errors}), 200
+
+@app.route("/get_ai_resume/stream", methods=['GET'])
+def stream_main() -> Response:
+    """Same input as main(), but the tailored cv is sent as server-sent events while it is generated"""
+    params = request.get_json()
+    resume_url = params.get("resume_url", DEFAULT_RESUME_URL)
+    logger.debug(f"resume_url: {resume_url}")
+    job = get_job_description(params)
+    if job is None:
+        return jsonify({"error": f"unknown job_id {params.get('job_id')}"}), 404
+
+    rank = bool(params.get("rank", RELEVANCE_RANKING))
+    deterministic = requested_deterministic(params)
+
+    def generate():
+        try:
+            with deadline_scope(REQUEST_DEADLINE_SECONDS), deterministic_scope(deterministic):
+                parse_resp = get_parse_resume_json(resume_url)
+                prompt_data, system_prompt, relevance = prepare_prompt_data(parse_resp, job, rank)
+                if relevance is not None:
+                    yield format_sse("relevance", relevance)
+                user_prompt, budget = build_resume_prompt(prompt_data, job, "full", system_prompt, render_resume_prompt(parse_resp) if prompt_data is parse_resp else None)
+                restored = trimmed_fields(budget.trimmed)
+                parsed_cv = project_parsed_cv(parse_resp["cv"]) if restored else {}
+                sections = CvSectionStream()
+                for text in stream_openai_gen_resume(user_prompt, system_prompt, job, budget):
+                    for event, data in sections.feed(text):
+                        if event == "section" and data["name"] in restored:
+                            data = {"name": data["name"], "value": parsed_cv[data["name"]]}
+                        yield format_sse(event, data)
+                yield format_sse("done", restore_fields(json.loads(sections.buffer), parse_resp, restored))
+        except Exception as e:
+            logger.warning(f"Streaming resume failed: {e!r}")
+            yield format_sse("error", {"error": str(e)})
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return Response(stream_with_context(generate()), mimetype="text/event-stream", headers=headers)
+
+TASK_WORKERS = int(os.getenv("TASK_WORKERS", "4"))
+task_store = create_task_store()
+
+def run_tailoring_task(payload: dict) -> dict:
+    """Worker side of /get_ai_resume/tasks"""
+    job = job_registry.get(payload["job_id"])
+    if job is None:
+        raise ValueError(f"unknown job_id {payload['job_id']}")
+    with priority_scope(BATCH), deterministic_scope(requested_deterministic(payload)):
+        return tailor_resume(payload["resume_url"], job, payload.get("mode", TAILOR_MODE), payload.get("rank", RELEVANCE_RANKING))
+
+task_workers = WorkerPool(task_store, run_tailoring_task, workers=TASK_WORKERS)
+
+@app.route("/get_ai_resume/tasks", methods=['POST'])
+def submit_task() -> dict:
+    """Queue a tailoring request and return its task_id right away; poll the status endpoint for the result"""
+    params = request.get_json()
+    resume_url = params.get("resume_url", DEFAULT_RESUME_URL)
+    job = get_job_description(params)
+    if job is None:
+        return jsonify({"error": f"unknown job_id {params.get('job_id')}"}), 404
+
+    if TASK_WORKERS > 0:
+        task_workers.start()
+    task_id = task_store.submit({
+        "resume_url": resume_url,
+        "job_id": job.job_id,
+        "mode": params.get("mode", TAILOR_MODE),
+        "rank": bool(params.get("rank", RELEVANCE_RANKING)),
+        "deterministic": requested_deterministic(params),
+    })
+    return jsonify({"task_id": task_id, "status": "queued"}), 202
+
+@app.route("/get_ai_resume/tasks/<task_id>", methods=['GET'])
+def task_status(task_id: str) -> dict:
+    task = task_store.get(task_id)
+    if task is None:
+        return jsonify({"error": f"unknown or expired task_id {task_id}"}), 404
+    return jsonify(task), 200
+
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "100"))
+BATCH_MAX_WORKERS = int(os.getenv("BATCH_MAX_WORKERS", "32"))
+batch_parser_slots = threading.BoundedSemaphore(int(os.getenv("BATCH_PARSER_CONCURRENCY", "8")))
+batch_openai_slots = threading.BoundedSemaphore(int(os.getenv("BATCH_OPENAI_CONCURRENCY", "16")))
+
+def tailor_resume_batch_item(item: dict|list, mode: str = TAILOR_MODE, rank: bool = RELEVANCE_RANKING) -> dict:
+    """Run one batch item through the pipeline, holding an upstream slot only while calling that upstream"""
+    try:
+        if isinstance(item, (list, tuple)):
+            resume_url, applied_job_desc = item
+            job = job_registry.register(applied_job_desc)
+        else:
+            resume_url = item["resume_url"]
+            job = get_job_description(item)
+            if job is None:
+                raise ValueError(f"unknown job_id {item.get('job_id')}")
+
+        with deadline_scope(REQUEST_DEADLINE_SECONDS), priority_scope(BATCH):
+            with batch_parser_slots:
+                parse_resp = get_parse_resume_json(resume_url)
+            with batch_openai_slots:
+                result = generate_tailored_resume(parse_resp, job, mode, rank)
+        return {"status": "ok", "result": result}
+    except Exception as e:
+        logger.warning(f"Batch item failed: {e!r}")
+        return {"status": "error", "error": str(e)}
+
+def tailor_resume_batch(items: list, mode: str = TAILOR_MODE, rank: bool = RELEVANCE_RANKING) -> list[dict]:
+    """Tailor all items concurrently; results keep the order of the input"""
+    if not items:
+        return []
+    with ThreadPoolExecutor(max_workers=min(len(items), BATCH_MAX_WORKERS)) as executor:
+        futures = [executor.submit(in_context(tailor_resume_batch_item), item, mode, rank) for item in items]
+        return [future.result() for future in futures]
+
+@app.route("/get_ai_resume_batch", methods=['GET', 'POST'])
+def batch_main() -> dict:
+    params = request.get_json()
+    items = params.get("items", [])
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "items must be a non-empty list"}), 400
+    if len(items) > BATCH_MAX_ITEMS:
+        return jsonify({"error": f"at most {BATCH_MAX_ITEMS} items per batch"}), 400
+
+    with deterministic_scope(requested_deterministic(params)):
+        results = tailor_resume_batch(items, params.get("mode", TAILOR_MODE), bool(params.get("rank", RELEVANCE_RANKING)))
+    return jsonify({"results": results}), 200
+
 @app.route("/healthcheck", methods=['GET'])
 def healthcheck():
     return "OK", 200
 
+warmup_lock = threading.Lock()
+warmup_result = None
+
+def warm_up_process() -> None:
+    """Pay the one-off costs of a first request now: client imports, the tokenizer and the static prompt token counts"""
+    preload()
+    if RELEVANCE_RANKING:
+        import numpy
+    get_encoding()
+    for system_prompt in (SYSTEM_PROMPT, SYSTEM_PROMPT + RELEVANCE_INSTRUCTIONS):
+        count_static_tokens(system_prompt)
+        count_static_tokens(system_prompt + DELTA_INSTRUCTIONS)
+
+def warm_up() -> dict:
+    """warm_up_process, then warm the upstream connections when READINESS_WARM_CONNECTIONS is set; runs once per process"""
+    global warmup_result
+    with warmup_lock:
+        if warmup_result is None:
+            started = time.perf_counter()
+            warm_up_process()
+            connections = warm_connections(QUREOS_PARSER_URL) if READINESS_WARM_CONNECTIONS else {}
+            warmup_result = {"connections": connections, "seconds": round(time.perf_counter() - started, 3)}
+            logger.info(f"Warmed up: {warmup_result}")
+        return warmup_result
+
+@app.route("/readyz", methods=['GET'])
+def readiness():
+    """Readiness probe: the first call warms the process up, so route traffic here only once it answers"""
+    return jsonify({"status": "ready", **warm_up()}), 200
+
+@app.errorhandler(DeadlineExceeded)
+def deadline_exceeded(e: DeadlineExceeded):
+    return jsonify({"error": str(e)}), 504
+
+@app.errorhandler(CircuitOpenError)
+def upstream_unavailable(e: CircuitOpenError):
+    return jsonify({"error": str(e)}), 503
+
+@app.errorhandler(CompletionTruncated)
+def completion_truncated(e: CompletionTruncated):
+    return jsonify({"error": str(e)}), 502
+
+@app.errorhandler(ParserResponseInvalid)
+def parser_response_invalid(e: ParserResponseInvalid):
+    return jsonify({"error": str(e)}), 502
+
+@app.route("/metrics", methods=['GET'])
+def prometheus_metrics() -> Response:
+    return Response(registry.render(), content_type=CONTENT_TYPE)
+
+@app.before_request
+def start_request_trace() -> None:
+    """Time every request; with the trace header set, also collect its stage breakdown"""
+    g.request_started = time.perf_counter()
+    g.trace = start_trace(bool(request.headers.get(TRACE_HEADER)))
+
+@app.after_request
+def finish_request_trace(response: Response) -> Response:
+    elapsed = time.perf_counter() - g.request_started
+    REQUEST_SECONDS.observe(elapsed, route=request.url_rule.rule if request.url_rule else "unmatched", status=response.status_code)
+    if g.trace is not None:
+        response.headers["Server-Timing"] = server_timing(g.trace + [("total", elapsed)])
+    return response
+
+if STARTUP_MODE == "eager":
+    warm_up_process()
+
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=5000)
 
@@ -0,0 +1,226 @@
+"""Per-stage latency, upstream and token metrics in the Prometheus text format, plus per-request traces.
+
+Wrap a pipeline stage in ``with stage("parser"):`` to time it into the
+``resume_stage_seconds`` histogram. When the request asked for a trace (see
+``TRACE_HEADER``) the same timings are collected for that request and returned in a
+``Server-Timing`` response header. Values kept elsewhere (cache stats, single-flight
+counters, OpenAI token totals) are exported through collectors read at scrape time.
+"""
+import bisect
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+TRACE_HEADER = os.getenv("TRACE_HEADER", "X-Resume-Trace")
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for value in labels.values())
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(labels, escaped)) + "}"
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Counter:
+
+    def __init__(self, name: str, help: str, labelnames: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            lines.append(f"{self.name}{_format_labels(dict(zip(self.labelnames, key)))} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+
+    def __init__(self, name: str, help: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        position = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # bucket counts (the last one is +Inf), sum
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][position] += 1
+            series[1] += value
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((key, list(counts), total) for key, (counts, total) in self._series.items())
+        for key, counts, total in series:
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _format_value(bound)
+                lines.append(f"{self.name}_bucket{_format_labels(dict(labels, le=le))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name: str, help: str, labelnames: tuple = ()) -> Counter:
+        metric = Counter(name, help, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS) -> Histogram:
+        metric = Histogram(name, help, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collect) -> None:
+        """collect() returns (name, type, help, [(labels, value), ...]) tuples, read on every scrape"""
+        self._collectors.append(collect)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        families = {}
+        for collect in self._collectors:
+            for name, kind, help, samples in collect():
+                family = families.setdefault(name, (kind, help, []))
+                family[2].extend(samples)
+        for name, (kind, help, samples) in families.items():
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+STAGE_SECONDS = registry.histogram("resume_stage_seconds", "Time spent in each stage of the tailoring pipeline.", ("stage",))
+REQUEST_SECONDS = registry.histogram("resume_request_seconds", "Time to answer a request, by route and status.", ("route", "status"))
+UPSTREAM_RESPONSES = registry.counter("resume_upstream_responses_total", "Responses from upstream services, by HTTP status.", ("upstream", "status"))
+UPSTREAM_ERRORS = registry.counter("resume_upstream_errors_total", "Failed calls to upstream services, by exception type.", ("upstream", "error"))
+
+_trace = contextvars.ContextVar("resume_trace", default=None)
+
+
+def start_trace(enabled: bool = True) -> list|None:
+    """Collect the stage timings of the current request (and what it runs in copied contexts).
+
+    Call it at the start of every request, also untraced ones, so a reused worker
+    thread does not keep appending to an earlier request's trace.
+    """
+    trace = [] if enabled else None
+    _trace.set(trace)
+    return trace
+
+
+@contextmanager
+def stage(name: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=name)
+        trace = _trace.get()
+        if trace is not None:
+            trace.append((name, elapsed))
+
+
+def in_context(fn):
+    """fn bound to a copy of the current context, so stages it runs in a worker thread land in this request's trace.
+
+    Take one copy per submitted call: a context cannot be entered by two threads at once.
+    """
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.run(fn, *args, **kwargs)
+
+
+def error_status(e: BaseException) -> int|None:
+    """HTTP status carried by an upstream exception (requests, httpx and openai errors), if any"""
+    status = getattr(e, "status_code", None) or getattr(getattr(e, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def record_upstream_response(upstream: str, status: int) -> None:
+    UPSTREAM_RESPONSES.inc(upstream=upstream, status=status)
+
+
+@contextmanager
+def upstream_call(upstream: str):
+    """Count an exception raised while calling upstream, with its HTTP status when it carries one"""
+    try:
+        yield
+    except Exception as e:
+        UPSTREAM_ERRORS.inc(upstream=upstream, error=type(e).__name__)
+        status = error_status(e)
+        if status is not None:
+            record_upstream_response(upstream, status)
+        raise
+
+
+def server_timing(trace: list) -> str:
+    """Server-Timing header value of a trace, durations in milliseconds"""
+    return ", ".join(f"{name};dur={elapsed * 1000:.1f}" for name, elapsed in trace)
+
+
+def cache_collector(*caches):
+    """Collector exporting TwoTierCache.stats() of the given caches"""
+    def collect():
+        stats = [(cache.name, cache.stats()) for cache in caches]
+        return [
+            ("resume_cache_lookups_total", "counter", "Cache lookups, by cache and result.", [
+                ({"cache": name, "result": result}, values[counter])
+                for name, values in stats
+                for result, counter in (("memory_hit", "memory_hits"), ("disk_hit", "disk_hits"), ("miss", "misses"))
+            ]),
+            ("resume_cache_stores_total", "counter", "Entries written to the cache.", [({"cache": name}, values["stores"]) for name, values in stats]),
+            ("resume_cache_evictions_total", "counter", "Entries evicted from the cache.", [({"cache": name}, values["evictions"]) for name, values in stats]),
+            ("resume_cache_memory_items", "gauge", "Entries in the in-memory tier.", [({"cache": name}, values["memory_items"]) for name, values in stats]),
+            ("resume_cache_hit_ratio", "gauge", "Share of lookups served from either tier since start.", [({"cache": name}, values["hit_rate"]) for name, values in stats]),
+        ]
+    return collect
+
+
+def single_flight_collector(*flights, runtime: str = "sync"):
+    """Collector exporting the leader/coalesced counters of single-flight groups"""
+    def collect():
+        return [("resume_single_flight_calls_total", "counter", "Calls through single-flight groups; coalesced ones shared a leader's result.", [
+            ({"group": flight.name, "runtime": runtime, "role": role}, flight.counters[role])
+            for flight in flights
+            for role in ("leaders", "coalesced")
+        ])]
+    return collect
@@ -0,0 +1,166 @@
+"""Section-based rendering of the candidate prompt, rendered once per parsed resume.
+
+The prompt is a fixed sequence of sections (contact, bio, experiences, skills, ...), each
+rendered from a few cv fields and assembled with one join. The untrimmed prompt and its
+token count are rendered when the resume is parsed and stored with it (``store_candidate_prompt``),
+so tailoring the same resume to another job description reuses them without rendering or
+hashing anything. The job description is its own message (see main.build_openai_messages)
+and never part of these sections.
+"""
+from token_budget import count_prompt_tokens, tokenizer_name
+
+PROMPT_HEADER = "The following are the details of person's whole resume:\n"
+PROMPT_FOOTER = "\n\n[No prose, output only JSON]\n"
+EXPERIENCE_GROUP_HEADER = "The following are some of the experiences from the person's resume:\n\nExperiences:\n"
+
+
+def remove_null_values(data: dict|list) -> dict:
+    """Recursively removes key-value pairs where the value is None from a dictionary"""
+    if isinstance(data, dict):
+        return {k: remove_null_values(v) for k, v in data.items() if v is not None}
+    elif isinstance(data, list):
+        return [remove_null_values(item) for item in data]
+    return data
+
+
+def render_experience(idx: int, experience: dict) -> str:
+    """One numbered experience sentence of the prompt"""
+    job_title = experience.get("title", "Unknown Position")
+    company_name = experience.get("companyName", "Unknown Company")
+    job_loc = experience.get("location", "Unknown Location")
+    duration_year = experience.get("durationInYears", "Unknown Duration")
+    job_desc = experience.get("jobDescription", "unknown job description")
+    start_date_str = experience.get("start_date_str", "Unknown start date")
+    end_at = str(experience.get("endAt", "Present"))
+    ending = "presently working" if end_at == "Present" else "ending at " + end_at
+    return f"{idx}: {job_title} at {company_name} in {job_loc}, with {duration_year} years of experience starting from {start_date_str} and {ending}. Job description was: {job_desc}\n"
+
+
+def render_contact(cv: dict) -> str:
+    email = cv.get("email")
+    phone = cv.get("phone")
+    linkedin = cv.get("linkedIn")
+    return "".join((
+        "\nThe person is currently located in ", cv.get("city", "unknown city"), ", ", cv.get("country", "unknown country"),
+        ". Email: " + email if email else "",
+        ". Phone: " + phone if phone else "",
+        ". linkedin: " + linkedin if linkedin else "",
+        "\n",
+    ))
+
+
+def render_bio(cv: dict) -> str:
+    bio = cv.get("bio")
+    return f"About me: \n{bio}\n" if bio else ""
+
+
+def render_experiences(cv: dict) -> str:
+    experiences = cv.get("workHistory")
+    if not experiences:
+        return ""
+    total_experience = cv.get("totalExperienceYears")
+    header = f"\nExperiences ({total_experience} years in total):\n" if total_experience else "\nExperiences:\n"
+    return header + "".join(render_experience(idx, experience) for idx, experience in enumerate(experiences, 1))
+
+
+def render_skills(cv: dict) -> str:
+    skills = cv.get("skills")
+    if not skills or not isinstance(skills, list):
+        return ""
+    return f"\nPerson is skilled in the following: {', '.join(skills)}\n"
+
+
+def render_education(cv: dict) -> str:
+    education_details = cv.get("educationHistory")
+    if not education_details:
+        return ""
+    return "\nEducation: \n" + "".join(
+        f"{idx}. Studied {education.get('degreeAndField', 'Unknown Field')} from {education.get('schoolName', 'Unknown School')}"
+        f" and graduated at {education.get('graduatedAtDate', 'Unknown graduation date')}.\n"
+        for idx, education in enumerate(education_details, 1)
+    )
+
+
+def render_certificates(cv: dict) -> str:
+    certifications = cv.get("certificates")
+    if not certifications:
+        return ""
+    lines = ["Certification:\n"]
+    for idx, certification in enumerate(certifications, 1):
+        issue_date = certification.get("issueDate")
+        lines.append(
+            f"{idx}. Certification in {certification.get('title', 'unknown certification name')}"
+            f" from {certification.get('company', 'unknown certification institution')}"
+            f"{' at ' + str(issue_date) if issue_date else ''}.\n"
+        )
+    return "".join(lines)
+
+
+def render_nationality(cv: dict) -> str:
+    nationality = cv.get("nationality")
+    return f"\nThis person is {nationality} national.\n" if nationality else ""
+
+
+def render_projects(cv: dict) -> str:
+    projects = cv.get("projects")
+    if not projects:
+        return ""
+    lines = ["\nPerson has done following projects in his career:\n"]
+    for idx, project in enumerate(projects, 1):
+        start_at = project.get("startAt")
+        end_at = project.get("endAt")
+        lines.append(
+            f"\n{idx}. {project.get('title', 'unknown project title')}"
+            f"{'. Started at ' + start_at if start_at else ''}{' and ended at ' + end_at if end_at else ''}"
+        )
+    return "".join(lines)
+
+
+def render_languages(cv: dict) -> str:
+    languages = cv.get("languages")
+    if not languages:
+        return ""
+    lines = ["\nLanguages:\n"]
+    for idx, language in enumerate(languages, 1):
+        if language is None:
+            continue
+        if isinstance(language, str):
+            lines.append(f"{idx}. Candidate speaks {language}.\n")
+        else:
+            lines.append(f"\n{idx}. Candidate speaks {language.get('name', 'Unknown language name')} with {language.get('proficiency', 'Unknown')} proficiency.\n")
+    return "".join(lines)
+
+
+# In prompt order
+SECTIONS = (
+    render_contact,
+    render_bio,
+    render_experiences,
+    render_skills,
+    render_education,
+    render_certificates,
+    render_nationality,
+    render_projects,
+    render_languages,
+)
+
+
+def render_candidate_prompt(user_data: dict) -> str:
+    """Candidate part of the prompt, without the job description"""
+    cv = remove_null_values(user_data["cv"])
+    return "".join((PROMPT_HEADER, *(render(cv) for render in SECTIONS), PROMPT_FOOTER))
+
+
+def store_candidate_prompt(user_data: dict) -> dict:
+    """Store the rendered candidate prompt and its token count under user_data["prompt"], at parse time"""
+    prompt = render_candidate_prompt(user_data)
+    user_data["prompt"] = {"text": prompt, "tokens": count_prompt_tokens(prompt), "tokenizer": tokenizer_name()}
+    return user_data
+
+
+def stored_candidate_prompt(user_data: dict) -> tuple[str, int]|None:
+    """The prompt store_candidate_prompt kept with this parse, None when it has none or was counted with another tokenizer"""
+    stored = user_data.get("prompt")
+    if not stored or stored.get("tokenizer") != tokenizer_name():
+        return None
+    return stored["text"], stored["tokens"]
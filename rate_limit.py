@@ -0,0 +1,240 @@
+"""Client-side OpenAI rate limiting: token buckets for requests and tokens per minute, with priorities.
+
+Every completion reserves one request and its estimated token cost (prompt tokens plus
+max_completion_tokens, which is how OpenAI counts it) before it is sent. Callers wait in
+priority order, interactive before batch, and batch calls leave a share of both buckets
+free so a burst of batch work cannot starve interactive requests. The
+``x-ratelimit-*`` headers of every response resize the buckets to the organisation's
+real limits and remaining quota, and a 429 empties them until the reset time.
+"""
+import asyncio
+import contextvars
+import heapq
+import itertools
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+from loguru import logger
+
+from metrics import registry
+from resilience import DeadlineExceeded, remaining_time
+
+# 0 leaves a limit unset until the response headers report it
+OPENAI_RPM_LIMIT = float(os.getenv("OPENAI_RPM_LIMIT", "0"))
+OPENAI_TPM_LIMIT = float(os.getenv("OPENAI_TPM_LIMIT", "0"))
+# Share of each bucket batch calls may use; the rest is kept for interactive calls
+RATE_LIMIT_BATCH_SHARE = float(os.getenv("RATE_LIMIT_BATCH_SHARE", "0.8"))
+RATE_LIMIT_ASYNC_POLL_SECONDS = 0.05
+
+INTERACTIVE = 0
+BATCH = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BATCH: "batch"}
+
+_DURATION_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_DURATION_SCALE = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+WAIT_SECONDS = registry.histogram("resume_openai_queue_seconds", "Time OpenAI calls waited for rate limit capacity.", ("priority",))
+THROTTLED = registry.counter("resume_openai_rate_limited_total", "429 responses from OpenAI that emptied the local buckets.")
+
+_priority = contextvars.ContextVar("openai_priority", default=INTERACTIVE)
+
+
+@contextmanager
+def priority_scope(priority: int):
+    """OpenAI calls made in the block (and in contexts copied from it) use this priority class"""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority() -> int:
+    return _priority.get()
+
+
+def parse_reset_duration(value: str|None) -> float|None:
+    """Seconds of an x-ratelimit-reset-* header, like 1s, 6m0s or 20ms"""
+    if not value:
+        return None
+    parts = _DURATION_RE.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * _DURATION_SCALE[unit] for amount, unit in parts)
+
+
+class TokenBucket:
+    """Holds up to limit units, refilled at limit per minute; limit 0 means unlimited"""
+
+    def __init__(self, limit: float):
+        self.limit = limit
+        self.level = limit
+        self.updated = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        if self.limit > 0:
+            self.level = min(self.limit, self.level + (now - self.updated) * self.limit / 60)
+        self.updated = now
+
+    def wait_for(self, amount: float, reserve: float = 0.0) -> float:
+        """Seconds until amount can be taken while keeping reserve of the limit untouched"""
+        if self.limit <= 0:
+            return 0.0
+        needed = min(amount, self.limit * (1 - reserve)) + self.limit * reserve
+        if self.level >= needed:
+            return 0.0
+        return (needed - self.level) * 60 / self.limit
+
+    def take(self, amount: float) -> None:
+        if self.limit > 0:
+            self.level -= min(amount, self.limit)
+
+
+class RateLimiter:
+    """RPM and TPM buckets shared by all OpenAI calls of the process, served in priority order"""
+
+    def __init__(self, rpm: float = OPENAI_RPM_LIMIT, tpm: float = OPENAI_TPM_LIMIT, batch_share: float = RATE_LIMIT_BATCH_SHARE):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.batch_share = batch_share
+        self._paused_until = 0.0
+        self._waiters = []
+        self._sequence = itertools.count()
+        self._cond = threading.Condition()
+
+    def _try_reserve(self, entry: tuple, cost: float) -> float:
+        """Under the lock: take capacity for entry if it is first in line, else return the seconds to wait"""
+        now = time.monotonic()
+        if now < self._paused_until:
+            return self._paused_until - now
+        if self._waiters[0] is not entry:
+            return RATE_LIMIT_ASYNC_POLL_SECONDS
+        self.requests.refill(now)
+        self.tokens.refill(now)
+        reserve = 1 - self.batch_share if entry[0] == BATCH else 0.0
+        wait = max(self.requests.wait_for(1, reserve), self.tokens.wait_for(cost, reserve))
+        if wait > 0:
+            return wait
+        self.requests.take(1)
+        self.tokens.take(cost)
+        heapq.heappop(self._waiters)
+        self._cond.notify_all()
+        return 0.0
+
+    def _enqueue(self, priority: int) -> tuple:
+        entry = (priority, next(self._sequence))
+        heapq.heappush(self._waiters, entry)
+        return entry
+
+    def _dequeue(self, entry: tuple) -> None:
+        self._waiters.remove(entry)
+        heapq.heapify(self._waiters)
+        self._cond.notify_all()
+
+    def _check_deadline(self, wait: float) -> None:
+        remaining = remaining_time()
+        if remaining is not None and wait >= remaining:
+            raise DeadlineExceeded("request deadline would pass waiting for OpenAI rate limit capacity")
+
+    def acquire(self, cost: float, priority: int|None = None) -> None:
+        """Block until one request and cost tokens are available for this priority"""
+        priority = current_priority() if priority is None else priority
+        started = time.monotonic()
+        with self._cond:
+            entry = self._enqueue(priority)
+            try:
+                while True:
+                    wait = self._try_reserve(entry, cost)
+                    if wait <= 0:
+                        break
+                    self._check_deadline(wait)
+                    self._cond.wait(wait)
+            except BaseException:
+                self._dequeue(entry)
+                raise
+        WAIT_SECONDS.observe(time.monotonic() - started, priority=PRIORITY_NAMES.get(priority, priority))
+
+    async def acquire_async(self, cost: float, priority: int|None = None) -> None:
+        """acquire for coroutines: waits by sleeping, never blocking the event loop"""
+        priority = current_priority() if priority is None else priority
+        started = time.monotonic()
+        with self._cond:
+            entry = self._enqueue(priority)
+        try:
+            while True:
+                with self._cond:
+                    wait = self._try_reserve(entry, cost)
+                if wait <= 0:
+                    break
+                self._check_deadline(wait)
+                await asyncio.sleep(min(wait, RATE_LIMIT_ASYNC_POLL_SECONDS))
+        except BaseException:
+            with self._cond:
+                if entry in self._waiters:
+                    self._dequeue(entry)
+            raise
+        WAIT_SECONDS.observe(time.monotonic() - started, priority=PRIORITY_NAMES.get(priority, priority))
+
+    def update_from_headers(self, headers) -> None:
+        """Resize the buckets to the x-ratelimit-* headers of an OpenAI response"""
+        if not headers:
+            return
+        with self._cond:
+            now = time.monotonic()
+            for bucket, kind in ((self.requests, "requests"), (self.tokens, "tokens")):
+                limit = headers.get(f"x-ratelimit-limit-{kind}")
+                remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+                try:
+                    if limit is not None:
+                        limit = float(limit)
+                        if limit != bucket.limit:
+                            logger.info(f"OpenAI {kind} per minute limit is {limit:g}, was {bucket.limit:g}")
+                            if bucket.limit <= 0:
+                                bucket.level = limit
+                            bucket.limit = limit
+                    if remaining is not None:
+                        bucket.refill(now)
+                        bucket.level = min(bucket.level, float(remaining))
+                except ValueError:
+                    continue
+            self._cond.notify_all()
+
+    def throttled(self, headers=None, retry_after: float|None = None) -> None:
+        """A 429 came back: empty both buckets and hold every call until the limit resets"""
+        headers = headers or {}
+        pause = retry_after
+        if pause is None:
+            resets = [parse_reset_duration(headers.get(f"x-ratelimit-reset-{kind}")) for kind in ("requests", "tokens")]
+            pause = max([reset for reset in resets if reset is not None], default=1.0)
+        THROTTLED.inc()
+        logger.warning(f"OpenAI rate limited, holding calls for {pause:.2f}s")
+        with self._cond:
+            now = time.monotonic()
+            for bucket in (self.requests, self.tokens):
+                bucket.refill(now)
+                bucket.level = 0
+            self._paused_until = max(self._paused_until, now + pause)
+            self._cond.notify_all()
+
+    def collect(self) -> list[tuple]:
+        with self._cond:
+            now = time.monotonic()
+            self.requests.refill(now)
+            self.tokens.refill(now)
+            waiting = {name: 0 for name in PRIORITY_NAMES.values()}
+            for priority, _ in self._waiters:
+                name = PRIORITY_NAMES.get(priority, str(priority))
+                waiting[name] = waiting.get(name, 0) + 1
+            buckets = [("requests", self.requests), ("tokens", self.tokens)]
+            return [
+                ("resume_openai_rate_limit", "gauge", "Per-minute OpenAI limit the local buckets use (0: unlimited).", [({"kind": kind}, bucket.limit) for kind, bucket in buckets]),
+                ("resume_openai_rate_available", "gauge", "Capacity left in the local OpenAI buckets.", [({"kind": kind}, round(bucket.level, 2)) for kind, bucket in buckets]),
+                ("resume_openai_queue_waiting", "gauge", "OpenAI calls waiting for rate limit capacity.", [({"priority": name}, count) for name, count in waiting.items()]),
+            ]
+
+
+openai_rate_limiter = RateLimiter()
+registry.register_collector(openai_rate_limiter.collect)
@@ -0,0 +1,130 @@
+"""Local relevance scoring of a candidate's experiences, skills and projects against the job description.
+
+Every sentence of every job description, every skill and every project title is scored
+in one TF-IDF matrix against the job description, so the prompt can show the model which
+sentences are already relevant and which to rewrite. A score is the share (0..1) of the
+text's TF-IDF weight that falls on terms the job description uses too. NumPy is imported
+on the first scoring call, so the service does not load it while ranking is off.
+"""
+import copy
+import os
+import re
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import numpy as np
+
+RELEVANCE_THRESHOLD = float(os.getenv("RELEVANCE_THRESHOLD", "0.3"))
+REWRITE_MARKER = "[rewrite] "
+RELEVANCE_INSTRUCTIONS = f" Sentences of a job description are ordered from most to least relevant to the job. Sentences starting with {REWRITE_MARKER.strip()} are not relevant to the job: rewrite or replace only those, drop the marker, and keep the other sentences as they are."
+
+_TOKEN_RE = re.compile(r"[a-z0-9][a-z0-9+#.]*[a-z0-9+#]|[a-z0-9]")
+_SENTENCE_SPLIT_RE = re.compile(r"\n+|(?<=[.!?])\s+(?=[A-Z0-9•\-*])")
+_STOPWORDS = frozenset("""a an and are as at be by for from has have in is it its of on or our that the their this to was were will with we you your i my me he she they them who what which while into over under than then so such not no can may also all any each other more most""".split())
+
+
+def _stem(token: str) -> str:
+    """Crude plural folding, enough for teams to match team"""
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def tokenize(text: str) -> list[str]:
+    return [_stem(token) for token in _TOKEN_RE.findall(text.lower()) if token not in _STOPWORDS]
+
+
+def split_sentences(text: str) -> list[str]:
+    sentences = []
+    for sentence in _SENTENCE_SPLIT_RE.split(text):
+        sentence = sentence.strip().lstrip("•-*·").strip()
+        if sentence:
+            sentences.append(sentence)
+    return sentences
+
+
+def tfidf_scores(documents: list[str], query: str) -> "np.ndarray":
+    """Share of each document's sublinear TF-IDF weight on terms that also occur in the query"""
+    import numpy as np
+
+    if not documents:
+        return np.zeros(0, dtype=np.float32)
+    vocabulary = {}
+    rows = []
+    cols = []
+    for row, text in enumerate(documents + [query]):
+        for token in tokenize(text):
+            rows.append(row)
+            cols.append(vocabulary.setdefault(token, len(vocabulary)))
+    if not vocabulary:
+        return np.zeros(len(documents), dtype=np.float32)
+
+    counts = np.zeros((len(documents) + 1, len(vocabulary)), dtype=np.float32)
+    np.add.at(counts, (np.asarray(rows), np.asarray(cols)), 1)
+    document_frequency = np.count_nonzero(counts, axis=0)
+    idf = np.log((1 + counts.shape[0]) / (1 + document_frequency)) + 1
+    weights = np.log1p(counts[:-1]) * idf
+    totals = weights.sum(axis=1)
+    totals[totals == 0] = 1
+    return (weights @ (counts[-1] > 0).astype(np.float32)) / totals
+
+
+def rank_candidate(cv: dict, job_description: str, threshold: float = RELEVANCE_THRESHOLD) -> dict:
+    """Relevance of every work history sentence, skill and project to the job description"""
+    import numpy as np
+
+    work_history = cv.get("workHistory") or []
+    skills = [str(skill) for skill in cv.get("skills") or [] if skill]
+    projects = [str(project.get("title") or "") for project in cv.get("projects") or [] if project]
+
+    sentence_owner = []
+    documents = []
+    for idx, job in enumerate(work_history, 1):
+        for sentence in split_sentences(str(job.get("jobDescription") or "")):
+            sentence_owner.append(idx)
+            documents.append(sentence)
+    sentence_count = len(documents)
+    documents.extend(skills)
+    documents.extend(projects)
+
+    scores = tfidf_scores(documents, job_description)
+    sentence_scores = scores[:sentence_count]
+    skill_scores = scores[sentence_count:sentence_count + len(skills)]
+    project_scores = scores[sentence_count + len(skills):]
+
+    ranked_work_history = []
+    owners = np.asarray(sentence_owner)
+    for idx in range(1, len(work_history) + 1):
+        positions = np.flatnonzero(owners == idx) if sentence_count else np.zeros(0, dtype=int)
+        order = positions[np.argsort(-sentence_scores[positions], kind="stable")]
+        ranked_work_history.append({
+            "index": idx,
+            "score": round(float(sentence_scores[positions].max()), 4) if positions.size else 0.0,
+            "sentences": [
+                {"text": documents[pos], "score": round(float(sentence_scores[pos]), 4), "relevant": bool(sentence_scores[pos] >= threshold)}
+                for pos in order
+            ],
+        })
+
+    return {
+        "workHistory": ranked_work_history,
+        "skills": [{"name": skills[pos], "score": round(float(skill_scores[pos]), 4)} for pos in np.argsort(-skill_scores, kind="stable")],
+        "projects": [{"title": projects[pos], "score": round(float(project_scores[pos]), 4)} for pos in np.argsort(-project_scores, kind="stable")],
+    }
+
+
+def apply_relevance(user_data: dict, relevance: dict) -> dict:
+    """Copy of user_data for the prompt: sentences and skills ordered by relevance, weak sentences marked for rewrite"""
+    prompt_data = copy.deepcopy(user_data)
+    # The prompt stored at parse time renders the unranked cv
+    prompt_data.pop("prompt", None)
+    cv = prompt_data["cv"]
+    for job, ranked in zip(cv.get("workHistory") or [], relevance["workHistory"]):
+        if ranked["sentences"]:
+            job["jobDescription"] = "\n".join(
+                sentence["text"] if sentence["relevant"] else REWRITE_MARKER + sentence["text"]
+                for sentence in ranked["sentences"]
+            )
+    if cv.get("skills"):
+        cv["skills"] = [skill["name"] for skill in relevance["skills"]]
+    return prompt_data
@@ -0,0 +1,402 @@
+"""Deadlines, retries with jittered backoff, circuit breakers and hedged calls for the upstreams.
+
+A request runs inside ``deadline_scope``; every upstream call sizes its timeout with
+``bounded_timeout`` so nothing outlives the request. ``call_with_retries`` retries
+retryable failures (connection errors, timeouts, 408/429/5xx) with full-jitter backoff,
+honours Retry-After, and goes through the upstream's circuit breaker, which fails fast
+while the upstream keeps failing. ``hedged_call`` sends a duplicate request when the
+first one has been running longer than a threshold and takes whichever answers first.
+"""
+import asyncio
+import contextvars
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+from loguru import logger
+
+from metrics import error_status, in_context, registry
+
+REQUEST_DEADLINE_SECONDS = float(os.getenv("REQUEST_DEADLINE_SECONDS", "120"))
+RETRY_ATTEMPTS = int(os.getenv("RETRY_ATTEMPTS", "3"))
+RETRY_BASE_DELAY_SECONDS = float(os.getenv("RETRY_BASE_DELAY_SECONDS", "0.5"))
+RETRY_MAX_DELAY_SECONDS = float(os.getenv("RETRY_MAX_DELAY_SECONDS", "8"))
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RESET_SECONDS = float(os.getenv("BREAKER_RESET_SECONDS", "30"))
+HEDGE_WORKERS = int(os.getenv("HEDGE_WORKERS", "16"))
+# Hedged requests running at once, across all upstreams; past this slow calls are not hedged
+HEDGE_MAX_IN_FLIGHT = int(os.getenv("HEDGE_MAX_IN_FLIGHT", "4"))
+RETRYABLE_STATUSES = frozenset({408, 409, 425, 429, 500, 502, 503, 504})
+
+RETRIES = registry.counter("resume_upstream_retries_total", "Retried upstream calls, by the error that caused the retry.", ("upstream", "error"))
+HEDGES = registry.counter("resume_upstream_hedges_total", "Hedged upstream requests: launched, won by the hedge, or skipped with HEDGE_MAX_IN_FLIGHT reached.", ("upstream", "outcome"))
+DEADLINES = registry.counter("resume_deadline_exceeded_total", "Upstream calls not made or given up because the request deadline passed.", ("upstream",))
+BREAKER_TRANSITIONS = registry.counter("resume_circuit_transitions_total", "Circuit breaker state changes.", ("upstream", "state"))
+
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+class CircuitOpenError(RuntimeError):
+    pass
+
+
+_deadline = contextvars.ContextVar("request_deadline", default=None)
+
+
+@contextmanager
+def deadline_scope(seconds: float|None = REQUEST_DEADLINE_SECONDS):
+    """Run the block under a deadline; a nested scope can only shorten it. None or 0 means no deadline."""
+    if not seconds or seconds <= 0:
+        yield
+        return
+    deadline = time.monotonic() + seconds
+    outer = _deadline.get()
+    token = _deadline.set(deadline if outer is None else min(outer, deadline))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining_time() -> float|None:
+    """Seconds left until the current deadline, None without one"""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def bounded_timeout(timeout: float, upstream: str = "upstream") -> float:
+    """timeout, shortened to what is left of the deadline; DeadlineExceeded when nothing is"""
+    remaining = remaining_time()
+    if remaining is None:
+        return timeout
+    if remaining <= 0:
+        DEADLINES.inc(upstream=upstream)
+        raise DeadlineExceeded(f"request deadline passed before calling {upstream}")
+    return min(timeout, remaining)
+
+
+class CircuitBreaker:
+    """Opens after failure_threshold consecutive failures; after reset_timeout one probe call decides whether it closes"""
+
+    def __init__(self, name: str, failure_threshold: int = BREAKER_FAILURE_THRESHOLD, reset_timeout: float = BREAKER_RESET_SECONDS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def _transition(self, state: str) -> None:
+        self.state = state
+        BREAKER_TRANSITIONS.inc(upstream=self.name, state=state)
+        log = logger.warning if state == "open" else logger.info
+        log(f"{self.name} circuit {state} after {self.failures} consecutive failures")
+
+    def before_call(self) -> None:
+        with self._lock:
+            if self.state == "open":
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    raise CircuitOpenError(f"{self.name} is unavailable (circuit open)")
+                self._transition("half_open")
+            if self.state == "half_open":
+                if self._probing:
+                    raise CircuitOpenError(f"{self.name} is unavailable (circuit half open)")
+                self._probing = True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._probing = False
+            self.failures = 0
+            if self.state != "closed":
+                self._transition("closed")
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._probing = False
+            self.failures += 1
+            if self.state == "half_open" or (self.state == "closed" and self.failures >= self.failure_threshold):
+                self._opened_at = time.monotonic()
+                self._transition("open")
+
+    def release(self) -> None:
+        """The call ended without telling anything about the upstream's health"""
+        with self._lock:
+            self._probing = False
+
+
+breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(upstream: str) -> CircuitBreaker:
+    with _breakers_lock:
+        breaker = breakers.get(upstream)
+        if breaker is None:
+            breaker = breakers[upstream] = CircuitBreaker(upstream)
+        return breaker
+
+
+def collect_breakers() -> list[tuple]:
+    states = ("closed", "half_open", "open")
+    with _breakers_lock:
+        current = [(name, breaker.state) for name, breaker in breakers.items()]
+    return [("resume_circuit_state", "gauge", "1 for the current state of each upstream's circuit breaker.", [
+        ({"upstream": name, "state": candidate}, int(state == candidate)) for name, state in current for candidate in states
+    ])]
+
+
+registry.register_collector(collect_breakers)
+
+
+def is_retryable(e: BaseException) -> bool:
+    if isinstance(e, (DeadlineExceeded, CircuitOpenError)):
+        return False
+    status = error_status(e)
+    if status is not None:
+        return status in RETRYABLE_STATUSES
+    return isinstance(e, transport_errors())
+
+
+def transport_errors() -> tuple[type[BaseException], ...]:
+    """Connection and timeout errors of the HTTP clients; a client library that was never imported cannot have raised"""
+    errors = [ConnectionError, TimeoutError]
+    for module, names in (("requests", ("ConnectionError", "Timeout")), ("httpx", ("TransportError",)), ("openai", ("APIConnectionError",))):
+        if module in sys.modules:
+            errors.extend(getattr(sys.modules[module], name) for name in names)
+    return tuple(errors)
+
+
+def retry_after(e: BaseException) -> float|None:
+    """Delay the upstream asked for in Retry-After (or OpenAI's retry-after-ms), in seconds"""
+    headers = getattr(getattr(e, "response", None), "headers", None)
+    if not headers:
+        return None
+    for name, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+        value = headers.get(name)
+        if value:
+            try:
+                return float(value) * scale
+            except ValueError:
+                return None
+    return None
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    attempts: int = RETRY_ATTEMPTS
+    base_delay: float = RETRY_BASE_DELAY_SECONDS
+    max_delay: float = RETRY_MAX_DELAY_SECONDS
+
+    def backoff(self, attempt: int, error: BaseException) -> float:
+        """Full jitter: uniform up to base_delay * 2**attempt, capped; at least what Retry-After asks for"""
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        requested = retry_after(error)
+        return max(delay, requested) if requested is not None else delay
+
+
+DEFAULT_RETRY_POLICY = RetryPolicy()
+
+
+def _record_outcome(breaker: CircuitBreaker, error: BaseException|None) -> bool:
+    """Update the breaker with a call's outcome; True when the error is worth retrying"""
+    if error is None:
+        breaker.record_success()
+        return False
+    if is_retryable(error):
+        breaker.record_failure()
+        return True
+    if error_status(error) is not None:
+        # The upstream answered, it just did not like the request
+        breaker.record_success()
+    else:
+        breaker.release()
+    return False
+
+
+def _retry_delay(upstream: str, policy: RetryPolicy, attempt: int, error: BaseException) -> float|None:
+    """Seconds to wait before the next attempt, None when there is no attempt or time left for it"""
+    if attempt + 1 >= policy.attempts:
+        return None
+    delay = policy.backoff(attempt, error)
+    remaining = remaining_time()
+    if remaining is not None and delay >= remaining:
+        DEADLINES.inc(upstream=upstream)
+        return None
+    RETRIES.inc(upstream=upstream, error=type(error).__name__)
+    logger.warning(f"{upstream} call failed ({error!r}), retry {attempt + 1}/{policy.attempts - 1} in {delay:.2f}s")
+    return delay
+
+
+def call_with_retries(upstream: str, fn, *args, policy: RetryPolicy = DEFAULT_RETRY_POLICY, **kwargs):
+    breaker = get_breaker(upstream)
+    for attempt in range(policy.attempts):
+        breaker.before_call()
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            if not _record_outcome(breaker, e):
+                raise
+            delay = _retry_delay(upstream, policy, attempt, e)
+            if delay is None:
+                raise
+            time.sleep(delay)
+        else:
+            _record_outcome(breaker, None)
+            return result
+
+
+async def call_with_retries_async(upstream: str, fn, *args, policy: RetryPolicy = DEFAULT_RETRY_POLICY, **kwargs):
+    """Async twin of call_with_retries, fn being a coroutine function"""
+    breaker = get_breaker(upstream)
+    for attempt in range(policy.attempts):
+        breaker.before_call()
+        try:
+            result = await fn(*args, **kwargs)
+        except BaseException as e:
+            if not _record_outcome(breaker, e):
+                raise
+            delay = _retry_delay(upstream, policy, attempt, e)
+            if delay is None:
+                raise
+            await asyncio.sleep(delay)
+        else:
+            _record_outcome(breaker, None)
+            return result
+
+
+_executors = {}
+_hedge_lock = threading.Lock()
+_hedge_slots = threading.BoundedSemaphore(HEDGE_MAX_IN_FLIGHT)
+
+
+def _get_executor(name: str, workers: int) -> ThreadPoolExecutor:
+    executor = _executors.get(name)
+    if executor is None:
+        with _hedge_lock:
+            executor = _executors.get(name)
+            if executor is None:
+                executor = _executors[name] = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+    return executor
+
+
+def _reset_after_fork() -> None:
+    global _executors, _hedge_lock, _hedge_slots
+    _executors = {}
+    _hedge_lock = threading.Lock()
+    _hedge_slots = threading.BoundedSemaphore(HEDGE_MAX_IN_FLIGHT)
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _take_hedge_slot(upstream: str, hedge_after: float) -> bool:
+    """One of the HEDGE_MAX_IN_FLIGHT hedges; when all are out the call is not hedged"""
+    if _hedge_slots.acquire(blocking=False):
+        HEDGES.inc(upstream=upstream, outcome="launched")
+        logger.info(f"{upstream} slower than {hedge_after}s, sending a hedged request")
+        return True
+    HEDGES.inc(upstream=upstream, outcome="skipped")
+    return False
+
+
+def _release_hedge_slot(_) -> None:
+    _hedge_slots.release()
+
+
+def hedged_call(upstream: str, fn, *args, hedge_after: float = 0):
+    """fn(*args), plus a duplicate call once the first has been running for hedge_after seconds (0: no hedging).
+
+    The threshold counts from when the first call starts, not from when it was queued, and
+    hedges run in their own pool of HEDGE_MAX_IN_FLIGHT, so a saturated upstream is not sent
+    twice the load. The losing call is cancelled if it has not started yet; a running one is
+    left to finish and its result dropped.
+    """
+    if hedge_after <= 0:
+        return fn(*args)
+    started = threading.Event()
+
+    def run_primary(*args):
+        started.set()
+        return fn(*args)
+
+    primary = _get_executor("hedge-primary", HEDGE_WORKERS).submit(in_context(run_primary), *args)
+    if not started.wait(remaining_time()) and primary.cancel():
+        DEADLINES.inc(upstream=upstream)
+        raise DeadlineExceeded(f"request deadline passed waiting for {upstream}")
+    try:
+        return primary.result(timeout=hedge_after)
+    except FutureTimeoutError:
+        pass
+
+    backup = None
+    pending = {primary}
+    if _take_hedge_slot(upstream, hedge_after):
+        backup = _get_executor("hedge-backup", HEDGE_MAX_IN_FLIGHT).submit(in_context(fn), *args)
+        backup.add_done_callback(_release_hedge_slot)
+        pending.add(backup)
+    error = None
+    try:
+        while pending:
+            done, pending = wait(pending, timeout=remaining_time(), return_when=FIRST_COMPLETED)
+            if not done:
+                DEADLINES.inc(upstream=upstream)
+                raise DeadlineExceeded(f"request deadline passed waiting for {upstream}")
+            for future in done:
+                if future.exception() is None:
+                    if future is backup:
+                        HEDGES.inc(upstream=upstream, outcome="won")
+                    return future.result()
+                error = future.exception()
+        raise error
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+async def hedged_call_async(upstream: str, fn, *args, hedge_after: float = 0):
+    """Async twin of hedged_call; here the slower call is cancelled even while it runs"""
+    if hedge_after <= 0:
+        return await fn(*args)
+    primary = asyncio.ensure_future(fn(*args))
+    try:
+        done, _ = await asyncio.wait({primary}, timeout=hedge_after)
+    except asyncio.CancelledError:
+        primary.cancel()
+        raise
+    if done:
+        return primary.result()
+
+    backup = None
+    pending = {primary}
+    if _take_hedge_slot(upstream, hedge_after):
+        backup = asyncio.ensure_future(fn(*args))
+        backup.add_done_callback(_release_hedge_slot)
+        pending.add(backup)
+    error = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, timeout=remaining_time(), return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                DEADLINES.inc(upstream=upstream)
+                raise DeadlineExceeded(f"request deadline passed waiting for {upstream}")
+            for task in done:
+                if task.exception() is None:
+                    if task is backup:
+                        HEDGES.inc(upstream=upstream, outcome="won")
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
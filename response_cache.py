@@ -0,0 +1,90 @@
+"""Deterministic completions and the response cache behind them.
+
+In deterministic mode (LLM_DETERMINISTIC=1, or ``"deterministic": true`` on a request)
+completions run at a low temperature with a fixed seed, and their text is cached under
+a hash of everything that shapes the answer: model, sampling parameters, messages
+(system, job and resume prompts) and the response schema. Replaying the same resume
+and job description is then a cache lookup instead of a model call.
+"""
+import contextvars
+import json
+import os
+from contextlib import contextmanager
+
+from cache import TwoTierCache
+
+LLM_DETERMINISTIC = os.getenv("LLM_DETERMINISTIC", "0") == "1"
+LLM_DETERMINISTIC_TEMPERATURE = float(os.getenv("LLM_DETERMINISTIC_TEMPERATURE", "0"))
+LLM_SEED = int(os.getenv("LLM_SEED", "7"))
+# Bump to drop every cached response, e.g. after changing how responses are post-processed
+RESPONSE_CACHE_VERSION = "v1"
+# Request options that do not change the answer; extra_body only carries the prompt_cache_key routing hint
+UNKEYED_PARAMS = frozenset({"stream", "stream_options", "extra_body", "user"})
+
+response_cache = TwoTierCache(
+    "llm_responses",
+    os.getenv("LLM_CACHE_DIR", ".cache/llm_responses"),
+    max_items=int(os.getenv("LLM_CACHE_MEMORY_ITEMS", "1024")),
+    ttl=float(os.getenv("LLM_CACHE_TTL_SECONDS", str(30 * 24 * 3600))),
+    max_bytes=int(os.getenv("LLM_CACHE_MAX_MB", "256")) * 1024 * 1024,
+)
+
+# id -> (value, JSON text) of request constants like the response schemas, serialized once
+_static_json = {}
+
+_deterministic = contextvars.ContextVar("llm_deterministic", default=LLM_DETERMINISTIC)
+
+
+@contextmanager
+def deterministic_scope(enabled: bool):
+    """Completions made in the block (and in contexts copied from it) are deterministic and cached, or not"""
+    token = _deterministic.set(enabled)
+    try:
+        yield
+    finally:
+        _deterministic.reset(token)
+
+
+def is_deterministic() -> bool:
+    return _deterministic.get()
+
+
+def requested_deterministic(params: dict) -> bool:
+    """The request's "deterministic" option, LLM_DETERMINISTIC when it is not given"""
+    return bool(params.get("deterministic", LLM_DETERMINISTIC))
+
+
+def deterministic_params(params: dict) -> dict:
+    return dict(params, temperature=LLM_DETERMINISTIC_TEMPERATURE, seed=LLM_SEED)
+
+
+def dump_json(value) -> str:
+    return json.dumps(value, sort_keys=True, separators=(",", ":"))
+
+
+def preserialize(value):
+    """Register a request constant whose JSON every cache key reuses instead of serializing it again; returns value"""
+    _static_json[id(value)] = (value, dump_json(value))
+    return value
+
+
+def serialized(value) -> str:
+    static = _static_json.get(id(value))
+    if static is not None and static[0] is value:
+        return static[1]
+    return dump_json(value)
+
+
+def response_cache_key(params: dict) -> str:
+    """Hash of dump_json of the keyed params, with the preserialized constants spliced in as text"""
+    keyed = ",".join(f"{json.dumps(name)}:{serialized(params[name])}" for name in sorted(params) if name not in UNKEYED_PARAMS)
+    return TwoTierCache.make_key(RESPONSE_CACHE_VERSION, "{" + keyed + "}")
+
+
+def get_cached_response(key: str) -> str|None:
+    cached = response_cache.get(key)
+    return cached["content"] if cached is not None else None
+
+
+def cache_response(key: str, content: str) -> None:
+    response_cache.set(key, {"content": content})
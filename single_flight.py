@@ -0,0 +1,114 @@
+"""Request coalescing: concurrent calls with the same key share one computation."""
+import asyncio
+import copy
+import hashlib
+import threading
+
+from resilience import DeadlineExceeded, remaining_time
+
+
+def flight_key(*parts: str) -> str:
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Thread based single-flight group.
+
+    The first caller for a key runs ``fn``; callers arriving while it runs wait for it
+    and get the same result or exception, but never past their own request deadline.
+    With ``copy_result`` every caller gets its own deep copy, for results the callers
+    go on to mutate.
+    """
+
+    def __init__(self, name: str, copy_result: bool = False):
+        self.name = name
+        self.copy_result = copy_result
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.counters = {"leaders": 0, "coalesced": 0}
+
+    def do(self, key: str, fn, *args, **kwargs):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.counters["leaders"] += 1
+            else:
+                self.counters["coalesced"] += 1
+
+        if not leader:
+            if not call.done.wait(remaining_time()):
+                raise DeadlineExceeded(f"request deadline passed waiting for a coalesced {self.name} call")
+            if call.error is not None:
+                raise call.error
+            return copy.deepcopy(call.result) if self.copy_result else call.result
+
+        try:
+            result = fn(*args, **kwargs)
+            call.result = copy.deepcopy(result) if self.copy_result else result
+            return result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+class _AsyncCall:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class AsyncSingleFlight:
+    """asyncio twin of SingleFlight, for coroutines running on one event loop
+
+    ``fn`` runs in a task owned by the group that every caller awaits through a shield,
+    so a cancelled caller (client gone, deadline passed) only stops waiting. The task
+    is cancelled when its last caller is.
+    """
+
+    def __init__(self, name: str, copy_result: bool = False):
+        self.name = name
+        self.copy_result = copy_result
+        self._calls = {}
+        self.counters = {"leaders": 0, "coalesced": 0}
+
+    def _forget(self, key: str, call: _AsyncCall) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    async def do(self, key: str, fn, *args, **kwargs):
+        call = self._calls.get(key)
+        if call is None:
+            call = self._calls[key] = _AsyncCall(asyncio.ensure_future(fn(*args, **kwargs)))
+            call.task.add_done_callback(lambda _: self._forget(key, call))
+            self.counters["leaders"] += 1
+        else:
+            self.counters["coalesced"] += 1
+
+        call.waiters += 1
+        try:
+            result = await asyncio.shield(call.task)
+        except asyncio.CancelledError:
+            if not call.task.done() and call.waiters == 1:
+                self._forget(key, call)
+                call.task.cancel()
+            raise
+        finally:
+            call.waiters -= 1
+        return copy.deepcopy(result) if self.copy_result else result
@@ -0,0 +1,104 @@
+import json
+
+
+def format_sse(event: str, data) -> str:
+    """Format one server-sent event with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class _Frame:
+    __slots__ = ("kind", "key", "expect_key", "value_start", "count")
+
+    def __init__(self, kind: str):
+        self.kind = kind
+        self.key = None
+        self.expect_key = kind == "{"
+        self.value_start = None
+        self.count = 0
+
+
+class CvSectionStream:
+    """Incrementally scan the model's JSON output for ``{"cv": {...}}`` and report finished parts.
+
+    ``feed`` takes the next chunk of text and returns the events completed by it:
+    ``("workHistory", {"index": i, "item": {...}})`` for every finished work history
+    entry and ``("section", {"name": key, "value": ...})`` for every other finished
+    top-level ``cv`` field.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self._pos = 0
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = None
+        self._string_is_key = False
+
+    def feed(self, chunk: str) -> list[tuple[str, dict]]:
+        self.buffer += chunk
+        events = []
+        buffer = self.buffer
+        for i in range(self._pos, len(buffer)):
+            char = buffer[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    frame = self._stack[-1]
+                    if self._string_is_key:
+                        frame.key = json.loads(buffer[self._string_start:i + 1])
+                    else:
+                        self._complete_value(frame, i + 1, events)
+                continue
+
+            frame = self._stack[-1] if self._stack else None
+            if char == '"':
+                self._in_string = True
+                self._string_start = i
+                self._string_is_key = frame is not None and frame.kind == "{" and frame.expect_key
+                if frame is not None and not self._string_is_key and frame.value_start is None:
+                    frame.value_start = i
+            elif char in "{[":
+                if frame is not None and frame.value_start is None:
+                    frame.value_start = i
+                self._stack.append(_Frame(char))
+            elif char in "}]":
+                self._complete_primitive(frame, i, events)
+                self._stack.pop()
+                if self._stack:
+                    self._complete_value(self._stack[-1], i + 1, events)
+            elif frame is None:
+                continue
+            elif char == ":":
+                frame.expect_key = False
+            elif char == ",":
+                self._complete_primitive(frame, i, events)
+                if frame.kind == "{":
+                    frame.expect_key = True
+            elif not char.isspace() and frame.value_start is None:
+                frame.value_start = i
+        self._pos = len(buffer)
+        return events
+
+    def _complete_primitive(self, frame: _Frame|None, end: int, events: list) -> None:
+        """Numbers, true/false/null only end at the next ``,`` or closing bracket"""
+        if frame is not None and frame.value_start is not None:
+            self._complete_value(frame, end, events)
+
+    def _complete_value(self, frame: _Frame, end: int, events: list) -> None:
+        start = frame.value_start
+        frame.value_start = None
+        index = frame.count
+        frame.count += 1
+
+        stack = self._stack
+        if len(stack) < 2 or stack[0].key != "cv":
+            return
+        if frame is stack[1] and frame.key != "workHistory":
+            events.append(("section", {"name": frame.key, "value": json.loads(self.buffer[start:end])}))
+        elif len(stack) == 3 and frame is stack[2] and stack[1].key == "workHistory":
+            events.append(("workHistory", {"index": index, "item": json.loads(self.buffer[start:end])}))
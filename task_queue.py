@@ -0,0 +1,265 @@
+"""Submit/poll tailoring: a task queue with result store, and the worker pool draining it.
+
+Two backends share one interface:
+
+- ``MemoryTaskStore``: queue and results live in this process, workers must run here too.
+- ``SQLiteTaskStore``: queue and results live in a SQLite file, so workers can run in
+  other processes (see ``worker.py``) and the web tier scales independently of them.
+"""
+import heapq
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+
+from loguru import logger
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+def new_task_id() -> str:
+    return uuid.uuid4().hex
+
+
+class MemoryTaskStore:
+    """Expiry runs off a heap of (expires_at, task_id): finished tasks are dropped after result_ttl,
+    tasks still queued after queued_ttl are failed. Running tasks have no deadline; the handler ends them."""
+
+    def __init__(self, result_ttl: float = 3600, queued_ttl: float = 3600):
+        self.result_ttl = result_ttl
+        self.queued_ttl = queued_ttl
+        self._tasks = {}
+        self._queue = deque()
+        self._expiry = []
+        self._cond = threading.Condition()
+
+    def _expire_at(self, task_id: str, task: dict, expires_at: float) -> None:
+        task["expires_at"] = expires_at
+        heapq.heappush(self._expiry, (expires_at, task_id))
+
+    def _expire(self, now: float) -> None:
+        """Pop the deadlines that passed; heap entries whose task moved on since are skipped"""
+        while self._expiry and self._expiry[0][0] <= now:
+            expires_at, task_id = heapq.heappop(self._expiry)
+            task = self._tasks.get(task_id)
+            if task is None or task["expires_at"] != expires_at:
+                continue
+            if task["status"] == QUEUED:
+                task.update(status=FAILED, error="task expired before a worker picked it up", payload=None)
+                self._expire_at(task_id, task, now + self.result_ttl)
+            else:
+                del self._tasks[task_id]
+        # Every task waits queued_ttl, so the expired ones are at the front of the queue
+        while self._queue:
+            head = self._tasks.get(self._queue[0])
+            if head is not None and head["status"] == QUEUED:
+                break
+            self._queue.popleft()
+
+    def submit(self, payload: dict) -> str:
+        task_id = new_task_id()
+        now = time.time()
+        with self._cond:
+            self._expire(now)
+            task = {"status": QUEUED, "payload": payload, "result": None, "error": None, "expires_at": None}
+            self._tasks[task_id] = task
+            self._expire_at(task_id, task, now + self.queued_ttl)
+            self._queue.append(task_id)
+            self._cond.notify()
+        return task_id
+
+    def claim(self, timeout: float) -> tuple[str, dict]|None:
+        with self._cond:
+            self._expire(time.time())
+            if not self._queue and not self._cond.wait_for(lambda: self._queue, timeout):
+                return None
+            self._expire(time.time())
+            if not self._queue:
+                return None
+            task_id = self._queue.popleft()
+            task = self._tasks[task_id]
+            task.update(status=RUNNING, expires_at=None)
+            return task_id, task["payload"]
+
+    def _finish(self, task_id: str, status: str, result: dict|None, error: str|None) -> None:
+        now = time.time()
+        with self._cond:
+            task = self._tasks.get(task_id)
+            if task is not None:
+                task.update(status=status, result=result, error=error, payload=None)
+                self._expire_at(task_id, task, now + self.result_ttl)
+            self._expire(now)
+
+    def complete(self, task_id: str, result: dict) -> None:
+        self._finish(task_id, DONE, result, None)
+
+    def fail(self, task_id: str, error: str) -> None:
+        self._finish(task_id, FAILED, None, error)
+
+    def get(self, task_id: str) -> dict|None:
+        with self._cond:
+            self._expire(time.time())
+            task = self._tasks.get(task_id)
+            if task is None:
+                return None
+            return {"task_id": task_id, "status": task["status"], "result": task["result"], "error": task["error"]}
+
+
+class SQLiteTaskStore:
+
+    def __init__(self, path: str, result_ttl: float = 3600, visibility_timeout: float = 600, poll_interval: float = 0.2):
+        self.path = path
+        self.result_ttl = result_ttl
+        self.visibility_timeout = visibility_timeout
+        self.poll_interval = poll_interval
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connection() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS tasks (
+                    task_id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    payload TEXT,
+                    result TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    expires_at REAL
+                )""")
+            conn.execute("CREATE INDEX IF NOT EXISTS tasks_status_created ON tasks (status, created_at)")
+
+    def _connection(self) -> sqlite3.Connection:
+        """One connection per thread; after a fork the child opens its own"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def submit(self, payload: dict) -> str:
+        task_id = new_task_id()
+        now = time.time()
+        self._connection().execute(
+            "INSERT INTO tasks (task_id, status, payload, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+            (task_id, QUEUED, json.dumps(payload), now, now),
+        )
+        return task_id
+
+    def _claim_once(self) -> tuple[str, dict]|None:
+        """Take the oldest queued task, or one whose worker stopped reporting back"""
+        conn = self._connection()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT task_id, payload FROM tasks WHERE status = ? OR (status = ? AND updated_at < ?) ORDER BY created_at LIMIT 1",
+                (QUEUED, RUNNING, now - self.visibility_timeout),
+            ).fetchone()
+            if row is not None:
+                conn.execute("UPDATE tasks SET status = ?, updated_at = ? WHERE task_id = ?", (RUNNING, now, row[0]))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        if row is None:
+            return None
+        return row[0], json.loads(row[1])
+
+    def claim(self, timeout: float) -> tuple[str, dict]|None:
+        deadline = time.monotonic() + timeout
+        while True:
+            task = self._claim_once()
+            if task is not None or time.monotonic() >= deadline:
+                return task
+            time.sleep(self.poll_interval)
+
+    def _finish(self, task_id: str, status: str, result: dict|None, error: str|None) -> None:
+        now = time.time()
+        conn = self._connection()
+        conn.execute(
+            "UPDATE tasks SET status = ?, result = ?, error = ?, payload = NULL, updated_at = ?, expires_at = ? WHERE task_id = ?",
+            (status, None if result is None else json.dumps(result), error, now, now + self.result_ttl, task_id),
+        )
+        conn.execute("DELETE FROM tasks WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,))
+
+    def complete(self, task_id: str, result: dict) -> None:
+        self._finish(task_id, DONE, result, None)
+
+    def fail(self, task_id: str, error: str) -> None:
+        self._finish(task_id, FAILED, None, error)
+
+    def get(self, task_id: str) -> dict|None:
+        row = self._connection().execute(
+            "SELECT status, result, error FROM tasks WHERE task_id = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (task_id, time.time()),
+        ).fetchone()
+        if row is None:
+            return None
+        return {"task_id": task_id, "status": row[0], "result": None if row[1] is None else json.loads(row[1]), "error": row[2]}
+
+
+def create_task_store() -> MemoryTaskStore|SQLiteTaskStore:
+    """Task store chosen by TASK_BACKEND (memory or sqlite)"""
+    result_ttl = float(os.getenv("TASK_RESULT_TTL_SECONDS", "3600"))
+    queued_ttl = float(os.getenv("TASK_QUEUED_TTL_SECONDS", "3600"))
+    if os.getenv("TASK_BACKEND", "memory") == "sqlite":
+        return SQLiteTaskStore(
+            os.getenv("TASK_DB_PATH", ".cache/tasks.sqlite3"),
+            result_ttl=result_ttl,
+            visibility_timeout=float(os.getenv("TASK_VISIBILITY_TIMEOUT_SECONDS", "600")),
+        )
+    return MemoryTaskStore(result_ttl=result_ttl, queued_ttl=queued_ttl)
+
+
+class WorkerPool:
+    """Threads that claim tasks from the store, run ``handler(payload)`` and store the outcome"""
+
+    def __init__(self, store, handler, workers: int = 4):
+        self.store = store
+        self.handler = handler
+        self.workers = workers
+        self._threads = []
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        with self._lock:
+            if self._threads:
+                return
+            for idx in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f"tailoring-worker-{idx}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self) -> None:
+        self._stopping.set()
+        for thread in self._threads:
+            thread.join()
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                task = self.store.claim(timeout=1)
+            except Exception as e:
+                logger.warning(f"Could not claim task: {e!r}")
+                time.sleep(1)
+                continue
+            if task is None:
+                continue
+            task_id, payload = task
+            try:
+                self.store.complete(task_id, self.handler(payload))
+            except Exception as e:
+                logger.warning(f"Task {task_id} failed: {e!r}")
+                self.store.fail(task_id, str(e))
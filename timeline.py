@@ -0,0 +1,181 @@
+"""Experience timeline of a candidate: dates in many formats, per-entry errors, overlapping roles merged.
+
+Parsers send dates as ISO timestamps, plain dates, ``YYYY-MM``, month names or words
+like ``Present``. Parsing is memoized because the same few hundred strings repeat across
+every resume. A bad date only invalidates its own entry, and total experience is the
+length of the union of all role intervals, so parallel roles are not counted twice.
+``total_experience_years`` does the same over a batch of candidates with NumPy, which is
+only imported when that is first called.
+"""
+import os
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from functools import lru_cache
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import numpy as np
+
+DAYS_IN_YEAR = 365.25
+DATE_CACHE_SIZE = int(os.getenv("DATE_CACHE_SIZE", "4096"))
+PRESENT = "present"
+PRESENT_WORDS = frozenset({"present", "current", "currently", "now", "ongoing", "today", "till date", "to date", "till now"})
+# Tried in order after ISO 8601; numeric day/month dates are read day first.
+DATE_FORMATS = (
+    "%Y-%m", "%Y/%m/%d", "%Y/%m", "%Y.%m.%d", "%d/%m/%Y", "%d-%m-%Y", "%d.%m.%Y", "%m/%Y", "%m-%Y",
+    "%b %Y", "%B %Y", "%b, %Y", "%B, %Y", "%b %d, %Y", "%B %d, %Y", "%d %b %Y", "%d %B %Y", "%Y",
+)
+
+# Start and end field of every dated section of the cv
+TIMELINE_FIELDS = {
+    "workHistory": ("startAt", "endAt"),
+    "educationHistory": ("startedAt", "graduatedAt"),
+    "projects": ("startAt", "endAt"),
+}
+
+
+@lru_cache(maxsize=DATE_CACHE_SIZE)
+def _parse_date_text(text: str) -> date|str|None:
+    """Date of text, PRESENT for words meaning today, None when no format matches"""
+    text = " ".join(text.split())
+    if text.lower().rstrip(".") in PRESENT_WORDS:
+        return PRESENT
+    try:
+        return datetime.fromisoformat(text).date()
+    except ValueError:
+        pass
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, date_format).date()
+        except ValueError:
+            continue
+    return None
+
+
+def parse_date(value, today: date|None = None) -> date|None:
+    """Date of a parser value (string, date or datetime); words like Present resolve to today"""
+    if value is None or value == "":
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    parsed = _parse_date_text(str(value))
+    if parsed == PRESENT:
+        return today or date.today()
+    return parsed
+
+
+def entry_span(start_value, end_value, today: date|None = None) -> tuple[date, date]:
+    """Start and end date of one entry, a missing end meaning it is ongoing; ValueError when unusable"""
+    today = today or date.today()
+    start = parse_date(start_value, today)
+    if start is None:
+        raise ValueError(f"unreadable start date {start_value!r}" if start_value else "missing start date")
+    end = parse_date(end_value, today) if end_value else today
+    if end is None:
+        raise ValueError(f"unreadable end date {end_value!r}")
+    if end < start:
+        raise ValueError(f"ends ({end}) before it starts ({start})")
+    return start, end
+
+
+def span_years(start: date, end: date) -> float:
+    return round((end - start).days / DAYS_IN_YEAR, 2)
+
+
+def merge_intervals(spans: list[tuple[date, date]]) -> list[tuple[date, date]]:
+    """Union of the spans as sorted, non-overlapping intervals"""
+    merged = []
+    for start, end in sorted(spans):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+@dataclass(frozen=True)
+class Timeline:
+    spans: list[tuple[int, date, date]] = field(default_factory=list)
+    errors: list[dict] = field(default_factory=list)
+    merged: list[tuple[date, date]] = field(default_factory=list)
+
+    @property
+    def total_years(self) -> float:
+        return round(sum((end - start).days for start, end in self.merged) / DAYS_IN_YEAR, 2)
+
+    def to_dict(self) -> dict:
+        return {
+            "totalYears": self.total_years,
+            "intervals": [{"start": start.isoformat(), "end": end.isoformat()} for start, end in self.merged],
+            "errors": self.errors,
+        }
+
+
+def build_timeline(entries: list[dict], start_key: str = "startAt", end_key: str = "endAt", today: date|None = None, skip_undated: bool = False) -> Timeline:
+    """Timeline of one section; entries with unusable dates are reported by their 1-based index and skipped
+
+    With skip_undated, entries without a start date (an education with only its graduation
+date, an undated project) are left out without an error.
+    """
+    today = today or date.today()
+    spans = []
+    errors = []
+    for idx, entry in enumerate(entries or [], 1):
+        if skip_undated and not entry.get(start_key):
+            continue
+        try:
+            start, end = entry_span(entry.get(start_key), entry.get(end_key), today)
+        except ValueError as e:
+            errors.append({"index": idx, "error": str(e)})
+            continue
+        spans.append((idx, start, end))
+    return Timeline(spans=spans, errors=errors, merged=merge_intervals([(start, end) for _, start, end in spans]))
+
+
+def build_cv_timelines(cv: dict, today: date|None = None) -> dict[str, Timeline]:
+    """Timeline of every dated section of a cv; education and projects without a start date are not errors, roles are"""
+    return {
+        section: build_timeline(cv.get(section) or [], start_key, end_key, today, skip_undated=section != "workHistory")
+        for section, (start_key, end_key) in TIMELINE_FIELDS.items()
+    }
+
+
+def total_experience_years(cvs: list[dict], section: str = "workHistory", today: date|None = None) -> "np.ndarray":
+    """Merged experience in years of each cv, computed over the whole batch at once"""
+    import numpy as np
+
+    start_key, end_key = TIMELINE_FIELDS[section]
+    today = today or date.today()
+    owners = []
+    starts = []
+    ends = []
+    for owner, cv in enumerate(cvs):
+        for entry in cv.get(section) or []:
+            try:
+                start, end = entry_span(entry.get(start_key), entry.get(end_key), today)
+            except ValueError:
+                continue
+            owners.append(owner)
+            starts.append(start.toordinal())
+            ends.append(end.toordinal())
+    if not owners:
+        return np.zeros(len(cvs))
+
+    owners = np.asarray(owners, dtype=np.int64)
+    # Shift every cv to its own stretch of the number line, so one sort and one running
+    # maximum merge the intervals of all cvs without any of them touching another's.
+    offset = owners * (date.max.toordinal() + 1)
+    starts = np.asarray(starts, dtype=np.int64) + offset
+    ends = np.asarray(ends, dtype=np.int64) + offset
+    order = np.lexsort((starts, owners))
+    owners, starts, ends = owners[order], starts[order], ends[order]
+
+    reach = np.maximum.accumulate(ends)
+    opens = np.ones(len(starts), dtype=bool)
+    opens[1:] = starts[1:] > reach[:-1]
+    first = np.flatnonzero(opens)
+    days = np.maximum.reduceat(ends, first) - starts[first]
+    return np.round(np.bincount(owners[first], weights=days, minlength=len(cvs)) / DAYS_IN_YEAR, 2)
@@ -0,0 +1,217 @@
+"""Local token counting and budget fitting for the tailoring prompt.
+
+Long resumes are trimmed section by section (extra projects, long bio, descriptions of
+older roles, ...) until the candidate prompt fits the input budget, and the completion
+budget is sized from the work history instead of a fixed 2048 tokens.
+"""
+import copy
+import json
+import math
+import os
+from dataclasses import dataclass
+from functools import lru_cache
+
+from loguru import logger
+
+INPUT_TOKEN_BUDGET = int(os.getenv("INPUT_TOKEN_BUDGET", "6000"))
+COMPLETION_TOKENS_MIN = int(os.getenv("COMPLETION_TOKENS_MIN", "512"))
+COMPLETION_TOKENS_MAX = int(os.getenv("COMPLETION_TOKENS_MAX", "8192"))
+COMPLETION_TOKENS_PER_ROLE_MIN = int(os.getenv("COMPLETION_TOKENS_PER_ROLE_MIN", "150"))
+# Tokens the full mode spends echoing the rest of the cv (education, skills, contact info...)
+COMPLETION_TOKENS_FULL_BASE = int(os.getenv("COMPLETION_TOKENS_FULL_BASE", "800"))
+# Full mode never gets less than the fixed budget it had before budgets were sized per resume
+COMPLETION_TOKENS_FULL_MIN = int(os.getenv("COMPLETION_TOKENS_FULL_MIN", "2048"))
+COMPLETION_TOKENS_DELTA_BASE = int(os.getenv("COMPLETION_TOKENS_DELTA_BASE", "50"))
+TOKENIZER_ENCODING = os.getenv("TOKENIZER_ENCODING", "o200k_base")
+MESSAGE_OVERHEAD_TOKENS = 4
+PROMPT_TOKEN_CACHE_ITEMS = int(os.getenv("PROMPT_TOKEN_CACHE_ITEMS", "1024"))
+
+
+class CompletionTruncated(RuntimeError):
+    """The model ran out of max_completion_tokens even after a retry with a larger budget"""
+
+
+@dataclass(frozen=True)
+class PromptBudget:
+    prompt_tokens: int
+    max_completion_tokens: int
+    trimmed: tuple = ()
+
+
+@lru_cache(maxsize=1)
+def get_encoding():
+    """tiktoken encoding for gpt-4o; None when tiktoken or its data files are unavailable"""
+    try:
+        import tiktoken
+        return tiktoken.get_encoding(TOKENIZER_ENCODING)
+    except Exception as e:
+        logger.warning(f"tiktoken unavailable, estimating tokens from characters: {e!r}")
+        return None
+
+
+def tokenizer_name() -> str:
+    """What count_tokens counts with, to tell stored token counts apart"""
+    return TOKENIZER_ENCODING if get_encoding() is not None else "chars/4"
+
+
+def count_tokens(text: str) -> int:
+    encoding = get_encoding()
+    if encoding is None:
+        return math.ceil(len(text) / 4)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+@lru_cache(maxsize=256)
+def count_static_tokens(text: str) -> int:
+    """count_tokens for text reused across requests, like the system prompt and job descriptions"""
+    return count_tokens(text)
+
+
+@lru_cache(maxsize=PROMPT_TOKEN_CACHE_ITEMS)
+def count_prompt_tokens(text: str) -> int:
+    """count_tokens for rendered candidate prompts, which repeat for every job the same resume is tailored to"""
+    return count_tokens(text)
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """Cut text to max_tokens, at the last sentence end when there is one"""
+    encoding = get_encoding()
+    if encoding is None:
+        if len(text) <= max_tokens * 4:
+            return text
+        cut = text[:max_tokens * 4]
+    else:
+        tokens = encoding.encode(text, disallowed_special=())
+        if len(tokens) <= max_tokens:
+            return text
+        cut = encoding.decode(tokens[:max_tokens])
+    sentence_end = max(cut.rfind(". "), cut.rfind(".\n"))
+    if sentence_end > len(cut) // 2:
+        return cut[:sentence_end + 1]
+    return cut.rstrip() + "..."
+
+
+def _roles_by_recency(work_history: list[dict]) -> list[dict]:
+    """Most recent role first; candidate.WorkExperience sets end_date_str"""
+    return sorted(work_history, key=lambda job: str(job.get("end_date_str") or ""), reverse=True)
+
+
+def _trim_projects(cv: dict) -> None:
+    cv["projects"] = (cv.get("projects") or [])[:3]
+
+
+def _trim_bio(cv: dict) -> None:
+    if cv.get("bio"):
+        cv["bio"] = truncate_tokens(cv["bio"], 80)
+
+
+def _trim_old_roles(cv: dict) -> None:
+    for job in _roles_by_recency(cv.get("workHistory") or [])[3:]:
+        if job.get("jobDescription"):
+            job["jobDescription"] = truncate_tokens(job["jobDescription"], 60)
+
+
+def _trim_lists(cv: dict) -> None:
+    cv["certificates"] = (cv.get("certificates") or [])[:5]
+    cv["skills"] = (cv.get("skills") or [])[:30]
+    cv["projects"] = []
+
+
+def _trim_all_roles(cv: dict) -> None:
+    for job in cv.get("workHistory") or []:
+        if job.get("jobDescription"):
+            job["jobDescription"] = truncate_tokens(job["jobDescription"], 200)
+
+
+# Lowest value first. Roles are never dropped: the model and delta merge rely on their positions.
+# Trimmed role descriptions only shape the rewrite; the other fields are echoed back in full
+# mode, so TRIMMED_FIELDS of the steps taken are restored from the parsed cv afterwards.
+TRIM_STEPS = [
+    ("projects", _trim_projects),
+    ("bio", _trim_bio),
+    ("old_roles", _trim_old_roles),
+    ("lists", _trim_lists),
+    ("all_roles", _trim_all_roles),
+]
+TRIMMED_FIELDS = {
+    "projects": ("projects",),
+    "bio": ("bio",),
+    "lists": ("certificates", "skills", "projects"),
+}
+
+
+def trimmed_fields(trimmed: tuple) -> list[str]:
+    """cv fields outside workHistory that the trim steps taken may have cut"""
+    return sorted({field for name in trimmed for field in TRIMMED_FIELDS.get(name, ())})
+
+
+def completion_token_budget(work_history: list[dict], mode: str, cv: dict|None = None) -> int:
+    """Room for one rewritten description per role, plus the rest of the cv in full mode
+
+    In full mode the model echoes every other section of cv as JSON, so those are counted
+    too, and the budget never drops below COMPLETION_TOKENS_FULL_MIN.
+    """
+    total = COMPLETION_TOKENS_DELTA_BASE if mode == "delta" else COMPLETION_TOKENS_FULL_BASE
+    for job in work_history:
+        description_tokens = count_tokens(str(job.get("jobDescription") or ""))
+        total += max(COMPLETION_TOKENS_PER_ROLE_MIN, math.ceil(description_tokens * 1.5))
+    if mode == "delta":
+        return min(COMPLETION_TOKENS_MAX, max(COMPLETION_TOKENS_MIN, total))
+    # timelines is derived from the parse and not part of the model's output
+    echoed = {name: value for name, value in (cv or {}).items() if name not in ("workHistory", "timelines")}
+    total += count_tokens(json.dumps(echoed, default=str))
+    return min(COMPLETION_TOKENS_MAX, max(COMPLETION_TOKENS_FULL_MIN, total))
+
+
+def larger_completion_params(params: dict) -> dict:
+    """params for retrying a completion that hit max_completion_tokens: twice the budget, up to COMPLETION_TOKENS_MAX"""
+    current = params.get("max_completion_tokens", 0)
+    if current >= COMPLETION_TOKENS_MAX:
+        raise CompletionTruncated(f"model output was cut off at max_completion_tokens={current}")
+    larger = min(COMPLETION_TOKENS_MAX, max(current * 2, COMPLETION_TOKENS_MIN))
+    logger.warning(f"Completion cut off at max_completion_tokens={current}, retrying with {larger}")
+    return dict(params, max_completion_tokens=larger)
+
+
+def render_with_tokens(user_data: dict, render) -> tuple[str, int]:
+    prompt = render(user_data)
+    return prompt, count_prompt_tokens(prompt)
+
+
+def build_budgeted_prompt(user_data: dict, render, static_prompts: list[str], mode: str, input_budget: int = INPUT_TOKEN_BUDGET, rendered: tuple[str, int]|None = None) -> tuple[str, PromptBudget]:
+    """Render the candidate prompt with render(user_data), trimming a copy of the cv until it fits
+
+    rendered is render_with_tokens(user_data, render) when the caller already has it, e.g. to
+    budget the same resume against several job descriptions.
+    """
+    static_tokens = sum(count_static_tokens(text) + MESSAGE_OVERHEAD_TOKENS for text in static_prompts)
+    prompt, prompt_tokens = rendered or render_with_tokens(user_data, render)
+    trimmed = []
+    if static_tokens + prompt_tokens > input_budget:
+        cv = copy.deepcopy(user_data["cv"])
+        for name, step in TRIM_STEPS:
+            step(cv)
+            trimmed.append(name)
+            prompt = render({"cv": cv})
+            prompt_tokens = count_prompt_tokens(prompt)
+            if static_tokens + prompt_tokens <= input_budget:
+                break
+        else:
+            logger.warning(f"Prompt still {static_tokens + prompt_tokens} tokens after trimming, budget {input_budget}")
+
+    work_history = user_data["cv"].get("workHistory") or []
+    budget = PromptBudget(
+        prompt_tokens=static_tokens + prompt_tokens + MESSAGE_OVERHEAD_TOKENS,
+        max_completion_tokens=completion_token_budget(work_history, mode, user_data["cv"]),
+        trimmed=tuple(trimmed),
+    )
+    return prompt, budget
+
+
+def estimate_prompt_budget(prompt: str, static_prompts: list[str], work_history: list[dict], mode: str) -> PromptBudget:
+    """Budget for an already small prompt that needs no trimming"""
+    static_tokens = sum(count_static_tokens(text) + MESSAGE_OVERHEAD_TOKENS for text in static_prompts)
+    return PromptBudget(
+        prompt_tokens=static_tokens + count_tokens(prompt) + MESSAGE_OVERHEAD_TOKENS,
+        max_completion_tokens=completion_token_budget(work_history, mode),
+    )
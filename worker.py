@@ -0,0 +1,31 @@
+"""Standalone tailoring workers for the SQLite task backend.
+
+Run as many of these as the LLM throughput needs, next to web processes started with
+TASK_BACKEND=sqlite and TASK_WORKERS=0:
+
+    TASK_BACKEND=sqlite python worker.py --workers 8
+"""
+import argparse
+import signal
+
+from loguru import logger
+
+from main import run_tailoring_task, task_store
+from task_queue import SQLiteTaskStore, WorkerPool
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    if not isinstance(task_store, SQLiteTaskStore):
+        raise SystemExit("worker.py needs TASK_BACKEND=sqlite; the memory backend only serves workers inside the web process")
+
+    stop_signals = {signal.SIGINT, signal.SIGTERM}
+    signal.pthread_sigmask(signal.SIG_BLOCK, stop_signals)
+    pool = WorkerPool(task_store, run_tailoring_task, workers=args.workers)
+    pool.start()
+    logger.info(f"Started {args.workers} tailoring workers on {task_store.path}")
+    signal.sigwait(stop_signals)
+    logger.info("Stopping workers")
+    pool.stop()